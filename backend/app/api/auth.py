@@ -1,13 +1,18 @@
 from datetime import timedelta
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from app.db.database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.database import get_async_db
 from app.models.user import User
 from app.schemas.user import UserCreate, UserResponse, Token
-from app.core.security import verify_password, get_password_hash, create_access_token
+from app.core.security import (
+    PasswordHashBusyError, verify_password_async, get_password_hash_async, create_access_token
+)
+from app.core.rate_limit import get_login_rate_limiter, retry_after_header
 from app.core.config import settings
 from app.api.dependencies import get_current_user
+from app.core.auth_cache import CurrentUser
 import logging
 
 logger = logging.getLogger(__name__)
@@ -15,8 +20,17 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/auth", tags=["認証"])
 
 
+def password_busy_error() -> HTTPException:
+    """パスワード処理の待ちが上限に達している場合のエラー（503）"""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="現在混み合っています。しばらくしてから再度お試しください",
+        headers={"Retry-After": str(settings.PASSWORD_HASH_RETRY_AFTER_SECONDS)},
+    )
+
+
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """ユーザー登録"""
     # パスワードの長さチェック
     if len(user_data.password) < 8:
@@ -26,46 +40,76 @@ def register(user_data: UserCreate, db: Session = Depends(get_db)):
         )
     
     # ユーザー名の重複チェック
-    if db.query(User).filter(User.username == user_data.username).first():
+    if (await db.execute(select(User.id).where(User.username == user_data.username))).first():
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="このユーザー名は既に使用されています"
         )
     
     # メールアドレスの重複チェック
-    if db.query(User).filter(User.email == user_data.email).first():
+    if (await db.execute(select(User.id).where(User.email == user_data.email))).first():
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="このメールアドレスは既に使用されています"
         )
     
     # ユーザーを作成
-    hashed_password = get_password_hash(user_data.password)
+    try:
+        hashed_password = await get_password_hash_async(user_data.password)
+    except PasswordHashBusyError:
+        logger.warning(f"パスワード処理の待ちが上限に達したため登録を拒否しました: {user_data.username}")
+        raise password_busy_error()
     db_user = User(
         username=user_data.username,
         email=user_data.email,
         password_hash=hashed_password
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
     
     logger.info(f"新規ユーザー登録: {user_data.username}")
     return db_user
 
 
 @router.post("/login", response_model=Token)
-def login(
+async def login(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """ログイン"""
+    """
+    ログイン
+
+    パスワードを検証する前に、ユーザー名ごと・IPアドレスごとの試行回数を確認し、
+    上限を超えた試行は bcrypt を実行せずに 429 で拒否する。
+    """
+    limiter = get_login_rate_limiter()
+    username_key = f"username:{form_data.username.lower()}"
+    if limiter is not None:
+        client_ip = request.client.host if request.client else "unknown"
+        retry_after = limiter.hit({
+            username_key: settings.LOGIN_RATE_LIMIT_PER_USERNAME,
+            f"ip:{client_ip}": settings.LOGIN_RATE_LIMIT_PER_IP,
+        })
+        if retry_after is not None:
+            logger.warning(f"ログイン試行回数の上限に達しました: {form_data.username}, IP={client_ip}")
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="ログインの試行回数が多すぎます。しばらくしてから再度お試しください",
+                headers={"Retry-After": retry_after_header(retry_after)},
+            )
+
     # ユーザー名またはメールアドレスで検索
-    user = db.query(User).filter(
+    user = (await db.execute(select(User).where(
         (User.username == form_data.username) | (User.email == form_data.username)
-    ).first()
+    ))).scalars().first()
     
-    if not user or not verify_password(form_data.password, user.password_hash):
+    try:
+        verified = user is not None and await verify_password_async(form_data.password, user.password_hash)
+    except PasswordHashBusyError:
+        logger.warning(f"パスワード処理の待ちが上限に達したためログインを拒否しました: {form_data.username}")
+        raise password_busy_error()
+    if not verified:
         logger.warning(f"ログイン失敗: {form_data.username}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -73,10 +117,14 @@ def login(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # 成功したユーザー名の試行回数は数え直す
+    if limiter is not None:
+        limiter.reset(username_key)
+
     # トークンを作成
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data={"sub": user.username, "uid": user.id}, expires_delta=access_token_expires
     )
     
     logger.info(f"ログイン成功: {user.username}")
@@ -84,6 +132,6 @@ def login(
 
 
 @router.get("/me", response_model=UserResponse)
-def get_current_user_info(current_user: User = Depends(get_current_user)):
+def get_current_user_info(current_user: CurrentUser = Depends(get_current_user)):
     """現在のユーザー情報を取得"""
     return current_user
@@ -1,18 +1,26 @@
+from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from app.db.database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.database import get_async_db
 from app.models.user import User
+from app.core.auth_cache import CurrentUser, get_user_cache
 from app.core.security import decode_access_token
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
 
-def get_current_user(
+async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> User:
-    """現在のユーザーを取得"""
+    db: AsyncSession = Depends(get_async_db)
+) -> CurrentUser:
+    """
+    現在のユーザーを取得
+
+    トークンにユーザーID（uid）が含まれていればキャッシュから取得し、DBには問い合わせない。
+    キャッシュにない場合と、uid を含まない古いトークンの場合はDBから読み込む。
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="認証情報を検証できませんでした",
@@ -26,9 +34,21 @@ def get_current_user(
     username: str = payload.get("sub")
     if username is None:
         raise credentials_exception
-    
-    user = db.query(User).filter(User.username == username).first()
+    user_id: Optional[int] = payload.get("uid")
+
+    cache = get_user_cache()
+    user = cache.get(user_id) if cache is not None and user_id is not None else None
     if user is None:
+        condition = User.id == user_id if user_id is not None else User.username == username
+        db_user = (await db.execute(select(User).where(condition))).scalars().first()
+        if db_user is None:
+            raise credentials_exception
+        user = CurrentUser.from_user(db_user)
+        if cache is not None:
+            cache.set(user)
+
+    # ユーザー名が変わった場合（IDが別のユーザーに再利用された場合を含む）は無効
+    if user.username != username:
         raise credentials_exception
     
     return user
@@ -1,14 +1,32 @@
-import json
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
-from sqlalchemy.orm import Session
-from PIL import Image
-from app.db.database import get_db
-from app.models.detection import DetectionHistory
-from app.models.user import User
+import asyncio
+import base64
+import binascii
+import itertools
+import tarfile
+import zipfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query, Response
+from sqlalchemy import exists, func, literal, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from app.db.database import SessionLocal, get_async_db
+from app.db.group_commit import get_group_committer
+from app.models.detection import Detection, DetectionHistory, top_labels
+from app.models.job import DetectionJob
+from app.core.auth_cache import CurrentUser
 from app.api.dependencies import get_current_user
-from app.schemas.detection import DetectionResponse, DetectionHistoryResponse
-from app.ml.detector import detect_objects
-from app.core.storage import save_image, get_image_path, delete_image
+from app.api.uploads import IMAGE_CONTENT_TYPES, max_upload_bytes, open_image, read_image_upload
+from app.schemas.detection import (
+    DetectionResponse, DetectionHistoryResponse, DetectionHistorySummary,
+    BatchDetectionItem, BatchDetectionResponse
+)
+from app.ml.pipeline import run_detection, run_detection_when_available
+from app.ml.registry import get_registry, UnknownModelError
+from app.ml.scheduler import InferenceQueueFullError
+from app.core.storage import delete_image_if_unreferenced_async, release_image, save_image_async
+from app.core.images import variant_path
 from app.core.config import settings
 import logging
 
@@ -16,91 +34,119 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api", tags=["画像解析"])
 
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png")
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz")
+
+
+def resolve_model(model: Optional[str]) -> str:
+    """リクエストで指定されたモデル名を解決（未登録の場合は400）"""
+    try:
+        return get_registry().resolve(model)
+    except UnknownModelError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"指定されたモデルは利用できません。利用可能なモデル: {', '.join(get_registry().names)}"
+        )
+
+
+def create_history(
+    user_id: int, image_path: str, detections: list, processing_time: float,
+    image_hash: Optional[str] = None
+) -> DetectionHistory:
+    """検出結果から履歴レコードを作成（検出結果は detections テーブルに1ボックス1行で保存）"""
+    created_at = datetime.now(timezone.utc)
+    return DetectionHistory(
+        user_id=user_id,
+        image_path=image_path,
+        image_hash=image_hash,
+        processing_time=processing_time,
+        detection_count=len(detections),
+        top_labels=",".join(top_labels([det.label for det in detections])),
+        created_at=created_at,
+        detections=[
+            Detection(
+                user_id=user_id,
+                label=det.label,
+                confidence=det.confidence,
+                x1=det.x1, y1=det.y1, x2=det.x2, y2=det.y2,
+                created_at=created_at
+            )
+            for det in detections
+        ]
+    )
+
+
+def image_url(image_path: str) -> str:
+    """画像URLを取得（S3の場合はそのまま、ローカルの場合は相対パスを返す）"""
+    if image_path.startswith("http"):
+        return image_path
+    # ローカル開発環境: ファイル名のみを返す（フロントエンドで処理）
+    return f"/uploads/{Path(image_path).name}"
+
+
+def variant_url(image_path: str, name: str) -> str:
+    """縮小版（thumb / preview）のURLを取得（縮小版を作成しない設定では元画像のURL）"""
+    if not settings.IMAGE_VARIANTS_ENABLED:
+        return image_url(image_path)
+    return image_url(variant_path(image_path, name))
+
 
 @router.post("/detect", response_model=DetectionResponse)
 async def detect_image(
     file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    model: Optional[str] = Form(None),
+    tiled: bool = Form(False),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """画像をアップロードして物体を検出"""
-    # ファイル形式のチェック
-    if file.content_type not in ["image/jpeg", "image/png", "image/jpg"]:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="JPGまたはPNG形式の画像をアップロードしてください"
-        )
+    """
+    画像をアップロードして物体を検出
     
-    # ファイルサイズのチェック
-    file_content = await file.read()
-    file_size_mb = len(file_content) / (1024 * 1024)
-    if file_size_mb > settings.MAX_FILE_SIZE_MB:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"ファイルサイズは{settings.MAX_FILE_SIZE_MB}MB以下である必要があります"
-        )
+    tiled=true の場合は画像を重なりのあるタイルに分割して検出する（航空写真など高解像度画像の小さな物体向け）。
+    """
+    model = resolve_model(model)
     
     try:
-        # 画像サイズのチェック（大きすぎる場合はエラー）
-        image = Image.open(file.file)
-        width, height = image.size
-        max_dimension = 10000  # 最大10000ピクセル
+        file_content, image = await read_image_upload(file)
         
-        if width > max_dimension or height > max_dimension:
+        # 物体検出（キャッシュになければ同時リクエストとまとめてバッチ推論）
+        # デコードは推論ワーカー上で1回だけ行う（スレッドにはヘッダーだけ読んだPIL画像、
+        # プロセスにはエンコード済みのバイト列を渡す）
+        try:
+            detections, processing_time, image_hash = await run_detection(file_content, image, model, tiled)
+        except InferenceQueueFullError:
+            logger.warning(f"推論キューが満杯のためリクエストを拒否: ユーザー={current_user.username}")
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"画像サイズが大きすぎます。最大{max_dimension}ピクセルまで対応しています"
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="現在混み合っています。しばらくしてから再度お試しください",
+                headers={"Retry-After": str(settings.INFERENCE_RETRY_AFTER_SECONDS)},
             )
         
-        # 画像を一時ファイルに保存
-        import tempfile
-        import os
-        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as tmp_file:
-            tmp_file.write(file_content)
-            tmp_path = tmp_file.name
+        # 画像を保存（同じ内容の画像が保存済みであれば再利用。履歴をコミットするまで削除させない）
+        image_path = await save_image_async(file_content, file.filename, image_hash=image_hash, hold=True)
         
         try:
-            # 物体検出
-            detections, processing_time = detect_objects(tmp_path)
-            
-            # 画像を保存
-            image_path = save_image(file_content, file.filename)
-            
-            # 履歴を保存
-            detection_data = {
-                "detections": [det.dict() for det in detections],
-                "processing_time": processing_time
-            }
-            history = DetectionHistory(
-                user_id=current_user.id,
-                image_path=image_path,
-                detection_results=json.dumps(detection_data, ensure_ascii=False)
-            )
-            db.add(history)
-            db.commit()
-            db.refresh(history)
-            
-            # 画像URLを取得（S3の場合はそのまま、ローカルの場合は相対パスを返す）
-            if image_path.startswith("http"):
-                image_url = image_path
+            # 履歴を保存（ID は INSERT ... RETURNING で取得するため読み直さない）
+            history = create_history(current_user.id, image_path, detections, processing_time, image_hash)
+            committer = get_group_committer()
+            if committer is not None:
+                # 同時に届いた他のリクエストの履歴とまとめてコミット
+                history = await committer.add(history)
             else:
-                # ローカル開発環境: ファイル名のみを返す（フロントエンドで処理）
-                from pathlib import Path
-                image_url = f"/uploads/{Path(image_path).name}"
-            
-            logger.info(f"検出完了: ユーザー={current_user.username}, 検出数={len(detections)}")
-            
-            return DetectionResponse(
-                id=history.id,
-                image_url=image_url,
-                detections=detections,
-                processing_time=round(processing_time, 2)
-            )
+                db.add(history)
+                await db.commit()
         finally:
-            # 一時ファイルを削除
-            if os.path.exists(tmp_path):
-                os.remove(tmp_path)
-                
+            release_image(image_path)
+        
+        logger.info(f"検出完了: ユーザー={current_user.username}, 検出数={len(detections)}")
+        
+        return DetectionResponse(
+            id=history.id,
+            image_url=image_url(image_path),
+            detections=detections,
+            processing_time=round(processing_time, 2)
+        )
+        
     except HTTPException:
         raise
     except Exception as e:
@@ -111,32 +157,298 @@ async def detect_image(
         )
 
 
-@router.get("/history", response_model=list[DetectionHistoryResponse])
-def get_history(
+def iter_batch_images(files: List[UploadFile]) -> Iterator[tuple[str, Optional[bytes], Optional[str]]]:
+    """
+    アップロードされたファイル（画像、またはzip/tarアーカイブ）から画像を1枚ずつ取り出す
+    
+    Yields:
+        (ファイル名, バイトデータ, エラーメッセージ) — 読み込めなかった場合はバイトデータが None
+    """
+    max_bytes = max_upload_bytes()
+    size_error = f"ファイルサイズは{settings.MAX_FILE_SIZE_MB}MB以下である必要があります"
+    
+    for file in files:
+        filename = file.filename or ""
+        lower = filename.lower()
+        
+        if lower.endswith(".zip"):
+            try:
+                with zipfile.ZipFile(file.file) as archive:
+                    for info in archive.infolist():
+                        name = f"{filename}/{info.filename}"
+                        if info.is_dir() or Path(info.filename).name.startswith(".") or info.filename.startswith("__MACOSX"):
+                            continue
+                        if not info.filename.lower().endswith(IMAGE_SUFFIXES):
+                            yield name, None, "JPGまたはPNG形式の画像ではありません"
+                        elif info.file_size > max_bytes:
+                            yield name, None, size_error
+                        else:
+                            yield name, archive.read(info), None
+            except zipfile.BadZipFile:
+                yield filename, None, "zipファイルを読み込めませんでした"
+        elif lower.endswith(ARCHIVE_SUFFIXES):
+            try:
+                with tarfile.open(fileobj=file.file, mode="r:*") as archive:
+                    for member in archive:
+                        name = f"{filename}/{member.name}"
+                        if not member.isfile() or Path(member.name).name.startswith("."):
+                            continue
+                        if not member.name.lower().endswith(IMAGE_SUFFIXES):
+                            yield name, None, "JPGまたはPNG形式の画像ではありません"
+                        elif member.size > max_bytes:
+                            yield name, None, size_error
+                        else:
+                            yield name, archive.extractfile(member).read(), None
+            except tarfile.TarError:
+                yield filename, None, "tarファイルを読み込めませんでした"
+        elif file.content_type not in IMAGE_CONTENT_TYPES:
+            yield filename, None, "JPGまたはPNG形式の画像をアップロードしてください"
+        else:
+            # 上限を1バイト超えて読めばサイズ超過を判定できる
+            content = file.file.read(max_bytes + 1)
+            if len(content) > max_bytes:
+                yield filename, None, size_error
+            else:
+                yield filename, content, None
+
+
+def take_batch_images(images: Iterator, count: int) -> list:
+    """iter_batch_images から最大 count 件を取り出す（アーカイブの展開を伴うためスレッドで呼び出す）"""
+    return list(itertools.islice(images, count))
+
+
+async def detect_batch_item(
+    filename: str, file_content: bytes, model: str
+) -> tuple[str, List, float, str]:
+    """
+    バッチ内の1枚を検出して画像を保存（推論キューが満杯なら空くまで待つ）
+    
+    画像は履歴をコミットするまで保持するため、呼び出し元がコミット後に release_image で解放する。
+    """
+    image = open_image(file_content)
+    detections, processing_time, image_hash = await run_detection_when_available(
+        file_content, image, model
+    )
+    image_path = await save_image_async(file_content, Path(filename).name, image_hash=image_hash, hold=True)
+    return image_path, detections, processing_time, image_hash
+
+
+@router.post("/detect/batch", response_model=BatchDetectionResponse)
+async def detect_batch(
+    files: List[UploadFile] = File(...),
+    model: Optional[str] = Form(None),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    複数の画像（またはzip/tarアーカイブ）をまとめてアップロードして物体を検出
+    
+    画像は BATCH_CHUNK_SIZE 枚ずつ推論に流し、履歴は最後に1回のコミットでまとめて保存する。
+    ファイルごとに成功・失敗を返す（一部が失敗しても他の結果は保存される）。
+    """
+    model = resolve_model(model)
+    
+    # 結果はアップロードされた順に返す（推論する画像の結果はチャンクの完了時に入れる）
+    items: List[Optional[BatchDetectionItem]] = []
+    saved: List[tuple[BatchDetectionItem, DetectionHistory, list, float]] = []
+    
+    async def process_chunk(chunk):
+        outcomes = await asyncio.gather(
+            *(detect_batch_item(name, content, model) for _, name, content in chunk),
+            return_exceptions=True
+        )
+        for (index, name, _), outcome in zip(chunk, outcomes):
+            if isinstance(outcome, HTTPException):
+                items[index] = BatchDetectionItem(filename=name, success=False, error=outcome.detail)
+            elif isinstance(outcome, Exception):
+                logger.error(f"画像解析中にエラーが発生しました: {name}: {outcome}")
+                items[index] = BatchDetectionItem(filename=name, success=False, error=f"画像解析中にエラーが発生しました: {outcome}")
+            else:
+                image_path, detections, processing_time, image_hash = outcome
+                item = items[index] = BatchDetectionItem(filename=name, success=True)
+                history = create_history(current_user.id, image_path, detections, processing_time, image_hash)
+                saved.append((item, history, detections, processing_time))
+    
+    images = iter_batch_images(files)
+    try:
+        chunk = []
+        limit_reached = False
+        while not limit_reached:
+            # zip/tarの展開とファイルの読み込みはイベントループを止めないようチャンクごとにスレッドで行う
+            pulled = await asyncio.to_thread(take_batch_images, images, settings.BATCH_CHUNK_SIZE)
+            if not pulled:
+                break
+            for name, content, error in pulled:
+                if len(items) >= settings.BATCH_MAX_IMAGES:
+                    items.append(BatchDetectionItem(
+                        filename=name, success=False,
+                        error=f"1回のリクエストで処理できる画像は{settings.BATCH_MAX_IMAGES}枚までです"
+                    ))
+                    limit_reached = True
+                    break
+                if error is not None:
+                    items.append(BatchDetectionItem(filename=name, success=False, error=error))
+                    continue
+                chunk.append((len(items), name, content))
+                items.append(None)
+                if len(chunk) >= settings.BATCH_CHUNK_SIZE:
+                    await process_chunk(chunk)
+                    chunk = []
+        if chunk:
+            await process_chunk(chunk)
+        
+        # 履歴をまとめて保存（1回のコミット）
+        if saved:
+            db.add_all([history for _, history, _, _ in saved])
+            await db.flush()
+            for item, history, detections, processing_time in saved:
+                item.result = DetectionResponse(
+                    id=history.id,
+                    image_url=image_url(history.image_path),
+                    detections=detections,
+                    processing_time=round(processing_time, 2)
+                )
+            await db.commit()
+    finally:
+        images.close()
+        for _, history, _, _ in saved:
+            release_image(history.image_path)
+    
+    succeeded = sum(1 for item in items if item.success)
+    logger.info(f"バッチ検出完了: ユーザー={current_user.username}, 成功={succeeded}, 失敗={len(items) - succeeded}")
+    return BatchDetectionResponse(
+        total=len(items),
+        succeeded=succeeded,
+        failed=len(items) - succeeded,
+        results=items
+    )
+
+
+def encode_cursor(created_at: datetime, history_id: int) -> str:
+    """履歴の (作成日時, ID) からページングカーソルを作成"""
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{history_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """ページングカーソルを (作成日時, ID) に戻す（不正な場合は400）"""
+    try:
+        created_at, history_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(history_id)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="カーソルが不正です"
+        )
+
+
+def as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """
+    日時をタイムゾーン付きのUTCに揃える（作成日時はUTCで保存している）
+
+    タイムゾーンのない日時（SQLiteから読んだ作成日時など）はUTCとみなす。
+    PostgreSQL では timestamptz とタイムゾーンなしの値を比べるとサーバーのタイムゾーンで解釈されるため、
+    タイムゾーンは外さない（SQLiteは保存形式に合わせてタイムゾーンなしの文字列で比較される）。
+    """
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+@router.get("/history", response_model=list[DetectionHistorySummary])
+async def get_history(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
     skip: int = 0,
-    limit: int = 20,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    label: Optional[str] = None,
+    min_confidence: Optional[float] = Query(None, ge=0, le=100),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """解析履歴を取得"""
-    histories = db.query(DetectionHistory).filter(
-        DetectionHistory.user_id == current_user.id
-    ).order_by(DetectionHistory.created_at.desc()).offset(skip).limit(limit).all()
+    """
+    解析履歴の要約（画像URL・検出数・主なラベル・作成日時）を新しい順に取得
+    
+    一覧に必要な列だけを読み込む。検出結果の詳細は /api/history/{id} で取得する。
+    次のページがある場合は X-Next-Cursor ヘッダーにカーソルを返す（次のリクエストの cursor に指定）。
+    (作成日時, ID) のキーセットでページングするため、何ページ目でも同じコストで取得できる。
+    label・min_confidence を指定した場合は、条件を満たす検出結果を含む履歴だけを返す。
+    """
+    query = select(
+        DetectionHistory.id,
+        DetectionHistory.image_path,
+        DetectionHistory.detection_count,
+        DetectionHistory.top_labels,
+        DetectionHistory.created_at,
+    ).where(DetectionHistory.user_id == current_user.id)
+    
+    if since is not None:
+        query = query.where(DetectionHistory.created_at >= as_utc(since))
+    if until is not None:
+        query = query.where(DetectionHistory.created_at < as_utc(until))
+    if label is not None or min_confidence is not None:
+        # 同じボックスが両方の条件を満たすこと（例: 信頼度80%以上の person）
+        conditions = [Detection.history_id == DetectionHistory.id]
+        if label is not None:
+            conditions.append(Detection.label == label)
+        if min_confidence is not None:
+            conditions.append(Detection.confidence >= min_confidence)
+        query = query.where(exists().where(*conditions))
+    
+    if cursor is not None:
+        created_at, history_id = decode_cursor(cursor)
+        # 保存時と同じ型で渡し、DBに保存された形式と同じ形式で比較する
+        query = query.where(
+            tuple_(DetectionHistory.created_at, DetectionHistory.id)
+            < tuple_(literal(as_utc(created_at), DetectionHistory.created_at.type), history_id)
+        )
+    elif skip:
+        query = query.offset(skip)
+    
+    # 1件多く取得して次のページの有無を判定
+    histories = (await db.execute(query.order_by(
+        DetectionHistory.created_at.desc(), DetectionHistory.id.desc()
+    ).limit(limit + 1))).all()
     
-    return histories
+    if len(histories) > limit:
+        histories = histories[:limit]
+        last = histories[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(last.created_at, last.id)
+    
+    return [
+        DetectionHistorySummary(
+            id=history.id,
+            image_url=image_url(history.image_path),
+            thumbnail_url=variant_url(history.image_path, "thumb"),
+            detection_count=history.detection_count or 0,
+            top_labels=history.top_labels.split(",") if history.top_labels else [],
+            created_at=history.created_at
+        )
+        for history in histories
+    ]
+
+
+async def find_history(db: AsyncSession, history_id: int, user_id: int) -> Optional[DetectionHistory]:
+    """ユーザーの履歴を検出結果とともに取得（非同期セッションでは遅延読み込みできないため一緒に読み込む）"""
+    result = await db.execute(
+        select(DetectionHistory)
+        .options(selectinload(DetectionHistory.detections))
+        .where(DetectionHistory.id == history_id, DetectionHistory.user_id == user_id)
+    )
+    return result.scalars().first()
 
 
 @router.get("/history/{history_id}", response_model=DetectionHistoryResponse)
-def get_history_detail(
+async def get_history_detail(
     history_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """特定の解析履歴の詳細を取得"""
-    history = db.query(DetectionHistory).filter(
-        DetectionHistory.id == history_id,
-        DetectionHistory.user_id == current_user.id
-    ).first()
+    history = await find_history(db, history_id, current_user.id)
     
     if not history:
         raise HTTPException(
@@ -144,20 +456,41 @@ def get_history_detail(
             detail="履歴が見つかりません"
         )
     
-    return history
+    response = DetectionHistoryResponse.model_validate(history)
+    response.image_url = image_url(history.image_path)
+    response.preview_url = variant_url(history.image_path, "preview")
+    return response
+
+
+def image_reference_count(image_path: str) -> int:
+    """
+    画像を参照している履歴と、処理待ち・処理中のジョブの数（コミット済みのデータを数える）
+    
+    画像の削除と同じロックの中で呼ばれるため、同期のセッションで数える。
+    image_hash を持たない旧い履歴も数えるよう、image_path だけで比較する。
+    """
+    db = SessionLocal()
+    try:
+        histories = db.query(func.count(DetectionHistory.id)).filter(
+            DetectionHistory.image_path == image_path
+        ).scalar()
+        jobs = db.query(func.count(DetectionJob.id)).filter(
+            DetectionJob.image_path == image_path,
+            DetectionJob.status.in_(["pending", "running"])
+        ).scalar()
+        return histories + jobs
+    finally:
+        db.close()
 
 
 @router.delete("/history/{history_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_history(
+async def delete_history(
     history_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """解析履歴を削除"""
-    history = db.query(DetectionHistory).filter(
-        DetectionHistory.id == history_id,
-        DetectionHistory.user_id == current_user.id
-    ).first()
+    history = await find_history(db, history_id, current_user.id)
     
     if not history:
         raise HTTPException(
@@ -165,11 +498,12 @@ def delete_history(
             detail="履歴が見つかりません"
         )
     
-    # 画像も削除
-    delete_image(history.image_path)
-    
-    db.delete(history)
-    db.commit()
+    image_path = history.image_path
+    await db.delete(history)
+    await db.commit()
+    # 同じ画像を参照する履歴・処理待ちのジョブが残っておらず、保存中の処理にも
+    # 保持されていなければ画像も削除（コミット後に、保存と直列に数え直して削除）
+    await delete_image_if_unreferenced_async(image_path, image_reference_count)
     
     logger.info(f"履歴を削除: ユーザー={current_user.username}, 履歴ID={history_id}")
     return None
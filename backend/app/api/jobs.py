@@ -0,0 +1,241 @@
+import asyncio
+import io
+import uuid
+from datetime import datetime, timezone
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from PIL import Image
+from app.db.database import get_async_db, SessionLocal
+from app.models.detection import DetectionHistory
+from app.models.job import DetectionJob
+from app.core.auth_cache import CurrentUser
+from app.api.dependencies import get_current_user
+from app.api.detection import create_history, image_url, resolve_model
+from app.api.uploads import read_image_upload
+from app.schemas.detection import DetectionBox, DetectionJobResponse, DetectionResponse
+from app.ml.pipeline import run_detection_when_available
+from app.core.storage import load_image_bytes, release_image, save_image_async
+from app.core.cache import content_hash
+from app.core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/jobs", tags=["画像解析"])
+
+
+class JobWorker:
+    """
+    検出ジョブをバックグラウンドで処理するワーカー
+
+    ジョブは detection_jobs テーブルに保存され（外部ブローカー不要の永続キュー）、
+    プロセス内のキューで待機中のジョブIDをワーカーに渡す。
+    起動時には未完了のジョブをテーブルから読み込んで再投入する。
+    """
+
+    def __init__(self, workers: Optional[int] = None, session_factory=SessionLocal):
+        self.workers = max(1, workers or settings.JOB_WORKERS)
+        self.session_factory = session_factory
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        """ワーカーを開始し、未完了のジョブを再投入"""
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        for job_id in await asyncio.to_thread(self._recover):
+            self.enqueue(job_id)
+
+    async def stop(self):
+        """ワーカーを停止"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def enqueue(self, job_id: str):
+        """ジョブを処理待ちに追加"""
+        self._queue.put_nowait(job_id)
+
+    def _recover(self) -> List[str]:
+        # 前回の停止時に処理中だったジョブは最初からやり直す
+        db = self.session_factory()
+        try:
+            db.execute(
+                update(DetectionJob).where(DetectionJob.status == "running").values(status="pending")
+            )
+            db.commit()
+            jobs = db.query(DetectionJob.id).filter(
+                DetectionJob.status == "pending"
+            ).order_by(DetectionJob.created_at).all()
+            return [job_id for job_id, in jobs]
+        finally:
+            db.close()
+
+    async def _work(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._process(job_id)
+            except Exception as e:
+                logger.error(f"ジョブの処理に失敗しました: ジョブID={job_id}: {e}", exc_info=True)
+                await asyncio.to_thread(self._fail, job_id, str(e))
+
+    async def _process(self, job_id: str):
+        job = await asyncio.to_thread(self._claim, job_id)
+        if job is None:
+            return  # 他のワーカーが処理済み
+        user_id, image_path, model = job
+
+        file_content = await asyncio.to_thread(load_image_bytes, image_path)
+        image = Image.open(io.BytesIO(file_content))
+        # ジョブは急がないため、推論キューが満杯なら空くまで待って再試行
+        detections, processing_time, image_hash = await run_detection_when_available(file_content, image, model)
+
+        await asyncio.to_thread(
+            self._complete, job_id, user_id, image_path, detections, processing_time, image_hash
+        )
+        logger.info(f"ジョブ完了: ジョブID={job_id}, 検出数={len(detections)}")
+
+    def _claim(self, job_id: str) -> Optional[tuple]:
+        # 待機中のジョブだけを処理中に更新（同じジョブの二重処理を防ぐ）
+        db = self.session_factory()
+        try:
+            claimed = db.execute(
+                update(DetectionJob)
+                .where(DetectionJob.id == job_id, DetectionJob.status == "pending")
+                .values(status="running", started_at=datetime.now(timezone.utc))
+            ).rowcount
+            db.commit()
+            if not claimed:
+                return None
+            job = db.get(DetectionJob, job_id)
+            return job.user_id, job.image_path, job.model
+        finally:
+            db.close()
+
+    def _complete(
+        self, job_id: str, user_id: int, image_path: str,
+        detections: List[DetectionBox], processing_time: float, image_hash: Optional[str] = None
+    ):
+        db = self.session_factory()
+        try:
+            history = create_history(user_id, image_path, detections, processing_time, image_hash)
+            db.add(history)
+            db.flush()
+            job = db.get(DetectionJob, job_id)
+            job.status = "completed"
+            job.history_id = history.id
+            job.finished_at = datetime.now(timezone.utc)
+            db.commit()
+        finally:
+            db.close()
+
+    def _fail(self, job_id: str, error: str):
+        db = self.session_factory()
+        try:
+            job = db.get(DetectionJob, job_id)
+            if job is not None:
+                job.status = "failed"
+                job.error = error
+                job.finished_at = datetime.now(timezone.utc)
+                db.commit()
+        finally:
+            db.close()
+
+
+_job_worker: Optional[JobWorker] = None
+
+
+def get_job_worker() -> JobWorker:
+    """ジョブワーカーを取得（シングルトン）"""
+    global _job_worker
+    if _job_worker is None:
+        _job_worker = JobWorker()
+    return _job_worker
+
+
+async def job_response(job: DetectionJob, db: AsyncSession) -> DetectionJobResponse:
+    """ジョブの状態と、完了していれば検出結果を返す"""
+    response = DetectionJobResponse.model_validate(job)
+    if job.status == "completed" and job.history_id is not None:
+        history = await db.get(
+            DetectionHistory, job.history_id, options=[selectinload(DetectionHistory.detections)]
+        )
+        if history is not None:
+            response.result = DetectionResponse(
+                id=history.id,
+                image_url=image_url(history.image_path),
+                detections=history.detections,
+                processing_time=round(history.processing_time or 0.0, 2)
+            )
+    return response
+
+
+@router.post("", response_model=DetectionJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit_job(
+    file: UploadFile = File(...),
+    model: Optional[str] = Form(None),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """画像をアップロードして検出ジョブを登録（結果は GET /api/jobs/{job_id} で取得）"""
+    model = resolve_model(model)
+
+    try:
+        file_content, _ = await read_image_upload(file)
+
+        # 画像を保存してジョブを登録
+        # ジョブをコミットするまで画像を削除させない
+        image_path = await save_image_async(
+            file_content, file.filename, image_hash=content_hash(file_content), hold=True
+        )
+        try:
+            job = DetectionJob(
+                id=str(uuid.uuid4()),
+                user_id=current_user.id,
+                status="pending",
+                image_path=image_path,
+                filename=file.filename,
+                model=model
+            )
+            db.add(job)
+            await db.commit()
+        finally:
+            release_image(image_path)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"ジョブの登録中にエラーが発生しました: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"ジョブの登録中にエラーが発生しました: {str(e)}"
+        )
+
+    get_job_worker().enqueue(job.id)
+    logger.info(f"ジョブを登録: ユーザー={current_user.username}, ジョブID={job.id}")
+    return await job_response(job, db)
+
+
+@router.get("/{job_id}", response_model=DetectionJobResponse)
+async def get_job(
+    job_id: str,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """検出ジョブの状態と結果を取得"""
+    job = (await db.execute(select(DetectionJob).where(
+        DetectionJob.id == job_id,
+        DetectionJob.user_id == current_user.id
+    ))).scalars().first()
+
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="ジョブが見つかりません"
+        )
+
+    return await job_response(job, db)
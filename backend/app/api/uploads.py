@@ -0,0 +1,157 @@
+import io
+import warnings
+from typing import Optional
+from fastapi import HTTPException, Request, UploadFile, status
+from fastapi.responses import JSONResponse
+from PIL import Image, UnidentifiedImageError
+from app.core.config import settings
+
+# 展開後のピクセル数が上限を超える画像（解凍爆弾）はデコード前に拒否する
+Image.MAX_IMAGE_PIXELS = settings.MAX_IMAGE_PIXELS
+
+IMAGE_CONTENT_TYPES = ["image/jpeg", "image/png", "image/jpg"]
+
+# ファイル先頭のシグネチャ（content_type は信用しない）
+IMAGE_SIGNATURES = {
+    b"\xff\xd8\xff": "JPEG",
+    b"\x89PNG\r\n\x1a\n": "PNG",
+}
+
+# 単一画像をアップロードするエンドポイント（Content-Length で事前に拒否する）
+SINGLE_UPLOAD_PATHS = {"/api/detect", "/api/jobs"}
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+def max_upload_bytes() -> int:
+    return settings.MAX_FILE_SIZE_MB * 1024 * 1024
+
+
+def file_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"ファイルサイズは{settings.MAX_FILE_SIZE_MB}MB以下である必要があります"
+    )
+
+
+def invalid_image() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="JPGまたはPNG形式の画像をアップロードしてください"
+    )
+
+
+def sniff_image_format(header: bytes) -> Optional[str]:
+    """ファイル先頭のバイト列から画像形式を判定（対応していない形式は None）"""
+    for signature, image_format in IMAGE_SIGNATURES.items():
+        if header.startswith(signature):
+            return image_format
+    return None
+
+
+def probe_image(data: bytes) -> Optional[Image.Image]:
+    """
+    ヘッダーだけを読んで画像を開く（ピクセルデータはデコードしない）
+
+    データの途中までしかない場合など、ヘッダーを解析できなければ None を返す。
+
+    Raises:
+        HTTPException: ピクセル数が上限を超える場合（解凍爆弾）
+    """
+    try:
+        with warnings.catch_warnings():
+            # 上限を超えた時点で警告ではなくエラーとして扱う
+            warnings.simplefilter("error", Image.DecompressionBombWarning)
+            return Image.open(io.BytesIO(data))
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="画像のピクセル数が大きすぎます"
+        )
+    except (UnidentifiedImageError, OSError, SyntaxError, EOFError):
+        return None
+
+
+def check_image_dimensions(image: Image.Image):
+    """画像サイズのチェック（大きすぎる場合はエラー）"""
+    width, height = image.size
+    max_dimension = settings.MAX_IMAGE_DIMENSION
+
+    if width > max_dimension or height > max_dimension:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"画像サイズが大きすぎます。最大{max_dimension}ピクセルまで対応しています"
+        )
+
+
+def open_image(file_content: bytes) -> Image.Image:
+    """ファイルサイズ・形式・画像サイズをチェックして画像を開く（ヘッダーのみ読み込み）"""
+    if len(file_content) > max_upload_bytes():
+        raise file_too_large()
+    if sniff_image_format(file_content[:16]) is None:
+        raise invalid_image()
+
+    image = probe_image(file_content)
+    if image is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="画像を読み込めませんでした"
+        )
+    check_image_dimensions(image)
+    return image
+
+
+async def read_image_upload(file: UploadFile) -> tuple[bytes, Image.Image]:
+    """
+    アップロードされた画像をチャンクごとに読み込み、形式・ファイルサイズ・画像サイズをチェック
+
+    上限を超えた時点で読み込みを打ち切るため、1リクエストのメモリ使用量は
+    MAX_FILE_SIZE_MB + 1チャンクを超えない。形式と画像サイズは先頭のヘッダーで判定し、
+    条件を満たさない画像は残りを読み込む前に拒否する。
+
+    Returns:
+        (ファイルのバイトデータ, ヘッダーだけ読んだPIL画像)
+    """
+    if file.content_type not in IMAGE_CONTENT_TYPES:
+        raise invalid_image()
+
+    max_bytes = max_upload_bytes()
+    if file.size is not None and file.size > max_bytes:
+        raise file_too_large()
+
+    buffer = bytearray()
+    header_checked = False
+    while True:
+        chunk = await file.read(settings.UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        buffer += chunk
+        if len(buffer) > max_bytes:
+            raise file_too_large()
+
+        if not header_checked and len(buffer) <= settings.UPLOAD_HEADER_PROBE_BYTES:
+            if sniff_image_format(bytes(buffer[:16])) is None:
+                raise invalid_image()
+            image = probe_image(bytes(buffer))
+            if image is not None:
+                check_image_dimensions(image)
+                header_checked = True
+
+    file_content = bytes(buffer)
+    return file_content, open_image(file_content)
+
+
+async def limit_upload_size(request: Request, call_next):
+    """Content-Length が上限を超える単一画像のアップロードを本文を読む前に拒否（413）"""
+    content_length = request.headers.get("content-length")
+    if (
+        request.method == "POST"
+        and request.url.path in SINGLE_UPLOAD_PATHS
+        and content_length is not None
+        and content_length.isdigit()
+        and int(content_length) > max_upload_bytes() + MULTIPART_OVERHEAD_BYTES
+    ):
+        return JSONResponse(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            content={"detail": f"ファイルサイズは{settings.MAX_FILE_SIZE_MB}MB以下である必要があります"}
+        )
+    return await call_next(request)
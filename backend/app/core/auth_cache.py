@@ -0,0 +1,113 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import event
+from app.models.user import User
+from app.core.config import settings
+
+
+@dataclass(frozen=True)
+class CurrentUser:
+    """
+    認証済みユーザーのスナップショット
+
+    セッションに紐づかないため、キャッシュしたままリクエストをまたいで使える。
+    パスワードハッシュは持たない。
+    """
+    id: int
+    username: str
+    email: str
+    created_at: Optional[datetime] = None
+
+    @classmethod
+    def from_user(cls, user: User) -> "CurrentUser":
+        return cls(id=user.id, username=user.username, email=user.email, created_at=user.created_at)
+
+
+class UserCache:
+    """
+    ユーザーIDをキーにした認証済みユーザーのキャッシュ（サイズ上限・TTL付きLRU）
+
+    ユーザーの更新・削除は SQLAlchemy のイベントで検知して破棄する。
+    イベントは同じプロセス内でしか届かないため、他のプロセスでの変更は TTL の経過後に反映される。
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        self.max_entries = max_entries or settings.AUTH_CACHE_MAX_ENTRIES
+        self.ttl = ttl_seconds if ttl_seconds is not None else settings.AUTH_CACHE_TTL_SECONDS
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, user_id: int) -> Optional[CurrentUser]:
+        """キャッシュされたユーザーを取得（なければ None）"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] <= now:
+                del self._entries[user_id]
+                entry = None
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self._hits += 1
+            return entry[1]
+
+    def set(self, user: CurrentUser):
+        """ユーザーをキャッシュに保存"""
+        with self._lock:
+            self._entries[user.id] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        """ユーザーのキャッシュを破棄"""
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def stats(self) -> dict:
+        """ヒット数・ミス数などの統計情報を取得"""
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / total, 4) if total else 0.0,
+            }
+
+    def clear(self):
+        """キャッシュを全て破棄"""
+        with self._lock:
+            self._entries.clear()
+            self._hits = 0
+            self._misses = 0
+
+
+_user_cache: Optional[UserCache] = None
+
+
+def get_user_cache() -> Optional[UserCache]:
+    """認証済みユーザーのキャッシュを取得（無効化されている場合は None）"""
+    global _user_cache
+    if not settings.AUTH_CACHE_ENABLED:
+        return None
+    if _user_cache is None:
+        _user_cache = UserCache()
+    return _user_cache
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_user(mapper, connection, target: User):
+    # 変更を書き込んだ時点で破棄する（キャッシュが未作成なら何もしない）
+    if _user_cache is not None and target.id is not None:
+        _user_cache.invalidate(target.id)
@@ -0,0 +1,253 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional
+from app.schemas.detection import DetectionBox
+from app.core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# SQLiteの期限切れ・上限超過分を削除する間隔（秒）
+PURGE_INTERVAL_SECONDS = 60
+
+
+def content_hash(content: bytes) -> str:
+    """画像バイト列のSHA-256ハッシュを取得"""
+    return hashlib.sha256(content).hexdigest()
+
+
+class DetectionCache:
+    """
+    画像内容のハッシュをキーにした検出結果キャッシュ（サイズ上限・TTL付きLRU）
+
+    backend="sqlite" の場合はメモリ上のLRUの後ろにSQLiteファイルを置き、
+    プロセス再起動後もキャッシュを再利用できるようにする。
+    SQLiteの期限切れ・上限超過分の削除は保存のたびではなく、上限を1割超えたときか
+    PURGE_INTERVAL_SECONDS ごとにまとめて行う（それまでは上限を少し超えて保持する）。
+    あわせて「画像ハッシュ → 保存済み画像パス」の対応を保持し、同じ画像の重複保存を防ぐ。
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        backend: Optional[str] = None,
+        path: Optional[str] = None,
+    ):
+        self.max_entries = max_entries or settings.DETECTION_CACHE_MAX_ENTRIES
+        self.ttl = ttl_seconds if ttl_seconds is not None else settings.DETECTION_CACHE_TTL_SECONDS
+        self.backend = backend or settings.DETECTION_CACHE_BACKEND
+        self._entries: OrderedDict = OrderedDict()
+        self._images: OrderedDict = OrderedDict()
+        self._image_hashes: dict = {}  # 画像パス → ハッシュの集合（_images の逆引き）
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._stored = 0  # SQLiteの行数（前回の削除以降の保存回数を足した上限の見積もり）
+        self._purged_at = time.monotonic()
+
+        if self.backend == "sqlite":
+            db_path = Path(path or settings.DETECTION_CACHE_PATH)
+            db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS detection_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_detection_cache_expires_at ON detection_cache (expires_at)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS image_store ("
+                "hash TEXT PRIMARY KEY, path TEXT NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_image_store_path ON image_store (path)")
+            self._conn.commit()
+            self._stored = self._conn.execute("SELECT COUNT(*) FROM detection_cache").fetchone()[0]
+        elif self.backend != "memory":
+            raise ValueError(f"未対応の DETECTION_CACHE_BACKEND です: {self.backend}")
+
+    @staticmethod
+    def make_key(image_hash: str, params: dict) -> str:
+        """画像ハッシュとモデル名・推論パラメータからキャッシュキーを作成"""
+        params_json = json.dumps(params, sort_keys=True)
+        return f"{image_hash}:{hashlib.sha256(params_json.encode()).hexdigest()[:16]}"
+
+    def get(self, key: str) -> Optional[tuple[List[DetectionBox], float]]:
+        """キャッシュされた (検出結果のリスト, 処理時間) を取得（なければ None）"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._entries[key]
+                entry = None
+            if entry is None and self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT value, expires_at FROM detection_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[1] > now:
+                    entry = (row[1], row[0])
+                    self._put_memory(self._entries, key, entry)
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            value = entry[1]
+
+        data = json.loads(value)
+        return [DetectionBox(**det) for det in data["detections"]], data["processing_time"]
+
+    def set(self, key: str, detections: List[DetectionBox], processing_time: float):
+        """検出結果をキャッシュに保存"""
+        value = json.dumps({
+            "detections": [det.model_dump() for det in detections],
+            "processing_time": processing_time
+        }, ensure_ascii=False)
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._put_memory(self._entries, key, (expires_at, value))
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO detection_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, value, expires_at)
+                )
+                self._stored += 1
+                overflow = self._stored > self.max_entries + max(1, self.max_entries // 10)
+                if overflow or time.monotonic() - self._purged_at >= PURGE_INTERVAL_SECONDS:
+                    self._purge()
+                self._conn.commit()
+
+    async def get_async(self, key: str) -> Optional[tuple[List[DetectionBox], float]]:
+        """get と同じ（SQLiteバックエンドの場合はイベントループを止めないようスレッドで実行）"""
+        if self._conn is None:
+            return self.get(key)
+        return await asyncio.to_thread(self.get, key)
+
+    async def set_async(self, key: str, detections: List[DetectionBox], processing_time: float):
+        """set と同じ（SQLiteバックエンドの場合はイベントループを止めないようスレッドで実行）"""
+        if self._conn is None:
+            self.set(key, detections, processing_time)
+        else:
+            await asyncio.to_thread(self.set, key, detections, processing_time)
+
+    def get_image_path(self, image_hash: str) -> Optional[str]:
+        """同じ内容の画像が保存済みであればそのパスまたはURLを取得"""
+        with self._lock:
+            path = self._images.get(image_hash)
+            if path is None and self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT path FROM image_store WHERE hash = ?", (image_hash,)
+                ).fetchone()
+                path = row[0] if row else None
+        # ローカルファイルが消えている場合は再利用しない
+        if path is not None and not path.startswith("http") and not os.path.exists(path):
+            self.forget_image_path(path)
+            return None
+        return path
+
+    def set_image_path(self, image_hash: str, path: str):
+        """画像ハッシュと保存先の対応を記録"""
+        with self._lock:
+            self._put_image(image_hash, path)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO image_store (hash, path) VALUES (?, ?)", (image_hash, path)
+                )
+                self._conn.commit()
+
+    def forget_image_path(self, path: str):
+        """削除された画像の対応を破棄"""
+        with self._lock:
+            for image_hash in self._image_hashes.pop(path, ()):
+                self._images.pop(image_hash, None)
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM image_store WHERE path = ?", (path,))
+                self._conn.commit()
+
+    def stats(self) -> dict:
+        """ヒット数・ミス数などの統計情報を取得"""
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "backend": self.backend,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / total, 4) if total else 0.0,
+            }
+
+    def clear(self):
+        """キャッシュを全て破棄"""
+        with self._lock:
+            self._entries.clear()
+            self._images.clear()
+            self._image_hashes.clear()
+            self._hits = 0
+            self._misses = 0
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM detection_cache")
+                self._conn.execute("DELETE FROM image_store")
+                self._conn.commit()
+                self._stored = 0
+
+    def _put_memory(self, store: OrderedDict, key: str, value):
+        store[key] = value
+        store.move_to_end(key)
+        while len(store) > self.max_entries:
+            store.popitem(last=False)
+
+    def _put_image(self, image_hash: str, path: str):
+        old_path = self._images.get(image_hash)
+        if old_path is not None:
+            self._unlink_image(image_hash, old_path)
+        self._images[image_hash] = path
+        self._images.move_to_end(image_hash)
+        self._image_hashes.setdefault(path, set()).add(image_hash)
+        while len(self._images) > self.max_entries:
+            evicted_hash, evicted_path = self._images.popitem(last=False)
+            self._unlink_image(evicted_hash, evicted_path)
+
+    def _unlink_image(self, image_hash: str, path: str):
+        hashes = self._image_hashes.get(path)
+        if hashes is not None:
+            hashes.discard(image_hash)
+            if not hashes:
+                del self._image_hashes[path]
+
+    def _purge(self):
+        # 期限切れと上限超過分（有効期限の古い順）を削除（ロックを取った状態で呼ぶ）
+        self._conn.execute("DELETE FROM detection_cache WHERE expires_at <= ?", (time.time(),))
+        count = self._conn.execute("SELECT COUNT(*) FROM detection_cache").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM detection_cache WHERE key IN ("
+                "SELECT key FROM detection_cache ORDER BY expires_at LIMIT ?)",
+                (count - self.max_entries,)
+            )
+            count = self.max_entries
+        self._stored = count
+        self._purged_at = time.monotonic()
+
+
+_detection_cache: Optional[DetectionCache] = None
+
+
+def get_detection_cache() -> Optional[DetectionCache]:
+    """検出結果キャッシュを取得（無効化されている場合は None）"""
+    global _detection_cache
+    if not settings.DETECTION_CACHE_ENABLED:
+        return None
+    if _detection_cache is None:
+        _detection_cache = DetectionCache()
+    return _detection_cache
@@ -1,3 +1,4 @@
+from pydantic import field_validator
 from pydantic_settings import BaseSettings
 from typing import Optional
 
@@ -8,18 +9,130 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
 
+    # 認証済みユーザーのキャッシュ（トークンの検証ごとのDB問い合わせを省く）
+    AUTH_CACHE_ENABLED: bool = True
+    AUTH_CACHE_MAX_ENTRIES: int = 10000
+    AUTH_CACHE_TTL_SECONDS: float = 60  # 他のプロセスでの変更が反映されるまでの最大時間
+
+    # パスワードハッシュ（bcrypt は専用のスレッドで実行する）
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 64  # 実行中・実行待ちの上限（超えた場合は503を返す）
+    PASSWORD_HASH_RETRY_AFTER_SECONDS: int = 1
+
+    # ログインの試行回数制限（スライディングウィンドウ）
+    LOGIN_RATE_LIMIT_ENABLED: bool = True
+    LOGIN_RATE_LIMIT_WINDOW_SECONDS: float = 60
+    LOGIN_RATE_LIMIT_PER_USERNAME: int = 5
+    LOGIN_RATE_LIMIT_PER_IP: int = 20
+
     # データベース
     DATABASE_URL: str = "sqlite:///./pixeon.db"
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 30
+    DB_POOL_PRE_PING: bool = True  # 使う前に接続が生きているか確認する
+    DB_POOL_RECYCLE_SECONDS: int = 1800  # この秒数より古い接続は作り直す（-1 で無効）
+    DB_STATEMENT_TIMEOUT_MS: int = 0  # PostgreSQL のクエリタイムアウト（0 で無効）
+    SQLITE_JOURNAL_MODE: str = "wal"  # wal なら読み込みと書き込みが互いを待たない
+    SQLITE_SYNCHRONOUS: str = "normal"  # WAL では normal でもコミット済みのデータは壊れない
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000  # 書き込みロックを待つ時間
+    SQLITE_CACHE_SIZE_KB: int = 16384  # 接続ごとのページキャッシュ
+    DB_GROUP_COMMIT_ENABLED: bool = False  # 同時リクエストの履歴を1つのトランザクションでコミットする
+    DB_GROUP_COMMIT_WINDOW_MS: float = 5.0  # 最初の履歴が届いてからまとめるのを待つ時間
+    DB_GROUP_COMMIT_MAX_BATCH: int = 64
 
     # AWS設定
     AWS_ACCESS_KEY_ID: Optional[str] = None
     AWS_SECRET_ACCESS_KEY: Optional[str] = None
     AWS_REGION: str = "ap-northeast-1"
     AWS_S3_BUCKET: Optional[str] = None
+    S3_MAX_POOL_CONNECTIONS: int = 50  # S3クライアントの接続プールの大きさ
+    S3_MAX_ATTEMPTS: int = 5  # boto3のリトライを含む最大試行回数
+    S3_RETRY_MODE: str = "adaptive"  # legacy / standard / adaptive
+    S3_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    S3_READ_TIMEOUT_SECONDS: float = 60.0
+    S3_MULTIPART_THRESHOLD_MB: int = 8  # これを超えるファイルはマルチパートでアップロード
+    S3_MULTIPART_CHUNKSIZE_MB: int = 8
+    S3_MAX_CONCURRENCY: int = 4  # 1ファイルのマルチパート転送の並列数
+
+    # 画像内容の SHA-256 をファイル名にして、同じ画像を1つだけ保存する
+    STORAGE_CONTENT_ADDRESSED: bool = True
+
+    # S3への書き込み（ステージング領域に保存した時点で応答し、アップロードはバックグラウンドで実行）
+    STORAGE_BACKGROUND_UPLOAD: bool = True
+    STORAGE_STAGING_PATH: str = "./staging"  # アップロード待ちの画像と削除予約の保存先
+    STORAGE_UPLOAD_WORKERS: int = 4
+    STORAGE_UPLOAD_RETRIES: int = 5
+    STORAGE_UPLOAD_BACKOFF_SECONDS: float = 0.5  # 再試行の間隔（試行ごとに2倍）
+    STORAGE_SHUTDOWN_TIMEOUT_SECONDS: float = 10.0  # 終了時にアップロードの完了を待つ時間
 
     # ローカル開発設定
     LOCAL_STORAGE_PATH: str = "./uploads"
     MAX_FILE_SIZE_MB: int = 10
+    MAX_IMAGE_DIMENSION: int = 10000  # 画像の幅・高さの上限（ピクセル）
+    MAX_IMAGE_PIXELS: int = 100_000_000  # 展開後のピクセル数の上限（解凍爆弾対策）
+    UPLOAD_CHUNK_SIZE: int = 64 * 1024  # アップロードを読み込むチャンクサイズ（バイト）
+    UPLOAD_HEADER_PROBE_BYTES: int = 1024 * 1024  # 画像ヘッダーを探す範囲（バイト）
+
+    # 縮小版（履歴一覧用のサムネイルと詳細表示用のプレビュー、元画像と同じ場所に保存）
+    IMAGE_VARIANTS_ENABLED: bool = True
+    THUMBNAIL_SIZE: int = 256  # サムネイルの長辺（ピクセル）
+    PREVIEW_SIZE: int = 1024  # プレビューの長辺（ピクセル）
+    IMAGE_VARIANT_FORMAT: str = "webp"  # webp / jpeg
+    IMAGE_VARIANT_QUALITY: int = 80
+
+    # 物体検出モデル
+    MODEL_PATH: str = "yolov8n.pt"  # デフォルトモデル
+    MODELS: str = ""  # 追加で使えるモデル（カンマ区切り、例: yolov8s.pt,yolov8m.pt）
+    MODEL_PRELOAD: bool = True  # 起動時に全モデルをロード
+    MODEL_WARMUP: bool = True  # ロード後にウォームアップ推論を実行
+    INFERENCE_BACKEND: str = "torch"  # torch / onnx / openvino
+    INFERENCE_THREADS: int = 0  # 推論エンジンのスレッド数（0は自動）
+    MODEL_CACHE_DIR: str = "./model_cache"  # エクスポート済みモデルの保存先
+    INFERENCE_IMGSZ: int = 640
+    INFERENCE_CONF: float = 0.25
+    INFERENCE_IOU: float = 0.7
+    INFERENCE_MAX_DET: int = 300
+    INFERENCE_MAX_NMS: int = 3000  # NMSの対象にする候補の上限（信頼度の高い順）
+    MODEL_PRECISION: str = "fp32"  # fp32 / fp16 / int8（onnx・openvino バックエンドのみ量子化に対応）
+    QUANT_CALIBRATION_DIR: Optional[str] = None  # INT8静的量子化のキャリブレーション画像フォルダ
+    QUANT_CALIBRATION_MAX_IMAGES: int = 64
+
+    # タイル検出（/api/detect の tiled=true）
+    TILE_SIZE: int = 640  # タイルの一辺（ピクセル）
+    TILE_OVERLAP: float = 0.2  # 隣接タイルの重なり（タイルサイズに対する割合）
+    TILE_MAX_TILES: int = 16  # 1枚あたりの最大タイル数（画像全体の推論を含む。超える場合はタイルを大きくする）
+    TILE_INCLUDE_FULL: bool = True  # 画像全体の縮小版も一緒に推論する（大きな物体向け）
+
+    # 推論スケジューラ（マイクロバッチング）
+    INFERENCE_MAX_BATCH_SIZE: int = 8
+    INFERENCE_MAX_WAIT_MS: float = 10.0
+    INFERENCE_EXECUTOR: str = "thread"  # thread または process
+    INFERENCE_WORKERS: int = 1  # モデルごとのワーカー数（ワーカープールはモデルごとに作る）
+    INFERENCE_QUEUE_SIZE: int = 64
+    INFERENCE_RETRY_AFTER_SECONDS: int = 1
+
+    # バッチ検出
+    BATCH_MAX_IMAGES: int = 500  # 1リクエストで処理する最大画像数（アーカイブ内の画像を含む）
+    BATCH_CHUNK_SIZE: int = 16  # 同時に推論へ流す画像数
+
+    # 検出ジョブ
+    JOB_WORKERS: int = 2
+
+    # 検出結果キャッシュ
+    DETECTION_CACHE_ENABLED: bool = True
+    DETECTION_CACHE_MAX_ENTRIES: int = 1024
+    DETECTION_CACHE_TTL_SECONDS: float = 86400
+    DETECTION_CACHE_BACKEND: str = "memory"  # memory または sqlite
+    DETECTION_CACHE_PATH: str = "./detection_cache.db"
+
+    @field_validator("TILE_OVERLAP")
+    @classmethod
+    def check_tile_overlap(cls, value: float) -> float:
+        # 1以上だとタイルの間隔が0以下になるため、起動時に弾く
+        if not 0 <= value < 1:
+            raise ValueError("TILE_OVERLAP は0以上1未満である必要があります")
+        return value
 
     class Config:
         env_file = ".env"
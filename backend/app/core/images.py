@@ -0,0 +1,58 @@
+import io
+from pathlib import Path
+from typing import Dict
+from PIL import Image, ImageOps
+from app.core.config import settings
+
+# 縮小版の種類（履歴一覧用のサムネイルと詳細表示用のプレビュー）
+VARIANTS = ("thumb", "preview")
+
+
+def variant_size(name: str) -> int:
+    """縮小版の長辺のピクセル数"""
+    return settings.THUMBNAIL_SIZE if name == "thumb" else settings.PREVIEW_SIZE
+
+
+def variant_content_type() -> str:
+    return "image/webp" if settings.IMAGE_VARIANT_FORMAT == "webp" else "image/jpeg"
+
+
+def variant_filename(filename: str, name: str) -> str:
+    """元画像のファイル名から縮小版のファイル名を作成（例: abc.png → abc_thumb.webp）"""
+    suffix = ".webp" if settings.IMAGE_VARIANT_FORMAT == "webp" else ".jpg"
+    return f"{Path(filename).stem}_{name}{suffix}"
+
+
+def variant_path(image_path: str, name: str) -> str:
+    """元画像のパスまたはURLから、同じ場所に保存した縮小版のパスまたはURLを取得"""
+    if image_path.startswith("http"):
+        base, filename = image_path.rsplit("/", 1)
+        return f"{base}/{variant_filename(filename, name)}"
+    path = Path(image_path)
+    return str(path.with_name(variant_filename(path.name, name)))
+
+
+def render_variants(file_content: bytes) -> Dict[str, bytes]:
+    """
+    画像から縮小版（サムネイル・プレビュー）をエンコードしたバイト列を作成
+
+    JPEG は draft モードで最大の縮小版に必要なサイズまで縮小してデコードし、
+    大きい縮小版から順に縮小していくため、元画像のデコードは1回だけで済む。
+    """
+    names = sorted(VARIANTS, key=variant_size, reverse=True)
+    largest = variant_size(names[0])
+    image = Image.open(io.BytesIO(file_content))
+    image.draft("RGB", (largest, largest))
+    image = ImageOps.exif_transpose(image).convert("RGB")
+
+    variants = {}
+    for name in names:
+        size = variant_size(name)
+        image.thumbnail((size, size))
+        buffer = io.BytesIO()
+        if settings.IMAGE_VARIANT_FORMAT == "webp":
+            image.save(buffer, format="WEBP", quality=settings.IMAGE_VARIANT_QUALITY, method=4)
+        else:
+            image.save(buffer, format="JPEG", quality=settings.IMAGE_VARIANT_QUALITY, optimize=True)
+        variants[name] = buffer.getvalue()
+    return variants
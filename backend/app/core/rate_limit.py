@@ -0,0 +1,87 @@
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Optional
+from app.core.config import settings
+
+DEFAULT_MAX_KEYS = 100000
+
+
+class RateLimiter:
+    """
+    キーごとの試行回数を数えるスライディングウィンドウ方式のレート制限（プロセス内）
+
+    キーごとに直近 window_seconds 秒の試行時刻を保持する。キーの数は max_keys までに制限し、
+    超えた場合は最も長く使われていないキーから破棄する。
+    """
+
+    def __init__(self, window_seconds: Optional[float] = None, max_keys: int = DEFAULT_MAX_KEYS):
+        self.window = window_seconds if window_seconds is not None else settings.LOGIN_RATE_LIMIT_WINDOW_SECONDS
+        self.max_keys = max_keys
+        self._attempts: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, limits: Dict[str, int]) -> Optional[float]:
+        """
+        試行を記録する（いずれかのキーが上限に達している場合は記録しない）
+
+        Args:
+            limits: キーと、ウィンドウ内に許可する試行回数
+
+        Returns:
+            上限に達している場合は再試行までの秒数、許可される場合は None
+        """
+        now = time.monotonic()
+        with self._lock:
+            retry_after = None
+            for key, limit in limits.items():
+                attempts = self._window(key, now)
+                if len(attempts) >= limit:
+                    wait = attempts[len(attempts) - limit] + self.window - now
+                    retry_after = max(retry_after or 0.0, wait)
+            if retry_after is not None:
+                return retry_after
+
+            for key in limits:
+                self._window(key, now).append(now)
+                self._attempts.move_to_end(key)
+            while len(self._attempts) > self.max_keys:
+                self._attempts.popitem(last=False)
+            return None
+
+    def reset(self, key: str):
+        """キーの試行回数を破棄（ログイン成功時など）"""
+        with self._lock:
+            self._attempts.pop(key, None)
+
+    def clear(self):
+        """全てのキーの試行回数を破棄"""
+        with self._lock:
+            self._attempts.clear()
+
+    def _window(self, key: str, now: float) -> deque:
+        attempts = self._attempts.get(key)
+        if attempts is None:
+            attempts = self._attempts[key] = deque()
+        while attempts and attempts[0] <= now - self.window:
+            attempts.popleft()
+        return attempts
+
+
+def retry_after_header(seconds: float) -> str:
+    """Retry-After ヘッダーの値（切り上げた整数秒）"""
+    return str(max(1, math.ceil(seconds)))
+
+
+_login_rate_limiter: Optional[RateLimiter] = None
+
+
+def get_login_rate_limiter() -> Optional[RateLimiter]:
+    """ログインのレート制限を取得（無効化されている場合は None）"""
+    global _login_rate_limiter
+    if not settings.LOGIN_RATE_LIMIT_ENABLED:
+        return None
+    if _login_rate_limiter is None:
+        _login_rate_limiter = RateLimiter()
+    return _login_rate_limiter
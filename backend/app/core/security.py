@@ -1,3 +1,6 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
@@ -6,6 +9,15 @@ from app.core.config import settings
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+_password_executor: Optional[ThreadPoolExecutor] = None
+_password_executor_lock = threading.Lock()
+_password_pending = 0  # 実行中・実行待ちのハッシュ化・検証の件数
+_password_pending_lock = threading.Lock()
+
+
+class PasswordHashBusyError(Exception):
+    """パスワードのハッシュ化・検証の待ちが上限に達している"""
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """パスワードを検証"""
@@ -17,6 +29,59 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+def get_password_executor() -> ThreadPoolExecutor:
+    """
+    パスワードのハッシュ化・検証用のスレッドプールを取得（シングルトン）
+
+    bcrypt は1回あたり100ms以上CPUを使うため、APIの共有スレッドプールとは分けて
+    同時実行数を PASSWORD_HASH_WORKERS に制限する。超えた分はこのプールの中で待つ
+    （待ちの件数は _run_password_task で PASSWORD_HASH_MAX_PENDING までに制限する）。
+    """
+    global _password_executor
+    if _password_executor is None:
+        with _password_executor_lock:
+            if _password_executor is None:
+                _password_executor = ThreadPoolExecutor(
+                    max_workers=max(1, settings.PASSWORD_HASH_WORKERS),
+                    thread_name_prefix="password-hash"
+                )
+    return _password_executor
+
+
+async def _run_password_task(fn, *args):
+    """
+    パスワードの処理を専用のスレッドプールで実行
+
+    Raises:
+        PasswordHashBusyError: 実行中・実行待ちの件数が PASSWORD_HASH_MAX_PENDING に達している場合
+    """
+    global _password_pending
+    with _password_pending_lock:
+        if _password_pending >= max(1, settings.PASSWORD_HASH_MAX_PENDING):
+            raise PasswordHashBusyError("パスワード処理の待ちが上限に達しました")
+        _password_pending += 1
+    # 呼び出し元がキャンセルされてもスレッドでの処理は続くため、完了した時点で数え直す
+    future = get_password_executor().submit(fn, *args)
+    future.add_done_callback(_password_task_done)
+    return await asyncio.wrap_future(future)
+
+
+def _password_task_done(future):
+    global _password_pending
+    with _password_pending_lock:
+        _password_pending -= 1
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """パスワードを専用のスレッドで検証"""
+    return await _run_password_task(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """パスワードを専用のスレッドでハッシュ化"""
+    return await _run_password_task(get_password_hash, password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """JWTトークンを作成"""
     to_encode = data.copy()
@@ -1,59 +1,278 @@
+import asyncio
+import io
 import os
+import threading
 import uuid
+from collections import Counter
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Optional
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
 from app.core.config import settings
+from app.core.cache import content_hash, get_detection_cache
+from app.core.uploader import get_uploader
+from app.core.images import (
+    VARIANTS, render_variants, variant_content_type, variant_filename, variant_path
+)
 import logging
 
 logger = logging.getLogger(__name__)
 
+MB = 1024 * 1024
+
 _s3_client = None
+_s3_client_lock = threading.Lock()
+_transfer_config: Optional[TransferConfig] = None
+
+# 画像を再利用するか新しく書き込むかの判断と、参照がなくなった画像の削除を直列化する
+# （同じ内容の画像の保存と削除が同時に走っても、参照される画像を消さないため）
+_image_lock = threading.Lock()
+_held_images: Counter = Counter()  # 保存済みで、参照する履歴・ジョブがまだコミットされていない画像
 
 
 def get_s3_client():
-    """S3クライアントを取得"""
+    """
+    S3クライアントを取得（全スレッドで共有、初回のみ作成）
+    
+    boto3のクライアントはスレッドセーフなため、接続プールとリトライ設定を持つ1つのクライアントを
+    リクエスト処理・バックグラウンドアップロードの全スレッドで共有する。
+    """
     global _s3_client
     if _s3_client is None and settings.AWS_ACCESS_KEY_ID and settings.AWS_SECRET_ACCESS_KEY:
-        _s3_client = boto3.client(
-            's3',
-            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            region_name=settings.AWS_REGION
-        )
+        with _s3_client_lock:
+            if _s3_client is None:
+                # アップロードのワーカーがそれぞれ並列でマルチパート転送しても接続が足りるようにする
+                pool_size = max(
+                    settings.S3_MAX_POOL_CONNECTIONS,
+                    settings.STORAGE_UPLOAD_WORKERS * settings.S3_MAX_CONCURRENCY
+                )
+                _s3_client = boto3.client(
+                    's3',
+                    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                    region_name=settings.AWS_REGION,
+                    config=Config(
+                        max_pool_connections=pool_size,
+                        retries={"max_attempts": settings.S3_MAX_ATTEMPTS, "mode": settings.S3_RETRY_MODE},
+                        connect_timeout=settings.S3_CONNECT_TIMEOUT_SECONDS,
+                        read_timeout=settings.S3_READ_TIMEOUT_SECONDS,
+                    )
+                )
     return _s3_client
 
 
-def save_image(file_content: bytes, filename: str) -> str:
+def get_transfer_config() -> TransferConfig:
+    """大きなファイルをマルチパートで並列に転送する設定を取得"""
+    global _transfer_config
+    if _transfer_config is None:
+        _transfer_config = TransferConfig(
+            multipart_threshold=settings.S3_MULTIPART_THRESHOLD_MB * MB,
+            multipart_chunksize=settings.S3_MULTIPART_CHUNKSIZE_MB * MB,
+            max_concurrency=settings.S3_MAX_CONCURRENCY,
+        )
+    return _transfer_config
+
+
+def upload_fileobj(fileobj, s3_key: str, content_type: str):
+    """
+    ファイルオブジェクトをS3にストリーミングでアップロード
+    
+    MULTIPART_THRESHOLD を超える場合はマルチパートで並列に転送し、
+    ファイル全体をもう1つのバッファにコピーしない。
+    """
+    get_s3_client().upload_fileobj(
+        fileobj,
+        settings.AWS_S3_BUCKET,
+        s3_key,
+        ExtraArgs={"ContentType": content_type},
+        Config=get_transfer_config()
+    )
+
+
+def s3_key_from_url(url: str) -> str:
+    """S3のURLからオブジェクトキーを抽出"""
+    return url.split(f"{settings.AWS_S3_BUCKET}.s3")[-1].split("/", 1)[-1]
+
+
+def s3_url(s3_key: str) -> str:
+    """S3のオブジェクトキーからURLを作成"""
+    return f"https://{settings.AWS_S3_BUCKET}.s3.{settings.AWS_REGION}.amazonaws.com/{s3_key}"
+
+
+def use_background_upload() -> bool:
+    """S3への書き込み・削除をバックグラウンドで行うか"""
+    return settings.STORAGE_BACKGROUND_UPLOAD and bool(settings.AWS_S3_BUCKET) and get_s3_client() is not None
+
+
+async def save_image_async(
+    file_content: bytes, filename: str, image_hash: Optional[str] = None, hold: bool = False
+) -> str:
+    """save_image をイベントループの外で実行（縮小版の作成やファイル書き込みでループを止めない）"""
+    return await asyncio.to_thread(save_image, file_content, filename, image_hash, hold)
+
+
+async def delete_image_if_unreferenced_async(image_path: str, count_references: Callable[[str], int]) -> bool:
+    """delete_image_if_unreferenced をイベントループの外で実行"""
+    return await asyncio.to_thread(delete_image_if_unreferenced, image_path, count_references)
+
+
+def save_image(
+    file_content: bytes, filename: str, image_hash: Optional[str] = None, hold: bool = False
+) -> str:
     """
     画像を保存（ローカルまたはS3）
     
+    STORAGE_CONTENT_ADDRESSED の場合は画像内容の SHA-256 をファイル名にするため、
+    同じ画像は何度アップロードされても1つだけ保存される（削除は参照する履歴がなくなった時点で行う）。
+    
     Args:
         file_content: ファイルのバイトデータ
         filename: 元のファイル名
+        image_hash: 画像内容のハッシュ（指定時は同じ内容の保存済み画像を再利用）
+        hold: True の場合、release_image を呼ぶまで画像を削除させない
+            （画像を参照する履歴・ジョブをコミットしてから解放する）
         
     Returns:
         保存された画像のパスまたはURL
     """
-    # ファイル拡張子を取得
-    ext = Path(filename).suffix
-    # 一意のファイル名を生成
-    unique_filename = f"{uuid.uuid4()}{ext}"
+    if settings.STORAGE_CONTENT_ADDRESSED and not image_hash:
+        image_hash = content_hash(file_content)
+    cache = get_detection_cache() if image_hash else None
+    
+    with _image_lock:
+        # 再利用するか決めた時点で保持し、書き込み中・コミット前の画像を削除させない
+        image_path = cache.get_image_path(image_hash) if cache is not None else None
+        if image_path is None and settings.STORAGE_CONTENT_ADDRESSED:
+            stored_filename = content_addressed_filename(image_hash, filename)
+            image_path = _find_file(stored_filename)
+            write_path = None if image_path is not None else stored_filename
+        elif image_path is None:
+            write_path = f"{uuid.uuid4()}{Path(filename).suffix}"
+        else:
+            write_path = None
+        if write_path is not None:
+            image_path = _stored_path(write_path)
+        if hold:
+            _held_images[_stored_name(image_path)] += 1
+    
+    if write_path is None:
+        logger.info(f"同じ内容の保存済み画像を再利用しました: {image_path}")
+        return image_path
+    
+    try:
+        image_path = _write_file(write_path, file_content, content_type_for(write_path))
+        if settings.IMAGE_VARIANTS_ENABLED:
+            _store_variants(file_content, image_path)
+    except BaseException:
+        if hold:
+            release_image(image_path)
+        raise
+    if cache is not None:
+        cache.set_image_path(image_hash, image_path)
+    return image_path
+
+
+def release_image(image_path: str):
+    """save_image(hold=True) で保持した画像を解放"""
+    name = _stored_name(image_path)
+    with _image_lock:
+        _held_images[name] -= 1
+        if _held_images[name] <= 0:
+            del _held_images[name]
+
+
+def delete_image_if_unreferenced(image_path: str, count_references: Callable[[str], int]) -> bool:
+    """
+    参照する履歴・ジョブがなく、保存中の処理にも保持されていない場合だけ画像を削除
+    
+    参照の数え直しと削除を save_image の再利用判断と直列に行うため、同じ画像の保存と
+    同時に走っても、新しく参照された画像は消さない（同じプロセス内の保存に限る）。
+    
+    Args:
+        image_path: 画像のパスまたはURL
+        count_references: 画像を参照している行の数を返す関数（コミット済みのデータを数える）
+        
+    Returns:
+        削除したかどうか
+    """
+    with _image_lock:
+        if _held_images[_stored_name(image_path)] > 0 or count_references(image_path) > 0:
+            return False
+        return delete_image(image_path)
+
+
+def content_addressed_filename(image_hash: str, filename: str) -> str:
+    """画像内容のハッシュから保存するファイル名を作成（拡張子は表記ゆれを揃える）"""
+    ext = Path(filename).suffix.lower()
+    return f"{image_hash}{'.jpg' if ext == '.jpeg' else ext}"
+
+
+def content_type_for(filename: str) -> str:
+    ext = Path(filename).suffix.lower()
+    return "image/jpeg" if ext in (".jpg", ".jpeg") else f"image/{ext[1:]}"
+
+
+def _find_file(filename: str) -> Optional[str]:
+    """
+    保存済みのファイルのパスまたはURLを取得（ない場合は None）
+    
+    S3 はアップロード待ちのファイルだけを確認し、head_object は使わない
+    （同じキーへの再アップロードは上書きになるだけのため、リクエストごとに往復しない）。
+    """
+    if settings.AWS_S3_BUCKET and get_s3_client() is not None:
+        if use_background_upload():
+            uploader = get_uploader()
+            if not uploader.delete_pending(filename) and uploader.staged_path(filename) is not None:
+                return s3_url(f"images/{filename}")
+        return None
+    
+    file_path = Path(settings.LOCAL_STORAGE_PATH) / filename
+    return str(file_path) if file_path.exists() else None
+
+
+def _stored_path(filename: str) -> str:
+    """ファイル名から保存先のパスまたはURLを作成（_write_file の戻り値と同じ）"""
+    if settings.AWS_S3_BUCKET and get_s3_client() is not None:
+        return s3_url(f"images/{filename}")
+    return str(Path(settings.LOCAL_STORAGE_PATH) / filename)
+
+
+def _stored_name(image_path: str) -> str:
+    """保存先のパスまたはURLからファイル名を取得"""
+    return image_path.rsplit("/", 1)[-1] if image_path.startswith("http") else Path(image_path).name
+
+
+def _store_variants(file_content: bytes, image_path: str):
+    """縮小版（サムネイル・プレビュー）を元画像と同じ場所に保存（失敗しても元画像の保存は続行）"""
+    try:
+        variants = render_variants(file_content)
+    except Exception as e:
+        logger.warning(f"縮小版の作成に失敗しました: {image_path}: {e}")
+        return
+    filename = _stored_name(image_path)
+    for name, data in variants.items():
+        _write_file(variant_filename(filename, name), data, variant_content_type())
+
+
+def _write_file(filename: str, file_content: bytes, content_type: str) -> str:
+    """ファイルをローカルまたはS3に書き込み、パスまたはURLを返す"""
+    # S3が設定されている場合、ステージング領域に書き込んでバックグラウンドでアップロード
+    if use_background_upload():
+        uploader = get_uploader()
+        uploader.stage(filename, file_content)
+        uploader.enqueue_upload(filename)
+        return s3_url(f"images/{filename}")
     
     # S3が設定されている場合はS3に保存
     s3_client = get_s3_client()
     if s3_client and settings.AWS_S3_BUCKET:
         try:
-            s3_key = f"images/{unique_filename}"
-            s3_client.put_object(
-                Bucket=settings.AWS_S3_BUCKET,
-                Key=s3_key,
-                Body=file_content,
-                ContentType=f"image/{ext[1:].lower()}"
-            )
+            s3_key = f"images/{filename}"
+            upload_fileobj(io.BytesIO(file_content), s3_key, content_type)
             # S3のURLを返す
-            url = f"https://{settings.AWS_S3_BUCKET}.s3.{settings.AWS_REGION}.amazonaws.com/{s3_key}"
+            url = s3_url(s3_key)
             logger.info(f"画像をS3に保存しました: {url}")
             return url
         except ClientError as e:
@@ -64,7 +283,7 @@ def save_image(file_content: bytes, filename: str) -> str:
     storage_path = Path(settings.LOCAL_STORAGE_PATH)
     storage_path.mkdir(parents=True, exist_ok=True)
     
-    file_path = storage_path / unique_filename
+    file_path = storage_path / filename
     with open(file_path, "wb") as f:
         f.write(file_content)
     
@@ -90,9 +309,37 @@ def get_image_path(stored_path: str) -> str:
     return stored_path
 
 
+def load_image_bytes(image_path: str) -> bytes:
+    """
+    保存された画像のバイトデータを読み込む
+    
+    Args:
+        image_path: 画像のパスまたはURL
+        
+    Returns:
+        画像のバイトデータ
+    """
+    # S3のURLの場合
+    if image_path.startswith("http") and settings.AWS_S3_BUCKET:
+        # アップロード待ちの画像はステージング領域から読む
+        staged_path = get_uploader().staged_path(image_path.rsplit("/", 1)[-1])
+        if staged_path is not None:
+            with open(staged_path, "rb") as f:
+                return f.read()
+        s3_client = get_s3_client()
+        if s3_client:
+            key = s3_key_from_url(image_path)
+            response = s3_client.get_object(Bucket=settings.AWS_S3_BUCKET, Key=key)
+            return response["Body"].read()
+    
+    # ローカルファイルの場合
+    with open(image_path, "rb") as f:
+        return f.read()
+
+
 def delete_image(image_path: str) -> bool:
     """
-    画像を削除
+    画像を削除（縮小版も削除）
     
     Args:
         image_path: 画像のパスまたはURL
@@ -100,13 +347,29 @@ def delete_image(image_path: str) -> bool:
     Returns:
         削除成功かどうか
     """
+    cache = get_detection_cache()
+    if cache is not None:
+        cache.forget_image_path(image_path)
+    
+    for name in VARIANTS:
+        _delete_file(variant_path(image_path, name))
+    return _delete_file(image_path)
+
+
+def _delete_file(image_path: str) -> bool:
+    """ローカルまたはS3のファイルを削除"""
+    # S3の削除はバックグラウンドで実行（削除予約を書いた時点で完了とする）
+    if image_path.startswith("http") and use_background_upload():
+        get_uploader().enqueue_delete(image_path.rsplit("/", 1)[-1])
+        return True
+    
     # S3のURLの場合
     if image_path.startswith("http") and settings.AWS_S3_BUCKET:
         s3_client = get_s3_client()
         if s3_client:
             try:
                 # URLからキーを抽出
-                key = image_path.split(f"{settings.AWS_S3_BUCKET}.s3")[-1].lstrip("/")
+                key = s3_key_from_url(image_path)
                 s3_client.delete_object(Bucket=settings.AWS_S3_BUCKET, Key=key)
                 logger.info(f"S3から画像を削除しました: {image_path}")
                 return True
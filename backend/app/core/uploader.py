@@ -0,0 +1,217 @@
+import mimetypes
+import os
+import queue
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Callable, List, Optional
+from app.core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+DELETE_MARKER_SUFFIX = ".delete"
+
+
+class BackgroundUploader:
+    """
+    ステージング領域に書き込んだ画像をバックグラウンドでS3にアップロード・削除する
+
+    保存時はローカルのステージング領域に書き込んだ時点で完了とし、S3へのアップロードは
+    ワーカースレッドが失敗時に指数バックオフで再試行しながら行う。削除も削除予約ファイルを
+    書いてから非同期に行う。アップロード前・削除前のファイルはステージング領域に残るため、
+    プロセスが停止しても次回の起動時に続きから処理できる。
+    同じファイルの操作は常に同じワーカーに割り当て、アップロードと削除の順序を保つ。
+    """
+
+    def __init__(
+        self,
+        client_factory: Callable,
+        bucket: Optional[str] = None,
+        staging_path: Optional[str] = None,
+        workers: Optional[int] = None,
+        retries: Optional[int] = None,
+        backoff_seconds: Optional[float] = None,
+        key_prefix: str = "images/",
+        transfer_config=None,
+    ):
+        self.client_factory = client_factory
+        self.bucket = bucket or settings.AWS_S3_BUCKET
+        self.staging_path = Path(staging_path or settings.STORAGE_STAGING_PATH)
+        self.workers = max(1, workers or settings.STORAGE_UPLOAD_WORKERS)
+        self.retries = retries if retries is not None else settings.STORAGE_UPLOAD_RETRIES
+        self.backoff_seconds = (
+            backoff_seconds if backoff_seconds is not None else settings.STORAGE_UPLOAD_BACKOFF_SECONDS
+        )
+        self.key_prefix = key_prefix
+        self.transfer_config = transfer_config
+        self._queues: List[queue.Queue] = [queue.Queue() for _ in range(self.workers)]
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+
+        # 統計情報
+        self._uploaded = 0
+        self._deleted = 0
+        self._retried = 0
+        self._failed = 0
+
+    def start(self):
+        """ワーカースレッドを開始し、前回の停止時に残った操作を再投入"""
+        with self._lock:
+            if self._threads:
+                return
+            self.staging_path.mkdir(parents=True, exist_ok=True)
+            self._threads = [
+                threading.Thread(target=self._work, args=(q,), name=f"s3-uploader-{i}", daemon=True)
+                for i, q in enumerate(self._queues)
+            ]
+            for thread in self._threads:
+                thread.start()
+        self._recover()
+
+    def stop(self, timeout: Optional[float] = None):
+        """キューに入っている操作を処理してからワーカースレッドを停止"""
+        with self._lock:
+            threads, self._threads = self._threads, []
+            if not threads:
+                return
+            for q in self._queues:
+                q.put(None)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        for thread in threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+
+    def join(self):
+        """キューに入っている操作がすべて終わるまで待つ"""
+        for q in self._queues:
+            q.join()
+
+    def stage(self, filename: str, content: bytes) -> Path:
+        """ファイルをステージング領域に書き込む（一時ファイルに書いてから置き換えるため途中の状態は残らない）"""
+        self.staging_path.mkdir(parents=True, exist_ok=True)
+        path = self.staging_path / filename
+        tmp_path = path.with_name(f".{filename}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return path
+
+    def staged_path(self, filename: str) -> Optional[Path]:
+        """アップロード待ちのファイルのパス（アップロード済みの場合は None）"""
+        path = self.staging_path / filename
+        return path if path.exists() else None
+
+    def enqueue_upload(self, filename: str):
+        """ステージング済みのファイルのアップロードを予約"""
+        self.start()
+        self._queue_for(filename).put(("upload", filename))
+
+    def enqueue_delete(self, filename: str):
+        """削除を予約（削除予約ファイルを書いてから処理するため、停止しても削除は失われない）"""
+        self.start()
+        (self.staging_path / f"{filename}{DELETE_MARKER_SUFFIX}").touch()
+        # アップロード待ちのファイルはここで消す（この後に同じ名前で保存し直された場合は、
+        # 削除の後にアップロードされる）
+        (self.staging_path / filename).unlink(missing_ok=True)
+        self._queue_for(filename).put(("delete", filename))
+
+    def delete_pending(self, filename: str) -> bool:
+        """削除待ちのファイルか"""
+        return (self.staging_path / f"{filename}{DELETE_MARKER_SUFFIX}").exists()
+
+    def stats(self) -> dict:
+        """待ち行列の長さと処理件数"""
+        return {
+            "workers": self.workers,
+            "pending": sum(q.qsize() for q in self._queues),
+            "uploaded": self._uploaded,
+            "deleted": self._deleted,
+            "retried": self._retried,
+            "failed": self._failed,
+        }
+
+    def _queue_for(self, filename: str) -> queue.Queue:
+        return self._queues[zlib.crc32(filename.encode()) % self.workers]
+
+    def _recover(self):
+        # 削除予約とアップロード待ちの両方がある場合は、削除の後に保存し直されたもの
+        paths = [p for p in sorted(self.staging_path.iterdir()) if not p.name.startswith(".")]
+        for path in paths:
+            if path.name.endswith(DELETE_MARKER_SUFFIX):
+                filename = path.name[:-len(DELETE_MARKER_SUFFIX)]
+                self._queue_for(filename).put(("delete", filename))
+        for path in paths:
+            if not path.name.endswith(DELETE_MARKER_SUFFIX):
+                self._queue_for(path.name).put(("upload", path.name))
+
+    def _work(self, q: queue.Queue):
+        while True:
+            operation = q.get()
+            try:
+                if operation is None:
+                    return
+                self._process(*operation)
+            finally:
+                q.task_done()
+
+    def _process(self, action: str, filename: str):
+        for attempt in range(self.retries + 1):
+            try:
+                if action == "upload":
+                    self._upload(filename)
+                else:
+                    self._delete(filename)
+                return
+            except Exception as e:
+                if attempt == self.retries:
+                    # ステージング領域に残し、次回の起動時に再試行する
+                    self._failed += 1
+                    logger.error(f"S3への{'アップロード' if action == 'upload' else '削除'}に失敗しました: {filename}: {e}")
+                    return
+                self._retried += 1
+                time.sleep(self.backoff_seconds * 2 ** attempt)
+
+    def _upload(self, filename: str):
+        path = self.staging_path / filename
+        if not path.exists():
+            return  # アップロード前に削除された
+        content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        # ステージング済みのファイルから直接ストリーミング（大きなファイルはマルチパート）
+        with open(path, "rb") as f:
+            self.client_factory().upload_fileobj(
+                f,
+                self.bucket,
+                f"{self.key_prefix}{filename}",
+                ExtraArgs={"ContentType": content_type},
+                Config=self.transfer_config
+            )
+        path.unlink(missing_ok=True)
+        self._uploaded += 1
+        logger.info(f"画像をS3にアップロードしました: {filename}")
+
+    def _delete(self, filename: str):
+        self.client_factory().delete_object(Bucket=self.bucket, Key=f"{self.key_prefix}{filename}")
+        (self.staging_path / f"{filename}{DELETE_MARKER_SUFFIX}").unlink(missing_ok=True)
+        self._deleted += 1
+        logger.info(f"S3から画像を削除しました: {filename}")
+
+
+_uploader: Optional[BackgroundUploader] = None
+_uploader_lock = threading.Lock()
+
+
+def get_uploader() -> BackgroundUploader:
+    """バックグラウンドアップローダーを取得（シングルトン）"""
+    global _uploader
+    if _uploader is None:
+        with _uploader_lock:
+            if _uploader is None:
+                from app.core.storage import get_s3_client, get_transfer_config
+
+                _uploader = BackgroundUploader(
+                    client_factory=get_s3_client, transfer_config=get_transfer_config()
+                )
+    return _uploader
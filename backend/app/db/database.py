@@ -1,13 +1,116 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 
-engine = create_engine(
-    settings.DATABASE_URL, connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
-)
+
+def is_memory_sqlite(url) -> bool:
+    """インメモリのSQLiteか（接続ごとに別のDBになるためプールの設定は使わない）"""
+    url = make_url(url)
+    return url.get_backend_name() == "sqlite" and (
+        url.database in (None, "", ":memory:") or url.query.get("mode") == "memory"
+    )
+
+
+# 非同期エンジンで使うドライバ
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+
+def async_database_url(url) -> str:
+    """DB接続URLのドライバを非同期のもの（SQLite は aiosqlite、PostgreSQL は asyncpg）に置き換える"""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"非同期接続に対応していないデータベースです: {backend}")
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+
+def engine_options(url) -> dict:
+    """
+    DB接続URLに応じた create_engine の引数
+
+    どのDBでも接続プールの大きさ・事前確認・作り直しの設定を使う。
+    SQLite はスレッドをまたいで接続を使えるようにし、PostgreSQL はクエリタイムアウトを設定する。
+    """
+    url = make_url(url)
+    backend = url.get_backend_name()
+    options = {"pool_pre_ping": settings.DB_POOL_PRE_PING}
+    connect_args = {}
+
+    if backend == "sqlite":
+        connect_args["check_same_thread"] = False
+    elif backend == "postgresql" and settings.DB_STATEMENT_TIMEOUT_MS > 0:
+        if url.get_driver_name() == "asyncpg":
+            connect_args["server_settings"] = {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)}
+        else:
+            connect_args["options"] = f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"
+
+    if not is_memory_sqlite(url):
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+            pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+        )
+    if connect_args:
+        options["connect_args"] = connect_args
+    return options
+
+
+def sqlite_pragmas() -> dict:
+    """SQLiteの接続ごとに設定する PRAGMA"""
+    return {
+        "journal_mode": settings.SQLITE_JOURNAL_MODE,
+        "synchronous": settings.SQLITE_SYNCHRONOUS,
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT_MS,
+        # 負の値はKB単位
+        "cache_size": -settings.SQLITE_CACHE_SIZE_KB,
+    }
+
+
+def set_sqlite_pragmas(db_engine: Engine, url):
+    """SQLite の接続ごとに PRAGMA を設定するイベントを登録"""
+    pragmas = sqlite_pragmas()
+    if is_memory_sqlite(url):
+        pragmas.pop("journal_mode")  # インメモリのDBはWALにできない
+
+    @event.listens_for(db_engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def create_db_engine(url: str) -> Engine:
+    """設定に従ってエンジンを作成（SQLite の場合は接続ごとに PRAGMA を設定）"""
+    db_engine = create_engine(url, **engine_options(url))
+    if db_engine.dialect.name == "sqlite":
+        set_sqlite_pragmas(db_engine, url)
+    return db_engine
+
+
+def create_async_db_engine(url: str) -> AsyncEngine:
+    """同じDBに接続する非同期エンジンを作成（プールと PRAGMA の設定は同期エンジンと同じ）"""
+    url = async_database_url(url)
+    db_engine = create_async_engine(url, **engine_options(url))
+    if db_engine.dialect.name == "sqlite":
+        set_sqlite_pragmas(db_engine.sync_engine, url)
+    return db_engine
+
+
+engine = create_db_engine(settings.DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# APIのルートはイベントループを止めないよう非同期セッションを使う
+# （コミット後も属性を読めるよう expire_on_commit=False。遅延読み込みはできないため関連は明示的に読み込む）
+async_engine = create_async_db_engine(settings.DATABASE_URL)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 
@@ -20,6 +123,15 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """非同期のデータベースセッションを取得"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 def init_db():
-    """データベースを初期化"""
+    """データベースを初期化（テーブルの作成と既存データの移行）"""
+    from app.db.migrations import run_migrations
+
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
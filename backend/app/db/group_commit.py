@@ -0,0 +1,151 @@
+import asyncio
+from typing import Any, List, Optional
+from app.db.database import AsyncSessionLocal
+from app.core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class GroupCommitter:
+    """
+    同時リクエストの新規レコードを1つのトランザクションにまとめてコミットする（グループコミット）
+
+    最初のレコードが届いてから最大 window_ms 待つか、max_batch 件たまった時点で
+    まとめて INSERT し、1回だけコミットする。SQLite ではコミットごとに fsync が走るため、
+    同時に書き込むリクエストが多いほど1件あたりのコストが下がる。
+    コミットは1つずつ順番に行う。コミットに失敗した場合は同じトランザクションの全員に例外を返す。
+    """
+
+    def __init__(
+        self,
+        session_factory=AsyncSessionLocal,
+        window_ms: Optional[float] = None,
+        max_batch: Optional[int] = None,
+    ):
+        self.session_factory = session_factory
+        self.window = (window_ms if window_ms is not None else settings.DB_GROUP_COMMIT_WINDOW_MS) / 1000
+        self.max_batch = max(1, max_batch or settings.DB_GROUP_COMMIT_MAX_BATCH)
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._committing: Optional[asyncio.Task] = None
+        self._collecting: list = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        # 統計情報
+        self._records = 0
+        self._commits = 0
+        self._failed = 0
+
+    async def start(self):
+        """コミットタスクを現在のイベントループで開始"""
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done() and self._loop is loop:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._task = loop.create_task(self._run())
+
+    async def stop(self):
+        """コミットタスクを停止（待っているレコードはコミットしてから止める）"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._committing is not None:
+            await self._committing
+            self._committing = None
+        # 集めている途中のレコードとキューに残ったレコード
+        pending, self._collecting = self._collecting, []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        if pending:
+            await self._commit(pending)
+
+    async def add(self, record: Any) -> Any:
+        """
+        レコードをコミット待ちに追加し、コミットされるまで待つ
+
+        Returns:
+            コミット済みのレコード（ID などの生成された値を含む）
+        """
+        await self.start()
+        future = self._loop.create_future()
+        self._queue.put_nowait((record, future))
+        return await future
+
+    def stats(self) -> dict:
+        """コミット回数と1回あたりのレコード数"""
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "records": self._records,
+            "commits": self._commits,
+            "failed": self._failed,
+            "avg_batch_size": round(self._records / self._commits, 2) if self._commits else 0.0,
+        }
+
+    async def _collect(self) -> list:
+        """待ち時間内に届いたレコードを最大件数まで集める"""
+        batch = self._collecting = [await self._queue.get()]
+        deadline = self._loop.time() + self.window
+        while len(batch) < self.max_batch:
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        self._collecting = []
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            # コミット中に止められても、集めた分はコミットまで終える（stop で完了を待つ）
+            self._committing = self._loop.create_task(self._commit(batch))
+            await asyncio.shield(self._committing)
+
+    async def _commit(self, batch: List[tuple]):
+        try:
+            async with self.session_factory() as db:
+                db.add_all([record for record, _ in batch])
+                await db.commit()
+        except Exception as e:
+            self._failed += len(batch)
+            logger.error(f"グループコミット中にエラーが発生しました: 件数={len(batch)}: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self._records += len(batch)
+        self._commits += 1
+        for record, future in batch:
+            if not future.done():
+                future.set_result(record)
+
+
+_group_committer: Optional[GroupCommitter] = None
+
+
+def get_group_committer() -> Optional[GroupCommitter]:
+    """グループコミットを取得（無効化されている場合は None）"""
+    global _group_committer
+    if not settings.DB_GROUP_COMMIT_ENABLED:
+        return None
+    if _group_committer is None:
+        _group_committer = GroupCommitter()
+    return _group_committer
+
+
+async def stop_group_committer():
+    """グループコミットを停止"""
+    if _group_committer is not None:
+        await _group_committer.stop()
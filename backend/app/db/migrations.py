@@ -0,0 +1,192 @@
+"""
+既存のデータベースを現在のモデル定義に合わせる移行処理（init_db から起動時に実行）
+
+どの処理も何度実行しても同じ結果になるため、移行済みのデータベースでは何もしない。
+"""
+import json
+from datetime import datetime, timezone
+from sqlalchemy import Table, insert, inspect, select, update
+from sqlalchemy.engine import Connection, Engine
+from app.models.detection import Detection, DetectionHistory, top_labels
+import logging
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 500
+
+
+def add_missing_columns(conn: Connection, table: Table):
+    """モデルにあってテーブルにない列を追加（ALTER TABLE ADD COLUMN）"""
+    existing = {column["name"] for column in inspect(conn).get_columns(table.name)}
+    for column in table.columns:
+        if column.name not in existing:
+            column_type = column.type.compile(dialect=conn.dialect)
+            conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+            logger.info(f"列を追加しました: {table.name}.{column.name}")
+
+
+def create_missing_indexes(conn: Connection, table: Table):
+    """モデルに定義されていてテーブルにないインデックスを作成"""
+    existing = {index["name"] for index in inspect(conn).get_indexes(table.name)}
+    for index in table.indexes:
+        if index.name not in existing:
+            index.create(conn)
+            logger.info(f"インデックスを作成しました: {index.name}")
+
+
+def relax_not_null(conn: Connection, table: Table, column_name: str):
+    """NOT NULL 制約を外す（SQLiteは列の変更ができないためテーブルを作り直す）"""
+    column = next(c for c in inspect(conn).get_columns(table.name) if c["name"] == column_name)
+    if column["nullable"]:
+        return
+
+    if conn.dialect.name != "sqlite":
+        conn.exec_driver_sql(f"ALTER TABLE {table.name} ALTER COLUMN {column_name} DROP NOT NULL")
+        return
+
+    old = f"{table.name}_old"
+    columns = ", ".join(c["name"] for c in inspect(conn).get_columns(table.name) if c["name"] in table.c)
+    # 他のテーブルからの外部キー参照を旧テーブル側に書き換えさせない
+    conn.exec_driver_sql("PRAGMA legacy_alter_table=ON")
+    conn.exec_driver_sql(f"ALTER TABLE {table.name} RENAME TO {old}")
+    conn.exec_driver_sql("PRAGMA legacy_alter_table=OFF")
+    for index in inspect(conn).get_indexes(old):
+        conn.exec_driver_sql(f"DROP INDEX IF EXISTS {index['name']}")
+    table.create(conn)
+    conn.exec_driver_sql(f"INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {old}")
+    conn.exec_driver_sql(f"DROP TABLE {old}")
+    logger.info(f"NOT NULL 制約を外しました: {table.name}.{column_name}")
+
+
+# SQLAlchemy が SQLite に保存する日時の形式（YYYY-MM-DD HH:MM:SS.ffffff）
+SQLITE_DATETIME_GLOB = (
+    "[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9] [0-9][0-9]:[0-9][0-9]:[0-9][0-9]"
+    ".[0-9][0-9][0-9][0-9][0-9][0-9]"
+)
+
+
+def normalize_timestamps(conn: Connection, table: Table, column_name: str = "created_at") -> int:
+    """
+    SQLite の日時を SQLAlchemy が保存する形式に揃える
+
+    SQLite の日時は文字列として比較されるため、CURRENT_TIMESTAMP の形式（YYYY-MM-DD HH:MM:SS）の行が
+    混ざっていると、(作成日時, ID) のキーセットページングで同じ行が繰り返し返される。
+
+    Returns:
+        書き換えた行の件数
+    """
+    if conn.dialect.name != "sqlite":
+        return 0
+    result = conn.exec_driver_sql(
+        f"UPDATE {table.name} SET {column_name} = strftime('%Y-%m-%d %H:%M:%f', {column_name}) || '000' "
+        f"WHERE {column_name} IS NOT NULL AND {column_name} NOT GLOB ? "
+        f"AND strftime('%Y-%m-%d %H:%M:%f', {column_name}) IS NOT NULL",
+        (SQLITE_DATETIME_GLOB,)
+    )
+    return result.rowcount
+
+
+def backfill_detections(conn: Connection) -> int:
+    """
+    旧形式（detection_results の JSON）の検出結果を detections テーブルへ移す
+
+    移行した履歴の detection_results は NULL にし、BACKFILL_BATCH_SIZE 件ごとにコミットするため、
+    途中で止まっても再実行で続きから移行できる。
+
+    Returns:
+        移行した履歴の件数
+    """
+    history = DetectionHistory.__table__
+    migrated = 0
+    while True:
+        rows = conn.execute(
+            select(history.c.id, history.c.user_id, history.c.created_at, history.c.detection_results)
+            .where(history.c.detection_results.isnot(None))
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            return migrated
+
+        detections = []
+        for history_id, user_id, created_at, detection_results in rows:
+            data = json.loads(detection_results)
+            detections.extend(
+                {
+                    "history_id": history_id,
+                    "user_id": user_id,
+                    "label": det["label"],
+                    "confidence": det["confidence"],
+                    "x1": det["x1"], "y1": det["y1"], "x2": det["x2"], "y2": det["y2"],
+                    "created_at": created_at or datetime.now(timezone.utc),
+                }
+                for det in data.get("detections", [])
+            )
+            conn.execute(
+                update(history)
+                .where(history.c.id == history_id)
+                .values(processing_time=data.get("processing_time"), detection_results=None)
+            )
+        if detections:
+            conn.execute(insert(Detection.__table__), detections)
+        conn.commit()
+        migrated += len(rows)
+
+
+def backfill_summaries(conn: Connection) -> int:
+    """
+    一覧表示用の要約（検出数・主なラベル）がない履歴に、detections テーブルから要約を保存
+
+    BACKFILL_BATCH_SIZE 件ごとにコミットするため、途中で止まっても再実行で続きから保存できる。
+
+    Returns:
+        更新した履歴の件数
+    """
+    history = DetectionHistory.__table__
+    detections = Detection.__table__
+    updated = 0
+    while True:
+        history_ids = conn.execute(
+            select(history.c.id).where(history.c.detection_count.is_(None)).limit(BACKFILL_BATCH_SIZE)
+        ).scalars().all()
+        if not history_ids:
+            return updated
+
+        labels = {history_id: [] for history_id in history_ids}
+        for history_id, label in conn.execute(
+            select(detections.c.history_id, detections.c.label)
+            .where(detections.c.history_id.in_(history_ids))
+            .order_by(detections.c.id)
+        ):
+            labels[history_id].append(label)
+        for history_id, history_labels in labels.items():
+            conn.execute(
+                update(history)
+                .where(history.c.id == history_id)
+                .values(detection_count=len(history_labels), top_labels=",".join(top_labels(history_labels)))
+            )
+        conn.commit()
+        updated += len(history_ids)
+
+
+def run_migrations(engine: Engine):
+    """
+    起動時の移行処理をまとめて実行
+
+    テーブル定義の変更は1つのトランザクションでコミットし、データの移行はバッチごとにコミットする。
+    """
+    with engine.connect() as conn:
+        history = DetectionHistory.__table__
+        add_missing_columns(conn, history)
+        relax_not_null(conn, history, "detection_results")
+        create_missing_indexes(conn, history)
+        conn.commit()
+        migrated = backfill_detections(conn)
+        if migrated:
+            logger.info(f"検出結果を detections テーブルへ移行しました: {migrated}件の履歴")
+        summarized = backfill_summaries(conn)
+        if summarized:
+            logger.info(f"履歴の要約を保存しました: {summarized}件")
+        normalized = normalize_timestamps(conn, history) + normalize_timestamps(conn, Detection.__table__)
+        conn.commit()
+        if normalized:
+            logger.info(f"作成日時の形式を揃えました: {normalized}件")
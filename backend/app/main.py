@@ -1,9 +1,18 @@
-from fastapi import FastAPI
+import asyncio
+from typing import Optional
+from fastapi import FastAPI, Response, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from app.api import auth, detection
-from app.db.database import init_db
+from app.api import auth, detection, jobs
+from app.api.uploads import limit_upload_size
+from app.db.database import async_engine, init_db
+from app.db.group_commit import stop_group_committer
 from app.core.config import settings
+from app.ml.registry import get_registry
+from app.ml.scheduler import preload_workers, scheduler_stats, stop_schedulers, workers_ready
+from app.core.cache import get_detection_cache
+from app.core.storage import use_background_upload
+from app.core.uploader import get_uploader
 import logging
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
@@ -51,11 +60,26 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+# 大きすぎるアップロードは本文を読む前に拒否
+app.middleware("http")(limit_upload_size)
+
 # ルーターを登録
 app.include_router(auth.router)
 app.include_router(detection.router)
+app.include_router(jobs.router)
+
+
+_preload_task: Optional[asyncio.Task] = None
+
+
+async def preload_models():
+    """モデルをロード・ウォームアップし、プロセスプールの推論ワーカーにもロードさせる"""
+    registry = get_registry()
+    await asyncio.to_thread(registry.load_all, settings.MODEL_WARMUP)
+    await preload_workers(registry.names)
 
 
 @app.on_event("startup")
@@ -64,6 +88,18 @@ async def startup_event():
     try:
         init_db()
         
+        # 検出ジョブのワーカーを開始（未完了のジョブも再開）
+        await jobs.get_job_worker().start()
+        
+        # モデルをバックグラウンドでロード・ウォームアップ（完了までは /ready が503を返す）
+        if settings.MODEL_PRELOAD:
+            global _preload_task
+            _preload_task = asyncio.get_running_loop().create_task(preload_models())
+        
+        # S3へのバックグラウンドアップロードを開始（前回の停止時に残った分も再開）
+        if use_background_upload():
+            get_uploader().start()
+        
         # ローカルストレージディレクトリを作成
         storage_path = Path(settings.LOCAL_STORAGE_PATH)
         storage_path.mkdir(parents=True, exist_ok=True)
@@ -82,6 +118,18 @@ async def startup_event():
         logger.error(f"起動時の初期化に失敗しました: {e}", exc_info=True)
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """アプリケーション終了時の後処理"""
+    await jobs.get_job_worker().stop()
+    await stop_schedulers()
+    await stop_group_committer()
+    # 残りはステージング領域に保存済みのため、待ちきれなかった分は次回の起動時にアップロード
+    await asyncio.to_thread(get_uploader().stop, settings.STORAGE_SHUTDOWN_TIMEOUT_SECONDS)
+    # 非同期エンジンの接続はイベントループに紐づくため、ループを閉じる前に破棄
+    await async_engine.dispose()
+
+
 @app.get("/")
 def root():
     """ルートエンドポイント"""
@@ -92,3 +140,34 @@ def root():
 def health_check():
     """ヘルスチェック"""
     return {"status": "healthy"}
+
+
+@app.get("/ready")
+def readiness_check(response: Response):
+    """レディネスチェック（モデルのロードとウォームアップ、推論ワーカーの準備が完了するまで503）"""
+    registry = get_registry()
+    ready = (registry.ready and workers_ready(registry.names)) or not settings.MODEL_PRELOAD
+    if not ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {"status": "ready" if ready else "loading", **registry.status()}
+
+
+@app.get("/health/inference")
+def inference_stats():
+    """推論キューの深さと待ち時間（モデルごと）"""
+    return scheduler_stats()
+
+
+@app.get("/health/cache")
+def cache_stats():
+    """検出結果キャッシュのヒット数・ミス数"""
+    cache = get_detection_cache()
+    return cache.stats() if cache is not None else {"enabled": False}
+
+
+@app.get("/health/storage")
+def storage_stats():
+    """S3へのバックグラウンドアップロードの待ち行列と処理件数"""
+    if not use_background_upload():
+        return {"enabled": False}
+    return get_uploader().stats()
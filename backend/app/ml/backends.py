@@ -0,0 +1,249 @@
+import ast
+import shutil
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import numpy as np
+from PIL import Image, ImageOps
+from app.ml.ops import decode_yolo_output, letterbox, scale_boxes
+from app.ml.quantization import PRECISIONS, quantize_onnx, quantize_openvino
+from app.ml.results import DetectionArrays, result_to_arrays
+from app.core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+_export_lock = threading.Lock()
+
+
+def to_rgb_image(image: Any) -> Image.Image:
+    """ファイルパス・PIL画像・NumPy配列（BGR）を RGB の PIL 画像に変換（ファイルは EXIF の向きを適用）"""
+    if isinstance(image, (str, Path)):
+        image = ImageOps.exif_transpose(Image.open(image))
+    if isinstance(image, np.ndarray):
+        return Image.fromarray(np.ascontiguousarray(image[..., ::-1]))
+    return image if image.mode == "RGB" else image.convert("RGB")
+
+
+def export_model(weights: str, format: str, imgsz: int) -> Path:
+    """
+    PyTorchの重みを最適化済みの形式にエクスポート（初回のみ、以降はキャッシュを使用）
+
+    Args:
+        weights: PyTorchの重みファイル（例: yolov8n.pt）
+        format: エクスポート形式（onnx または openvino）
+        imgsz: 入力画像サイズ
+
+    Returns:
+        エクスポート済みモデルのパス
+    """
+    cache_dir = Path(settings.MODEL_CACHE_DIR)
+    suffix = ".onnx" if format == "onnx" else "_openvino_model"
+    target = cache_dir / f"{Path(weights).stem}_{imgsz}{suffix}"
+
+    with _export_lock:
+        if target.exists():
+            return target
+
+        from ultralytics import YOLO
+
+        logger.info(f"モデルをエクスポートしています: {weights} → {format}")
+        exported = YOLO(weights).export(format=format, imgsz=imgsz, dynamic=True)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        shutil.move(str(exported), str(target))
+        logger.info(f"エクスポート済みモデルを保存しました: {target}")
+        return target
+
+
+class InferenceBackend:
+    """
+    推論エンジンの共通インターフェース
+
+    どのバックエンドも画像ごとの DetectionArrays（元画像の座標系）を返すため、
+    同じ DetectionBox 出力で比較できる。
+    """
+
+    name = ""
+
+    def __init__(
+        self,
+        weights: str,
+        imgsz: int,
+        conf: float,
+        iou: float,
+        max_det: int,
+        threads: int = 0,
+        precision: str = "fp32",
+    ):
+        self.weights = weights
+        self.imgsz = imgsz
+        self.conf = conf
+        self.iou = iou
+        self.max_det = max_det
+        self.threads = threads
+        self.precision = precision
+        self.names: Dict[int, str] = {}
+
+    def predict(self, images: List[Any]) -> List[DetectionArrays]:
+        """画像のリストをまとめて推論"""
+        raise NotImplementedError
+
+
+class TorchBackend(InferenceBackend):
+    """
+    ultralytics（PyTorch eager）で推論
+
+    ultralytics の predictor は呼び出しごとの状態を持ちスレッドセーフではないため、
+    同じインスタンスへの推論（複数の推論ワーカーやウォームアップ）はロックで1件ずつ実行する。
+    """
+
+    name = "torch"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        import torch
+        from ultralytics import YOLO
+
+        if self.precision != "fp32":
+            raise ValueError("torch バックエンドは fp32 のみ対応しています。量子化には onnx または openvino を使用してください")
+        if self.threads > 0:
+            torch.set_num_threads(self.threads)
+        self.model = YOLO(self.weights)
+        self.names = self.model.names
+        self._lock = threading.Lock()
+
+    def predict(self, images: List[Any]) -> List[DetectionArrays]:
+        with self._lock:
+            results = self.model(
+                images, imgsz=self.imgsz, conf=self.conf, iou=self.iou,
+                max_det=self.max_det, verbose=False
+            )
+        return [result_to_arrays(result, self.names) for result in results]
+
+
+class ExportedBackend(InferenceBackend):
+    """
+    エクスポート済みモデル用の共通処理
+
+    前処理（レターボックス）と後処理（デコード・NMS・座標の復元）をNumPyで行い、
+    サブクラスは生出力を返す run だけを実装する。
+    """
+
+    def run(self, batch: np.ndarray) -> np.ndarray:
+        """(B, 3, imgsz, imgsz) の float32 入力から (B, 4 + クラス数, アンカー数) の出力を得る"""
+        raise NotImplementedError
+
+    def predict(self, images: List[Any]) -> List[DetectionArrays]:
+        inputs, transforms = [], []
+        for image in images:
+            image = to_rgb_image(image)
+            array, gain, pad = letterbox(image, self.imgsz)
+            inputs.append(array)
+            transforms.append((gain, pad, image.size))
+
+        batch = np.stack(inputs).transpose(0, 3, 1, 2).astype(np.float32) / 255.0
+        output = self.run(np.ascontiguousarray(batch))
+
+        arrays = []
+        decoded = decode_yolo_output(output, self.conf, self.iou, self.max_det, settings.INFERENCE_MAX_NMS)
+        for (boxes, scores, class_ids), (gain, pad, size) in zip(decoded, transforms):
+            arrays.append(DetectionArrays(
+                boxes=scale_boxes(boxes, gain, pad, size),
+                class_ids=class_ids.astype(np.int64),
+                confidences=scores,
+                names=self.names,
+            ))
+        return arrays
+
+
+class OnnxRuntimeBackend(ExportedBackend):
+    """ONNX Runtime（CPU）で推論"""
+
+    name = "onnx"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise RuntimeError("onnx バックエンドには onnxruntime のインストールが必要です") from e
+
+        path = Path(self.weights) if self.weights.endswith(".onnx") else export_model(self.weights, "onnx", self.imgsz)
+        if self.precision != "fp32":
+            path = quantize_onnx(path, self.precision, self.imgsz, settings.QUANT_CALIBRATION_DIR)
+        options = ort.SessionOptions()
+        if self.threads > 0:
+            options.intra_op_num_threads = self.threads
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(
+            str(path), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(metadata["names"])
+
+    def run(self, batch: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class OpenVinoBackend(ExportedBackend):
+    """OpenVINO（CPU）で推論"""
+
+    name = "openvino"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        try:
+            import openvino as ov
+        except ImportError as e:
+            raise RuntimeError("openvino バックエンドには openvino のインストールが必要です") from e
+        import yaml
+
+        path = Path(self.weights)
+        if not path.is_dir():
+            path = export_model(self.weights, "openvino", self.imgsz)
+        if self.precision != "fp32":
+            path = quantize_openvino(path, self.precision, self.imgsz, settings.QUANT_CALIBRATION_DIR)
+        config = {"INFERENCE_NUM_THREADS": self.threads} if self.threads > 0 else {}
+        core = ov.Core()
+        self.compiled = core.compile_model(str(next(path.glob("*.xml"))), "CPU", config)
+        # compiled(...) は共有の推論リクエストを使うため、推論ワーカーのスレッドごとに作る
+        self._requests = threading.local()
+        with open(path / "metadata.yaml", encoding="utf-8") as f:
+            self.names = {int(k): v for k, v in yaml.safe_load(f)["names"].items()}
+
+    def run(self, batch: np.ndarray) -> np.ndarray:
+        request = getattr(self._requests, "request", None)
+        if request is None:
+            request = self._requests.request = self.compiled.create_infer_request()
+        return request.infer(batch)[0]
+
+
+BACKENDS = {
+    TorchBackend.name: TorchBackend,
+    OnnxRuntimeBackend.name: OnnxRuntimeBackend,
+    OpenVinoBackend.name: OpenVinoBackend,
+}
+
+
+def create_backend(
+    name: Optional[str] = None,
+    weights: Optional[str] = None,
+    precision: Optional[str] = None,
+) -> InferenceBackend:
+    """設定に従って推論バックエンドを作成"""
+    name = name or settings.INFERENCE_BACKEND
+    precision = precision or settings.MODEL_PRECISION
+    if name not in BACKENDS:
+        raise ValueError(f"未対応の INFERENCE_BACKEND です: {name}")
+    if precision not in PRECISIONS:
+        raise ValueError(f"未対応の MODEL_PRECISION です: {precision}")
+    return BACKENDS[name](
+        weights=weights or settings.MODEL_PATH,
+        imgsz=settings.INFERENCE_IMGSZ,
+        conf=settings.INFERENCE_CONF,
+        iou=settings.INFERENCE_IOU,
+        max_det=settings.INFERENCE_MAX_DET,
+        threads=settings.INFERENCE_THREADS,
+        precision=precision,
+    )
@@ -1,71 +1,239 @@
+import io
+import math
 import time
-from typing import List
+from typing import List, Optional, Union
 from pathlib import Path
-from ultralytics import YOLO
+import numpy as np
+from PIL import Image, ImageOps
 from app.schemas.detection import DetectionBox
+from app.ml.backends import InferenceBackend
+from app.ml.ops import batched_nms
+from app.ml.preprocess import prepare_image
+from app.ml.registry import get_registry
+from app.ml.results import DetectionArrays
+from app.core.config import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
-# YOLOv8モデルをロード（初回のみ）
-_model = None
+# 推論に渡せる画像の形式（ファイルパス、エンコード済みバイト列、PIL画像、NumPy配列）
+# NumPy配列はultralyticsの規約どおり HWC・BGR 順で渡すこと
+ImageSource = Union[str, Path, bytes, Image.Image, np.ndarray]
 
 
-def get_model():
-    """YOLOv8モデルを取得（シングルトン）"""
-    global _model
-    if _model is None:
-        try:
-            # YOLOv8n（nano）モデルを使用（軽量で高速）
-            _model = YOLO("yolov8n.pt")
-            logger.info("YOLOv8モデルをロードしました")
-        except Exception as e:
-            logger.error(f"モデルのロードに失敗しました: {e}")
-            raise
-    return _model
+def get_model(model: Optional[str] = None) -> InferenceBackend:
+    """
+    YOLOv8モデル（設定された推論バックエンド）を取得
+    
+    Args:
+        model: モデル名（省略時はデフォルトの MODEL_PATH、通常は起動時にロード済み）
+    """
+    return get_registry().get(model)
+
+
+def inference_params(model: Optional[str] = None, tiled: bool = False) -> dict:
+    """検出結果に影響するモデル名・推論パラメータ（キャッシュキーに使用）"""
+    registry = get_registry()
+    params = {
+        "model": registry.paths[registry.resolve(model)],
+        "backend": settings.INFERENCE_BACKEND,
+        "precision": settings.MODEL_PRECISION,
+        "imgsz": settings.INFERENCE_IMGSZ,
+        "conf": settings.INFERENCE_CONF,
+        "iou": settings.INFERENCE_IOU,
+        "max_det": settings.INFERENCE_MAX_DET,
+        "exif_transpose": True,  # EXIF の向きを適用する前にキャッシュした結果を使わない
+    }
+    if tiled:
+        params["tiles"] = {
+            "size": settings.TILE_SIZE,
+            "overlap": settings.TILE_OVERLAP,
+            "max_tiles": settings.TILE_MAX_TILES,
+            "include_full": settings.TILE_INCLUDE_FULL,
+        }
+    return params
+
+
+def load_image(image: ImageSource) -> Union[str, Image.Image, np.ndarray]:
+    """
+    画像をモデルにそのまま渡せる形式に変換（ディスクを経由せずメモリ上でデコードし、EXIF の向きを適用）
+    
+    Args:
+        image: ファイルパス、バイト列、PIL画像、またはNumPy配列
+        
+    Returns:
+        モデルに渡す画像
+    """
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        image = Image.open(io.BytesIO(image))
+    if isinstance(image, Image.Image):
+        # EXIF の向きを適用（適用後の画像からは Orientation が消えるため、切り出したタイルで二重に回さない）
+        image = ImageOps.exif_transpose(image)
+        return image if image.mode == "RGB" else image.convert("RGB")
+    if isinstance(image, Path):
+        return str(image)
+    return image
 
 
-def detect_objects(image_path: str) -> tuple[List[DetectionBox], float]:
+def detect_objects(
+    image: ImageSource, columnar: bool = False, model: Optional[str] = None
+) -> tuple[Union[List[DetectionBox], DetectionArrays], float]:
     """
     画像内の物体を検出
     
     Args:
-        image_path: 画像ファイルのパス
+        image: 画像（ファイルパス、バイト列、PIL画像、またはNumPy配列）
+        columnar: True の場合は DetectionBox のリストではなく DetectionArrays を返す
+        model: モデル名（省略時はデフォルトモデル）
         
     Returns:
-        (検出結果のリスト, 処理時間)
+        (検出結果, 処理時間)
+    """
+    return detect_objects_batch([image], columnar=columnar, model=model)[0]
+
+
+def detect_objects_batch(
+    images: List[ImageSource], columnar: bool = False, model: Optional[str] = None
+) -> List[tuple[Union[List[DetectionBox], DetectionArrays], float]]:
+    """
+    複数の画像をまとめて1回のモデル呼び出しで検出
+    
+    Args:
+        images: 画像のリスト（ファイルパス、バイト列、PIL画像、またはNumPy配列）
+        columnar: True の場合は DetectionBox のリストではなく DetectionArrays を返す
+        model: モデル名（省略時はデフォルトモデル）
+        
+    Returns:
+        画像ごとの (検出結果, 処理時間) のリスト（入力と同じ順序）
     """
     start_time = time.time()
     
     try:
-        model = get_model()
-        results = model(image_path)
-        
-        detections = []
-        for result in results:
-            boxes = result.boxes
-            for box in boxes:
-                # バウンディングボックスの座標を取得
-                x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                # クラス名と信頼度を取得
-                cls = int(box.cls[0].cpu().numpy())
-                confidence = float(box.conf[0].cpu().numpy())
-                label = model.names[cls]
-                
-                detections.append(DetectionBox(
-                    x1=float(x1),
-                    y1=float(y1),
-                    x2=float(x2),
-                    y2=float(y2),
-                    label=label,
-                    confidence=round(confidence * 100, 2)  # パーセンテージに変換
-                ))
+        backend = get_model(model)
+        # 大きな画像はモデルの入力サイズ近くまで縮小してデコードし、座標は元画像の座標系に戻す
+        prepared = [prepare_image(image, backend.imgsz) for image in images]
+        # 画像ごとに結果を1回だけホストに転送し、配列演算で変換
+        arrays = backend.predict([p.image for p in prepared])
+        arrays = [p.restore(a) for p, a in zip(prepared, arrays)]
+        outputs = arrays if columnar else [a.to_boxes() for a in arrays]
         
+        # バッチ全体の処理時間を各画像の処理時間とする
         processing_time = time.time() - start_time
-        logger.info(f"検出完了: {len(detections)}個の物体を検出、処理時間: {processing_time:.2f}秒")
+        logger.info(
+            f"検出完了: {len(images)}枚の画像から{sum(len(a) for a in arrays)}個の物体を検出、"
+            f"処理時間: {processing_time:.2f}秒"
+        )
         
-        return detections, processing_time
+        return [(output, processing_time) for output in outputs]
         
     except Exception as e:
         logger.error(f"物体検出中にエラーが発生しました: {e}")
         raise
+
+
+def tile_grid(
+    width: int, height: int, tile_size: int, overlap: float, max_tiles: int
+) -> List[tuple[int, int, int, int]]:
+    """
+    画像を重なりのあるタイルに分割する座標 (x1, y1, x2, y2) のリスト
+    
+    タイル数が max_tiles を超える場合はタイルを大きくして枚数を抑える
+    （1回の推論のバッチサイズ、つまりレイテンシの上限を固定するため）。
+
+    Raises:
+        ValueError: overlap が 0 以上 1 未満でない場合（タイルの間隔が0以下になるため）
+    """
+    if not 0 <= overlap < 1:
+        raise ValueError(f"タイルの重なりは0以上1未満である必要があります: {overlap}")
+    
+    def axis_count(length: int, size: int) -> int:
+        if length <= size:
+            return 1
+        stride = size * (1 - overlap)
+        return math.ceil((length - size) / stride) + 1
+    
+    while axis_count(width, tile_size) * axis_count(height, tile_size) > max(1, max_tiles):
+        tile_size = math.ceil(tile_size * 1.25)
+    
+    def axis_starts(length: int, size: int) -> List[int]:
+        count = axis_count(length, size)
+        if count == 1:
+            return [0]
+        # 端のタイルが画像の外にはみ出さないよう均等に配置
+        return [round(i * (length - size) / (count - 1)) for i in range(count)]
+    
+    return [
+        (x, y, min(x + tile_size, width), min(y + tile_size, height))
+        for y in axis_starts(height, tile_size)
+        for x in axis_starts(width, tile_size)
+    ]
+
+
+def detect_objects_tiled(
+    image: ImageSource, columnar: bool = False, model: Optional[str] = None
+) -> tuple[Union[List[DetectionBox], DetectionArrays], float]:
+    """
+    画像を重なりのあるタイルに分割して検出（高解像度画像の小さな物体向け）
+    
+    全タイル（と TILE_INCLUDE_FULL の場合は画像全体の縮小版）を1回のバッチで推論し、
+    元画像の座標に戻した結果をタイルをまたいだ NMS で統合する。
+    
+    Args:
+        image: 画像（ファイルパス、バイト列、PIL画像）
+        columnar: True の場合は DetectionBox のリストではなく DetectionArrays を返す
+        model: モデル名（省略時はデフォルトモデル）
+        
+    Returns:
+        (検出結果, 処理時間)
+    """
+    start_time = time.time()
+    
+    try:
+        backend = get_model(model)
+        image = load_image(image)
+        if isinstance(image, str):
+            image = load_image(Image.open(image))
+        width, height = image.size
+        
+        # 画像全体の推論も最大タイル数に含め、1回のバッチを TILE_MAX_TILES 枚までに保つ
+        include_full = settings.TILE_INCLUDE_FULL
+        max_tiles = settings.TILE_MAX_TILES - 1 if include_full else settings.TILE_MAX_TILES
+        tiles = tile_grid(width, height, settings.TILE_SIZE, settings.TILE_OVERLAP, max_tiles)
+        crops = [prepare_image(image.crop(tile), backend.imgsz) for tile in tiles]
+        offsets = [(x1, y1) for x1, y1, _, _ in tiles]
+        if include_full and len(tiles) > 1:
+            # タイルの境界で分断される大きな物体は画像全体の推論で拾う
+            crops.append(prepare_image(image, backend.imgsz))
+            offsets.append((0, 0))
+        
+        arrays = backend.predict([crop.image for crop in crops])
+        arrays = [crop.restore(a) for crop, a in zip(crops, arrays)]
+        
+        boxes = np.concatenate([
+            a.boxes.astype(np.float32) + np.array([x, y, x, y], dtype=np.float32)
+            for a, (x, y) in zip(arrays, offsets)
+        ])
+        class_ids = np.concatenate([a.class_ids.astype(np.int64) for a in arrays])
+        confidences = np.concatenate([a.confidences.astype(np.float32) for a in arrays])
+        
+        # タイルの重なりで重複した検出を統合
+        keep = batched_nms(
+            boxes, confidences, class_ids, settings.INFERENCE_IOU, settings.INFERENCE_MAX_NMS
+        )[:settings.INFERENCE_MAX_DET]
+        merged = DetectionArrays(
+            boxes=boxes[keep],
+            class_ids=class_ids[keep],
+            confidences=confidences[keep],
+            names=backend.names,
+        )
+        
+        processing_time = time.time() - start_time
+        logger.info(
+            f"タイル検出完了: {len(tiles)}タイルから{len(merged)}個の物体を検出、"
+            f"処理時間: {processing_time:.2f}秒"
+        )
+        return (merged if columnar else merged.to_boxes()), processing_time
+        
+    except Exception as e:
+        logger.error(f"タイル検出中にエラーが発生しました: {e}")
+        raise
@@ -0,0 +1,135 @@
+"""
+フル精度モデルと量子化モデルの速度・精度を比較するツール
+
+使い方:
+    python -m app.ml.evaluate --images ./samples --backend onnx --candidate int8
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import List, Optional
+import numpy as np
+from PIL import Image
+from app.ml.backends import InferenceBackend, create_backend
+from app.ml.ops import box_iou
+from app.ml.quantization import IMAGE_SUFFIXES, PRECISIONS
+from app.ml.results import DetectionArrays
+
+
+def match_detections(
+    reference: DetectionArrays, candidate: DetectionArrays, iou_threshold: float
+) -> int:
+    """
+    同じラベル同士を IoU で対応付け、一致した検出の数を返す
+
+    候補側を信頼度の高い順に、未対応の基準側ボックスのうち IoU 最大のものへ割り当てる。
+    """
+    if len(reference) == 0 or len(candidate) == 0:
+        return 0
+    ious = box_iou(candidate.boxes, reference.boxes)
+    same_label = np.array(candidate.labels)[:, None] == np.array(reference.labels)[None, :]
+    ious = np.where(same_label, ious, 0.0)
+
+    matched = np.zeros(len(reference), dtype=bool)
+    true_positives = 0
+    for i in np.argsort(-candidate.confidences):
+        row = np.where(matched, 0.0, ious[i])
+        j = int(row.argmax())
+        if row[j] >= iou_threshold:
+            matched[j] = True
+            true_positives += 1
+    return true_positives
+
+
+def run_backend(backend: InferenceBackend, images: List[Image.Image], repeats: int):
+    """各画像を推論し、(結果のリスト, 1枚あたりの平均レイテンシ[秒]) を返す"""
+    backend.predict(images[:1])  # ウォームアップ
+    results, elapsed = [], 0.0
+    for image in images:
+        start = time.perf_counter()
+        for _ in range(repeats):
+            arrays = backend.predict([image])[0]
+        elapsed += (time.perf_counter() - start) / repeats
+        results.append(arrays)
+    return results, elapsed / len(images)
+
+
+def compare_precisions(
+    images_dir: str,
+    backend: str = "onnx",
+    baseline: str = "fp32",
+    candidate: str = "int8",
+    weights: Optional[str] = None,
+    iou_threshold: float = 0.5,
+    repeats: int = 3,
+) -> dict:
+    """
+    同じ画像セットを基準モデルと候補モデルで推論し、速度と検出結果の差を集計
+
+    Returns:
+        レイテンシ比と IoU で対応付けた適合率・再現率を含むレポート
+    """
+    paths = sorted(p for p in Path(images_dir).iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+    if not paths:
+        raise ValueError(f"画像が見つかりません: {images_dir}")
+    images = [Image.open(p).convert("RGB") for p in paths]
+
+    reference, baseline_latency = run_backend(
+        create_backend(backend, weights, precision=baseline), images, repeats
+    )
+    predicted, candidate_latency = run_backend(
+        create_backend(backend, weights, precision=candidate), images, repeats
+    )
+
+    true_positives = sum(
+        match_detections(ref, pred, iou_threshold) for ref, pred in zip(reference, predicted)
+    )
+    reference_count = sum(len(ref) for ref in reference)
+    candidate_count = sum(len(pred) for pred in predicted)
+
+    return {
+        "backend": backend,
+        "baseline": baseline,
+        "candidate": candidate,
+        "images": len(images),
+        "baseline_latency_ms": round(baseline_latency * 1000, 2),
+        "candidate_latency_ms": round(candidate_latency * 1000, 2),
+        "latency_ratio": round(candidate_latency / baseline_latency, 3),
+        "iou_threshold": iou_threshold,
+        "baseline_detections": reference_count,
+        "candidate_detections": candidate_count,
+        "precision": round(true_positives / candidate_count, 4) if candidate_count else 1.0,
+        "recall": round(true_positives / reference_count, 4) if reference_count else 1.0,
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="フル精度モデルと量子化モデルの速度・精度を比較")
+    parser.add_argument("--images", required=True, help="比較に使う画像フォルダ")
+    parser.add_argument("--backend", default="onnx", help="推論バックエンド（onnx / openvino）")
+    parser.add_argument("--baseline", default="fp32", choices=PRECISIONS)
+    parser.add_argument("--candidate", default="int8", choices=PRECISIONS)
+    parser.add_argument("--weights", default=None, help="重みファイル（省略時は MODEL_PATH）")
+    parser.add_argument("--iou", type=float, default=0.5, help="一致とみなす IoU の閾値")
+    parser.add_argument("--repeats", type=int, default=3, help="1枚あたりの計測回数")
+    parser.add_argument("--json", action="store_true", help="JSON 形式で出力")
+    args = parser.parse_args(argv)
+
+    report = compare_precisions(
+        args.images, args.backend, args.baseline, args.candidate,
+        args.weights, args.iou, args.repeats
+    )
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+
+    print(f"バックエンド: {report['backend']}（{report['baseline']} → {report['candidate']}）, 画像: {report['images']}枚")
+    print(f"レイテンシ: {report['baseline_latency_ms']}ms → {report['candidate_latency_ms']}ms"
+          f"（比率 {report['latency_ratio']}）")
+    print(f"検出数: {report['baseline_detections']} → {report['candidate_detections']}")
+    print(f"IoU>={report['iou_threshold']} での適合率: {report['precision']}, 再現率: {report['recall']}")
+
+
+if __name__ == "__main__":
+    main()
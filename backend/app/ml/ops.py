@@ -0,0 +1,115 @@
+from typing import List, Optional, Tuple
+import numpy as np
+from PIL import Image
+
+# レターボックスの余白色（ultralyticsと同じ値）
+PAD_COLOR = (114, 114, 114)
+
+
+def letterbox(image: Image.Image, size: int) -> Tuple[np.ndarray, float, Tuple[int, int]]:
+    """
+    アスペクト比を保ったまま size x size に縮小し、余白を埋める
+
+    Returns:
+        (HWC・RGB の配列, 縮小率, (左余白, 上余白))
+    """
+    width, height = image.size
+    gain = min(size / width, size / height)
+    new_width, new_height = max(1, round(width * gain)), max(1, round(height * gain))
+    if (new_width, new_height) != (width, height):
+        image = image.resize((new_width, new_height), Image.BILINEAR)
+    pad = ((size - new_width) // 2, (size - new_height) // 2)
+    canvas = Image.new("RGB", (size, size), PAD_COLOR)
+    canvas.paste(image, pad)
+    return np.asarray(canvas), gain, pad
+
+
+def scale_boxes(
+    boxes: np.ndarray, gain: float, pad: Tuple[int, int], original_size: Tuple[int, int]
+) -> np.ndarray:
+    """レターボックス後の座標を元画像の座標に戻す（original_size は (幅, 高さ)）"""
+    boxes = boxes.copy()
+    boxes[:, [0, 2]] = (boxes[:, [0, 2]] - pad[0]) / gain
+    boxes[:, [1, 3]] = (boxes[:, [1, 3]] - pad[1]) / gain
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, original_size[0])
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, original_size[1])
+    return boxes
+
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """(N, 4) と (M, 4) の xyxy ボックス間の IoU 行列 (N, M)"""
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod((bottom_right - top_left).clip(0), axis=2)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def nms(
+    boxes: np.ndarray, scores: np.ndarray, iou_threshold: float, max_candidates: Optional[int] = None
+) -> np.ndarray:
+    """
+    Non-Maximum Suppression（残すボックスのインデックスを信頼度の高い順に返す）
+
+    ボックス数の2乗に比例する処理のため、max_candidates を指定した場合は
+    信頼度の高い順にその件数だけを対象にする（ultralytics の max_nms と同じ考え方）。
+    """
+    order = scores.argsort()[::-1]
+    if max_candidates is not None:
+        order = order[:max_candidates]
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        if order.size == 1:
+            break
+        ious = box_iou(boxes[i:i + 1], boxes[order[1:]])[0]
+        order = order[1:][ious <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+def batched_nms(
+    boxes: np.ndarray,
+    scores: np.ndarray,
+    class_ids: np.ndarray,
+    iou_threshold: float,
+    max_candidates: Optional[int] = None,
+) -> np.ndarray:
+    """クラスごとの NMS（クラスIDで座標をずらして1回の NMS で処理）"""
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+    offsets = class_ids.astype(boxes.dtype)[:, None] * (boxes.max() + 1)
+    return nms(boxes + offsets, scores, iou_threshold, max_candidates)
+
+
+def decode_yolo_output(
+    output: np.ndarray,
+    conf_threshold: float,
+    iou_threshold: float,
+    max_det: int,
+    max_nms: Optional[int] = None,
+) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    YOLOv8 の生出力 (B, 4 + クラス数, アンカー数) をデコードする
+
+    max_nms を指定した場合、NMS の対象は信頼度の高い順にその件数までにする。
+
+    Returns:
+        画像ごとの (xyxy ボックス, 信頼度, クラスID) のリスト
+    """
+    results = []
+    for prediction in output.transpose(0, 2, 1):
+        class_scores = prediction[:, 4:]
+        class_ids = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(class_ids)), class_ids]
+        mask = scores > conf_threshold
+        xywh, scores, class_ids = prediction[mask, :4], scores[mask], class_ids[mask]
+
+        boxes = np.empty_like(xywh)
+        boxes[:, :2] = xywh[:, :2] - xywh[:, 2:] / 2
+        boxes[:, 2:] = xywh[:, :2] + xywh[:, 2:] / 2
+
+        keep = batched_nms(boxes, scores, class_ids, iou_threshold, max_nms)[:max_det]
+        results.append((boxes[keep], scores[keep], class_ids[keep]))
+    return results
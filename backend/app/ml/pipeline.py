@@ -0,0 +1,66 @@
+import asyncio
+from typing import List, Optional
+from PIL import Image
+from app.schemas.detection import DetectionBox
+from app.ml.detector import detect_objects_tiled, inference_params
+from app.ml.scheduler import get_scheduler, InferenceQueueFullError
+from app.core.cache import DetectionCache, content_hash, get_detection_cache
+from app.core.config import settings
+
+
+async def run_detection(
+    file_content: bytes, image: Image.Image, model: Optional[str] = None, tiled: bool = False
+) -> tuple[List[DetectionBox], float, str]:
+    """
+    画像の物体検出（キャッシュ確認 → バッチ推論 → キャッシュ保存）
+
+    Args:
+        file_content: アップロードされた画像のバイト列
+        image: 開いた画像（スレッドの推論ワーカーではそのまま使い、デコードはワーカー上で行う）
+        model: モデル名
+        tiled: True の場合はタイル分割して検出（高解像度画像の小さな物体向け）
+
+    Returns:
+        (検出結果のリスト, 処理時間, 画像内容のハッシュ)
+
+    Raises:
+        InferenceQueueFullError: 推論キューが満杯の場合
+    """
+    # 同じ画像・同じモデル設定の検出結果がキャッシュにあれば推論をスキップ
+    image_hash = content_hash(file_content)
+    cache = get_detection_cache()
+    cache_key = DetectionCache.make_key(image_hash, inference_params(model, tiled))
+    cached = await cache.get_async(cache_key) if cache is not None else None
+    if cached is not None:
+        return cached[0], cached[1], image_hash
+
+    scheduler = get_scheduler(model)
+    # プロセスプールには開いた画像ではなくエンコード済みのバイト列を渡し、ワーカー側で縮小デコードする
+    # （PIL画像をピクルすると、送る前にこのプロセスで全画素がデコードされるため）
+    source = file_content if scheduler.executor_type == "process" else image
+    if tiled:
+        # タイル全体で1回のバッチになるため、他のリクエストとはまとめずに実行
+        detections, processing_time = await scheduler.run_exclusive(
+            detect_objects_tiled, source, model=scheduler.model
+        )
+    else:
+        # 物体検出（同時リクエストとまとめてバッチ推論）
+        detections, processing_time = await scheduler.submit(source)
+    if cache is not None:
+        await cache.set_async(cache_key, detections, processing_time)
+    return detections, processing_time, image_hash
+
+
+async def run_detection_when_available(
+    file_content: bytes, image: Image.Image, model: Optional[str] = None, tiled: bool = False
+) -> tuple[List[DetectionBox], float, str]:
+    """
+    run_detection と同じだが、推論キューが満杯の場合は空くまで待って再試行する
+    
+    ジョブやバッチ処理など、すぐに応答を返す必要のない呼び出し元向け。
+    """
+    while True:
+        try:
+            return await run_detection(file_content, image, model, tiled)
+        except InferenceQueueFullError:
+            await asyncio.sleep(settings.INFERENCE_RETRY_AFTER_SECONDS)
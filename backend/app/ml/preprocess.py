@@ -0,0 +1,90 @@
+import io
+import math
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Tuple, Union
+import numpy as np
+from PIL import Image, ImageOps
+from app.ml.results import DetectionArrays
+
+EXIF_ORIENTATION = 0x0112
+
+
+@dataclass
+class PreparedImage:
+    """
+    モデル入力サイズ近くまで縮小してデコードした画像と、元画像の座標に戻すための情報
+
+    レターボックス（アスペクト比を保った縮小と余白埋め）は各バックエンドが行い、
+    その座標は縮小後の画像の座標系で返るため、restore で元画像の座標に拡大する。
+    """
+    image: Union[str, Image.Image, np.ndarray]  # モデルに渡す画像（EXIF の向きを適用済み）
+    original_size: Tuple[int, int]  # 元画像の (幅, 高さ)（EXIF の向きを適用した後）
+    scale: Tuple[float, float]  # 元画像 / 縮小後の画像 の (横, 縦) 倍率
+
+    def restore(self, arrays: DetectionArrays) -> DetectionArrays:
+        """縮小後の画像の座標を元画像の座標に戻す"""
+        if self.scale == (1.0, 1.0) or len(arrays) == 0:
+            return arrays
+        boxes = arrays.boxes.astype(np.float32, copy=True)
+        boxes[:, [0, 2]] = (boxes[:, [0, 2]] * self.scale[0]).clip(0, self.original_size[0])
+        boxes[:, [1, 3]] = (boxes[:, [1, 3]] * self.scale[1]).clip(0, self.original_size[1])
+        arrays.boxes = boxes
+        return arrays
+
+
+def reduced_decode(image: Image.Image, size: int) -> Image.Image:
+    """
+    長辺が size を下回らない範囲でできるだけ小さくデコードする
+
+    JPEG は draft モードで DCT の段階から 1/2・1/4・1/8 に縮小してデコードするため、
+    フル解像度のピクセルをメモリに展開しない。それ以外の形式は整数倍の reduce で
+    縮小してから後段のリサイズに渡す。
+    """
+    width, height = image.size
+    ratio = size / max(width, height)
+    if ratio >= 1:
+        return image if image.mode == "RGB" else image.convert("RGB")
+
+    if image.format == "JPEG":
+        # 要求サイズ以上で最も小さいスケールが選ばれる（読み込み前のみ有効）
+        image.draft("RGB", (math.ceil(width * ratio), math.ceil(height * ratio)))
+
+    factor = max(image.size) // size
+    if factor >= 2:
+        image = image.reduce(factor)
+    return image if image.mode == "RGB" else image.convert("RGB")
+
+
+def oriented_size(image: Image.Image) -> Tuple[int, int]:
+    """EXIF の Orientation を適用した後の (幅, 高さ)（画素はデコードしない）"""
+    width, height = image.size
+    if image.getexif().get(EXIF_ORIENTATION) in (5, 6, 7, 8):
+        return height, width
+    return width, height
+
+
+def prepare_image(image: Any, size: int) -> PreparedImage:
+    """
+    推論用に画像を縮小デコードし、EXIF の向きを適用
+
+    Args:
+        image: ファイルパス、バイト列、PIL画像、またはNumPy配列（HWC・BGR、そのまま渡す）
+        size: モデルの入力サイズ（INFERENCE_IMGSZ）
+
+    Returns:
+        縮小した画像と座標の復元情報
+    """
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        image = Image.open(io.BytesIO(image))
+    elif isinstance(image, (str, Path)):
+        image = Image.open(image)
+    if isinstance(image, np.ndarray):
+        height, width = image.shape[:2]
+        return PreparedImage(image=image, original_size=(width, height), scale=(1.0, 1.0))
+
+    # スマートフォンの写真などは EXIF の向きに回転する（縮小デコードの後に行い、サムネイルと座標を揃える）
+    original_size = oriented_size(image)
+    reduced = ImageOps.exif_transpose(reduced_decode(image, size))
+    scale = (original_size[0] / reduced.width, original_size[1] / reduced.height)
+    return PreparedImage(image=reduced, original_size=original_size, scale=scale)
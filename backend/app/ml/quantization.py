@@ -0,0 +1,155 @@
+import threading
+from pathlib import Path
+from typing import Iterator, List, Optional
+import numpy as np
+from PIL import Image
+from app.ml.ops import letterbox
+from app.core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+PRECISIONS = ("fp32", "fp16", "int8")
+
+_quantize_lock = threading.Lock()
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png"}
+
+
+def calibration_images(calibration_dir: Optional[str], limit: Optional[int] = None) -> List[Path]:
+    """キャリブレーション用フォルダ内の画像ファイルを取得"""
+    if not calibration_dir:
+        return []
+    limit = limit or settings.QUANT_CALIBRATION_MAX_IMAGES
+    paths = sorted(p for p in Path(calibration_dir).iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+    return paths[:limit]
+
+
+def calibration_batches(paths: List[Path], imgsz: int) -> Iterator[np.ndarray]:
+    """キャリブレーション画像を推論時と同じ前処理で (1, 3, imgsz, imgsz) の入力に変換"""
+    for path in paths:
+        with Image.open(path) as image:
+            array, _, _ = letterbox(image.convert("RGB"), imgsz)
+        yield (array.transpose(2, 0, 1)[None].astype(np.float32) / 255.0)
+
+
+def _quantized_path(source: Path, precision: str, static: bool) -> Path:
+    suffix = f"_{precision}_static" if static else f"_{precision}"
+    if source.is_dir():
+        return source.with_name(f"{source.name}{suffix}")
+    return source.with_name(f"{source.stem}{suffix}{source.suffix}")
+
+
+def quantize_onnx(
+    model_path: Path,
+    precision: str,
+    imgsz: int,
+    calibration_dir: Optional[str] = None,
+) -> Path:
+    """
+    ONNXモデルを量子化（初回のみ、以降はキャッシュを使用）
+
+    int8 はキャリブレーション画像があれば静的量子化、なければ重みのみの動的量子化。
+    fp16 は入出力を float32 のまま内部の重みと演算を float16 に変換する。
+
+    Returns:
+        量子化済みモデルのパス
+    """
+    images = calibration_images(calibration_dir) if precision == "int8" else []
+    target = _quantized_path(model_path, precision, static=bool(images))
+
+    with _quantize_lock:
+        if target.exists():
+            return target
+
+        if precision == "fp16":
+            import onnx
+            from onnxruntime.transformers.float16 import convert_float_to_float16
+
+            model = convert_float_to_float16(onnx.load(str(model_path)), keep_io_types=True)
+            onnx.save(model, str(target))
+        elif precision == "int8" and images:
+            from onnxruntime.quantization import (
+                CalibrationDataReader, QuantFormat, QuantType, quantize_static
+            )
+
+            class _Reader(CalibrationDataReader):
+                def __init__(self, input_name: str):
+                    self.batches = calibration_batches(images, imgsz)
+                    self.input_name = input_name
+
+                def get_next(self):
+                    batch = next(self.batches, None)
+                    return None if batch is None else {self.input_name: batch}
+
+            import onnxruntime as ort
+
+            input_name = ort.InferenceSession(
+                str(model_path), providers=["CPUExecutionProvider"]
+            ).get_inputs()[0].name
+            logger.info(f"INT8静的量子化を実行しています（キャリブレーション画像: {len(images)}枚）")
+            quantize_static(
+                str(model_path), str(target), _Reader(input_name),
+                quant_format=QuantFormat.QDQ,
+                activation_type=QuantType.QUInt8,
+                weight_type=QuantType.QInt8,
+                per_channel=True,
+            )
+        elif precision == "int8":
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            logger.info("INT8動的量子化を実行しています")
+            quantize_dynamic(str(model_path), str(target), weight_type=QuantType.QUInt8)
+        else:
+            raise ValueError(f"未対応の MODEL_PRECISION です: {precision}")
+
+        logger.info(f"量子化済みモデルを保存しました: {target}")
+        return target
+
+
+def quantize_openvino(
+    model_dir: Path,
+    precision: str,
+    imgsz: int,
+    calibration_dir: Optional[str] = None,
+) -> Path:
+    """
+    OpenVINOモデルを量子化（初回のみ、以降はキャッシュを使用）
+
+    fp16 は重みを float16 に圧縮し、int8 は NNCF によるキャリブレーション画像を使った静的量子化。
+
+    Returns:
+        量子化済みモデルのディレクトリ
+    """
+    images = calibration_images(calibration_dir) if precision == "int8" else []
+    target = _quantized_path(model_dir, precision, static=bool(images))
+
+    with _quantize_lock:
+        if target.exists():
+            return target
+
+        import shutil
+        import openvino as ov
+
+        model = ov.Core().read_model(str(next(model_dir.glob("*.xml"))))
+        if precision == "int8":
+            if not images:
+                raise ValueError("OpenVINOのINT8量子化には QUANT_CALIBRATION_DIR の画像が必要です")
+            try:
+                import nncf
+            except ImportError as e:
+                raise RuntimeError("OpenVINOのINT8量子化には nncf のインストールが必要です") from e
+            logger.info(f"INT8静的量子化を実行しています（キャリブレーション画像: {len(images)}枚）")
+            dataset = nncf.Dataset(list(calibration_batches(images, imgsz)))
+            model = nncf.quantize(model, dataset, preset=nncf.QuantizationPreset.MIXED)
+            compress = False
+        elif precision == "fp16":
+            compress = True
+        else:
+            raise ValueError(f"未対応の MODEL_PRECISION です: {precision}")
+
+        target.mkdir(parents=True, exist_ok=True)
+        ov.save_model(model, str(target / "model.xml"), compress_to_fp16=compress)
+        shutil.copy(model_dir / "metadata.yaml", target / "metadata.yaml")
+        logger.info(f"量子化済みモデルを保存しました: {target}")
+        return target
@@ -0,0 +1,128 @@
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+from PIL import Image
+from app.ml.backends import InferenceBackend, create_backend
+from app.core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class UnknownModelError(KeyError):
+    """設定されていないモデル名が指定された"""
+
+
+class ModelRegistry:
+    """
+    設定されたモデルを名前（重みファイル名の拡張子なし、例: yolov8n）で管理するレジストリ
+
+    起動時に全モデルをロードしてウォームアップ推論まで済ませ、ready で準備完了を報告する。
+    モデルごとのロックで、同時アクセス時に同じモデルを二重にロードしないようにする。
+    """
+
+    def __init__(self, model_paths: Optional[List[str]] = None, default: Optional[str] = None):
+        default = default or settings.MODEL_PATH
+        if model_paths is None:
+            model_paths = [default] + [p.strip() for p in settings.MODELS.split(",") if p.strip()]
+        self.paths: Dict[str, str] = {}
+        for path in model_paths:
+            self.paths.setdefault(self.model_name(path), path)
+        self.default = self.model_name(default)
+        self._models: Dict[str, InferenceBackend] = {}
+        self._warm: Dict[str, float] = {}
+        self._errors: Dict[str, str] = {}
+        self._locks = {name: threading.Lock() for name in self.paths}
+
+    @staticmethod
+    def model_name(path: str) -> str:
+        """重みファイルのパスからモデル名を取得"""
+        return Path(path).stem
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.paths)
+
+    def resolve(self, name: Optional[str] = None) -> str:
+        """モデル名（または重みファイルのパス）を登録済みのモデル名に解決"""
+        if not name:
+            return self.default
+        name = self.model_name(name)
+        if name not in self.paths:
+            raise UnknownModelError(name)
+        return name
+
+    def get(self, name: Optional[str] = None) -> InferenceBackend:
+        """モデルを取得（未ロードの場合はロード）"""
+        name = self.resolve(name)
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        with self._locks[name]:
+            if name not in self._models:
+                try:
+                    self._models[name] = create_backend(weights=self.paths[name])
+                    self._errors.pop(name, None)
+                    logger.info(f"モデルをロードしました: {name}（バックエンド={self._models[name].name}）")
+                except Exception as e:
+                    self._errors[name] = str(e)
+                    logger.error(f"モデルのロードに失敗しました: {name}: {e}")
+                    raise
+            return self._models[name]
+
+    def warmup(self, name: Optional[str] = None):
+        """ダミー画像で1回推論し、初回呼び出しのオーバーヘッドを事前に済ませる"""
+        name = self.resolve(name)
+        model = self.get(name)
+        start = time.time()
+        model.predict([Image.new("RGB", (model.imgsz, model.imgsz))])
+        self._warm[name] = time.time() - start
+        logger.info(f"ウォームアップ完了: {name}（{self._warm[name]:.2f}秒）")
+
+    def load_all(self, warmup: bool = True):
+        """設定された全モデルをロード（とウォームアップ）"""
+        for name in self.names:
+            try:
+                if warmup:
+                    self.warmup(name)
+                else:
+                    self.get(name)
+            except Exception as e:
+                self._errors[name] = str(e)
+                logger.error(f"モデルの準備に失敗しました: {name}: {e}", exc_info=True)
+
+    @property
+    def ready(self) -> bool:
+        """全モデルのロードとウォームアップが完了しているか"""
+        return all(name in self._warm for name in self.names)
+
+    def status(self) -> dict:
+        """モデルごとのロード状況"""
+        return {
+            "default": self.default,
+            "models": {
+                name: {
+                    "path": path,
+                    "loaded": name in self._models,
+                    "warm": name in self._warm,
+                    "warmup_seconds": round(self._warm[name], 3) if name in self._warm else None,
+                    "error": self._errors.get(name),
+                }
+                for name, path in self.paths.items()
+            },
+        }
+
+
+_registry: Optional[ModelRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ModelRegistry:
+    """モデルレジストリを取得（シングルトン）"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry()
+    return _registry
@@ -0,0 +1,50 @@
+from dataclasses import dataclass
+from typing import Dict, List
+import numpy as np
+from app.schemas.detection import DetectionBox
+
+
+@dataclass
+class DetectionArrays:
+    """
+    1枚の画像の検出結果（列指向）
+
+    ボックスごとのpydanticオブジェクトを作らずに配列のまま扱いたい呼び出し元向け。
+    """
+    boxes: np.ndarray  # (N, 4) の x1, y1, x2, y2
+    class_ids: np.ndarray  # (N,) のクラスID
+    confidences: np.ndarray  # (N,) の信頼度（0〜1）
+    names: Dict[int, str]  # クラスID → ラベル名
+
+    def __len__(self) -> int:
+        return len(self.class_ids)
+
+    @property
+    def labels(self) -> List[str]:
+        """ラベル名のリスト"""
+        return [self.names[cls] for cls in self.class_ids.tolist()]
+
+    def to_boxes(self) -> List[DetectionBox]:
+        """DetectionBox のリストに変換"""
+        coords = self.boxes.astype(float).tolist()
+        # パーセンテージに変換
+        confidences = np.round(self.confidences.astype(float) * 100, 2).tolist()
+        # 値は変換済みのため検証を省略して生成する
+        return [
+            DetectionBox.model_construct(
+                x1=x1, y1=y1, x2=x2, y2=y2, label=label, confidence=confidence
+            )
+            for (x1, y1, x2, y2), label, confidence in zip(coords, self.labels, confidences)
+        ]
+
+
+def result_to_arrays(result, names: Dict[int, str]) -> DetectionArrays:
+    """ultralyticsの推論結果を1回のホスト転送で配列に変換"""
+    # data は (N, 6) の [x1, y1, x2, y2, 信頼度, クラスID]
+    data = result.boxes.data.cpu().numpy()
+    return DetectionArrays(
+        boxes=data[:, :4],
+        class_ids=data[:, 5].astype(np.int64),
+        confidences=data[:, 4],
+        names=names,
+    )
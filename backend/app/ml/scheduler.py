@@ -0,0 +1,360 @@
+import asyncio
+import functools
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from app.schemas.detection import DetectionBox
+from app.core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+BatchFn = Callable[[List[Any]], List[tuple[List[DetectionBox], float]]]
+
+
+class InferenceQueueFullError(Exception):
+    """推論キューが満杯で新しい画像を受け付けられない"""
+
+
+class InferenceSchedulerStoppedError(Exception):
+    """推論が始まる前にスケジューラが停止した"""
+
+
+class InferenceScheduler:
+    """
+    同時リクエストの画像をまとめてバッチ推論するスケジューラ（マイクロバッチング）
+
+    最初の画像が届いてから最大 max_wait_ms 待つか、max_batch_size 件たまった時点で
+    1回のモデル呼び出しにまとめ、各呼び出し元に自分の結果だけを返す。
+    バッチ推論が失敗した場合は1枚ずつ推論し直し、失敗した画像の呼び出し元にだけ例外を返す。
+    推論はイベントループ外の専用ワーカープール（スレッドまたはプロセス）で実行し、
+    待ち行列（ワーカーの空きを待つタイル推論を含む）が max_queue_size を超えた場合は
+    InferenceQueueFullError を送出する。
+    1つのスケジューラは1つのモデルだけを担当する（モデルごとに get_scheduler で取得）。
+    ワーカープールもスケジューラごとに作るため、プロセス全体の推論ワーカー数は
+    「使われたモデルの数 × workers」になる。
+    """
+
+    def __init__(
+        self,
+        batch_fn: Optional[BatchFn] = None,
+        model: Optional[str] = None,
+        max_batch_size: Optional[int] = None,
+        max_wait_ms: Optional[float] = None,
+        workers: Optional[int] = None,
+        max_queue_size: Optional[int] = None,
+        executor_type: Optional[str] = None,
+    ):
+        # 既定の推論関数の場合、プロセスプールの各ワーカーで最初のタスクより前にモデルをロードする
+        self._preload_model = batch_fn is None and model is not None
+        if batch_fn is None:
+            from app.ml.detector import detect_objects_batch
+            batch_fn = functools.partial(detect_objects_batch, model=model)
+        self.model = model
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size or settings.INFERENCE_MAX_BATCH_SIZE)
+        self.max_wait = (
+            max_wait_ms if max_wait_ms is not None else settings.INFERENCE_MAX_WAIT_MS
+        ) / 1000
+        self.workers = max(1, workers or settings.INFERENCE_WORKERS)
+        self.max_queue_size = max_queue_size or settings.INFERENCE_QUEUE_SIZE
+        self.executor_type = executor_type or settings.INFERENCE_EXECUTOR
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._executor: Optional[Executor] = None
+        self._worker_slots: Optional[asyncio.Semaphore] = None
+        self._in_flight: set = set()
+        self._collecting: list = []
+        self._exclusive_waiting = 0  # ワーカーの空きを待っている run_exclusive の件数
+        self._workers_ready = self.executor_type != "process"
+
+        # 統計情報
+        self._submitted = 0
+        self._rejected = 0
+        self._batches = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._started_images = 0
+
+    def _create_executor(self) -> Executor:
+        if self.executor_type == "process":
+            if not self._preload_model:
+                return ProcessPoolExecutor(max_workers=self.workers)
+            return ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_load_worker_model,
+                initargs=(self.model, settings.MODEL_WARMUP),
+            )
+        if self.executor_type == "thread":
+            return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+        raise ValueError(f"未対応の INFERENCE_EXECUTOR です: {self.executor_type}")
+
+    async def start(self):
+        """バッチ収集タスクを現在のイベントループで開始"""
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done() and self._loop is loop:
+            return
+        if self._executor is None:
+            self._executor = self._create_executor()
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._worker_slots = asyncio.Semaphore(self.workers)
+        self._task = loop.create_task(self._run())
+
+    @property
+    def workers_ready(self) -> bool:
+        """推論ワーカーがモデルをロード済みか（スレッドの場合は常に True）"""
+        return self._workers_ready
+
+    async def preload(self):
+        """
+        ワーカープロセスを起動し、最初のリクエストより前にモデルをロードさせる
+
+        プロセスプールの各ワーカーは initializer でモデルをロードするため、
+        workers 件のタスクが完了した時点で全ワーカーの準備ができている。
+        """
+        await self.start()
+        if self.executor_type == "process":
+            await asyncio.gather(*(
+                self._loop.run_in_executor(self._executor, _worker_ready) for _ in range(self.workers)
+            ))
+        self._workers_ready = True
+
+    async def stop(self):
+        """
+        バッチ収集タスクを停止し、ワーカープールを終了
+
+        実行中のバッチは完了を待ち、まだ推論が始まっていない画像の呼び出し元には
+        InferenceSchedulerStoppedError を返す。
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # 集めている途中の画像とキューに残った画像
+        pending, self._collecting = self._collecting, []
+        while self._queue is not None and not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for _, future, _ in pending:
+            self._set_exception(future, InferenceSchedulerStoppedError("推論スケジューラが停止しました"))
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._workers_ready = self.executor_type != "process"
+
+    async def submit(self, image: Any) -> tuple[List[DetectionBox], float]:
+        """
+        画像を推論キューに投入し、その画像の検出結果を待つ
+
+        Args:
+            image: 画像（detect_objects_batch が受け付ける形式）
+
+        Returns:
+            (検出結果のリスト, 処理時間)
+
+        Raises:
+            InferenceQueueFullError: 待ち行列が満杯の場合
+        """
+        await self.start()
+        self._check_capacity()
+        future = self._loop.create_future()
+        self._queue.put_nowait((image, future, time.monotonic()))
+        self._submitted += 1
+        return await future
+
+    async def run_exclusive(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        バッチにまとめずにワーカープールで直接実行する（タイル推論など、それ自体がバッチになる処理）
+        
+        バッチ推論と同じワーカー枠を使うため、同時に実行されるモデル呼び出しは workers 件までに保たれる。
+        ワーカーの空きを待つ間は待ち行列の1件として数え、満杯の場合は submit と同様に拒否する。
+
+        Raises:
+            InferenceQueueFullError: 待ち行列が満杯の場合
+        """
+        await self.start()
+        self._check_capacity()
+        self._exclusive_waiting += 1
+        self._submitted += 1
+        try:
+            await self._worker_slots.acquire()
+        finally:
+            self._exclusive_waiting -= 1
+        try:
+            if self._executor is None:
+                raise InferenceSchedulerStoppedError("推論スケジューラが停止しました")
+            return await self._loop.run_in_executor(
+                self._executor, functools.partial(fn, *args, **kwargs)
+            )
+        finally:
+            self._worker_slots.release()
+
+    def stats(self) -> dict:
+        """キューの深さと待ち時間などの統計情報を取得"""
+        return {
+            "model": self.model,
+            "executor": self.executor_type,
+            "workers": self.workers,
+            "max_batch_size": self.max_batch_size,
+            "queue_depth": self._queue_depth(),
+            "max_queue_size": self.max_queue_size,
+            "batches_in_flight": len(self._in_flight),
+            "submitted": self._submitted,
+            "rejected": self._rejected,
+            "batches": self._batches,
+            "avg_batch_size": round(self._started_images / self._batches, 2) if self._batches else 0.0,
+            "avg_wait_ms": round(self._wait_total / self._started_images * 1000, 2) if self._started_images else 0.0,
+            "max_wait_ms": round(self._wait_max * 1000, 2),
+        }
+
+    def _queue_depth(self) -> int:
+        queued = self._queue.qsize() if self._queue is not None else 0
+        return queued + len(self._collecting) + self._exclusive_waiting
+
+    def _check_capacity(self):
+        """待ち行列が満杯であれば InferenceQueueFullError を送出"""
+        if self._queue_depth() >= self.max_queue_size:
+            self._rejected += 1
+            raise InferenceQueueFullError("推論キューが満杯です")
+
+    async def _collect(self) -> list:
+        """最初の画像（_collecting）に、最大待ち時間内に届いた画像を最大バッチサイズまで加える"""
+        batch = self._collecting
+        deadline = self._loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        self._collecting = []
+        return batch
+
+    async def _run(self):
+        while True:
+            # 画像が届くまではワーカー枠を取らない（待機中に run_exclusive の枠をふさがない）
+            self._collecting = [await self._queue.get()]
+            # 空いているワーカーがあるときだけバッチを組む（それまでは届いた画像をキューで待たせる）
+            await self._worker_slots.acquire()
+            try:
+                batch = await self._collect()
+            except BaseException:
+                self._worker_slots.release()
+                raise
+            task = self._loop.create_task(self._run_batch(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _run_batch(self, batch: list):
+        try:
+            now = time.monotonic()
+            for _, _, enqueued_at in batch:
+                wait = now - enqueued_at
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+            self._batches += 1
+            self._started_images += len(batch)
+
+            images = [image for image, _, _ in batch]
+            try:
+                results = await self._loop.run_in_executor(self._executor, self.batch_fn, images)
+            except Exception as e:
+                logger.error(f"バッチ推論中にエラーが発生しました: バッチサイズ={len(batch)}: {e}")
+                if len(batch) == 1:
+                    self._set_exception(batch[0][1], e)
+                else:
+                    # 1枚の不正な画像で同じバッチの全員が失敗しないよう、1枚ずつ推論し直す
+                    await self._run_individually(batch)
+                return
+
+            logger.info(f"バッチ推論完了: バッチサイズ={len(batch)}")
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._worker_slots.release()
+
+    async def _run_individually(self, batch: list):
+        """バッチの画像を1枚ずつ推論し、失敗した画像の呼び出し元にだけ例外を返す"""
+        for image, future, _ in batch:
+            if future.done():
+                continue
+            try:
+                results = await self._loop.run_in_executor(self._executor, self.batch_fn, [image])
+            except Exception as e:
+                logger.error(f"推論中にエラーが発生しました: {e}")
+                self._set_exception(future, e)
+                continue
+            if not future.done():
+                future.set_result(results[0])
+
+    @staticmethod
+    def _set_exception(future: asyncio.Future, e: Exception):
+        if not future.done():
+            future.set_exception(e)
+
+
+def _load_worker_model(model: str, warmup: bool):
+    """プロセスプールの各ワーカーで最初のタスクより前にモデルをロード（initializer）"""
+    from app.ml.registry import get_registry
+
+    registry = get_registry()
+    if warmup:
+        registry.warmup(model)
+    else:
+        registry.get(model)
+
+
+def _worker_ready() -> bool:
+    return True
+
+
+_schedulers: Dict[str, InferenceScheduler] = {}
+
+
+def get_scheduler(model: Optional[str] = None) -> InferenceScheduler:
+    """
+    モデルごとの推論スケジューラを取得（シングルトン）
+    
+    Raises:
+        UnknownModelError: 設定されていないモデル名の場合
+    """
+    from app.ml.registry import get_registry
+
+    name = get_registry().resolve(model)
+    if name not in _schedulers:
+        _schedulers[name] = InferenceScheduler(model=name)
+    return _schedulers[name]
+
+
+def scheduler_stats() -> List[dict]:
+    """全スケジューラの統計情報を取得"""
+    return [scheduler.stats() for scheduler in _schedulers.values()]
+
+
+async def stop_schedulers():
+    """全スケジューラを停止"""
+    for scheduler in _schedulers.values():
+        await scheduler.stop()
+
+
+async def preload_workers(names: List[str]):
+    """各モデルの推論ワーカーを起動してモデルをロード（プロセスプールの場合）"""
+    for name in names:
+        try:
+            await get_scheduler(name).preload()
+        except Exception as e:
+            logger.error(f"推論ワーカーの準備に失敗しました: {name}: {e}", exc_info=True)
+
+
+def workers_ready(names: List[str]) -> bool:
+    """全モデルの推論ワーカーがモデルをロード済みか"""
+    return all(get_scheduler(name).workers_ready for name in names)
@@ -1,16 +1,64 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
+from collections import Counter
+from datetime import datetime, timezone
+from typing import List
+from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, Index, Text
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.db.database import Base
 
+TOP_LABELS_LIMIT = 3  # 一覧に表示する主なラベルの数
+
+
+def top_labels(labels: List[str], limit: int = TOP_LABELS_LIMIT) -> List[str]:
+    """検出数の多い順（同数の場合は先に検出された順）にラベルを返す"""
+    return [label for label, _ in Counter(labels).most_common(limit)]
+
 
 class DetectionHistory(Base):
     __tablename__ = "detection_history"
+    __table_args__ = (
+        # ユーザーごとの履歴を新しい順にキーセットでページングするため
+        Index("ix_detection_history_user_created", "user_id", "created_at", "id"),
+    )
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    image_path = Column(String(500), nullable=False)
-    detection_results = Column(Text, nullable=False)  # JSON形式で保存
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    image_path = Column(String(500), nullable=False, index=True)  # 同じ画像を参照する履歴の数え上げに使用
+    image_hash = Column(String(64), nullable=True, index=True)  # 画像内容の SHA-256（同じ画像を参照する履歴の数え上げに使用）
+    processing_time = Column(Float, nullable=True)
+    # 一覧表示用の要約（保存時に計算し、一覧では検出結果を読み込まない）
+    detection_count = Column(Integer, nullable=True)
+    top_labels = Column(String(255), nullable=True)  # カンマ区切り
+    detection_results = Column(Text, nullable=True)  # 旧形式（JSON）。起動時に detections テーブルへ移行
+    # SQLite では文字列として比較するため、常にアプリ側で同じ形式の値を入れる（server_default は旧データとの互換用）
+    created_at = Column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), server_default=func.now()
+    )
 
     user = relationship("User", backref="detections")
+    detections = relationship(
+        "Detection", back_populates="history", cascade="all, delete-orphan", order_by="Detection.id"
+    )
+
+
+class Detection(Base):
+    """検出結果（1ボックス1行）"""
+    __tablename__ = "detections"
+    __table_args__ = (
+        Index("ix_detections_user_created", "user_id", "created_at"),
+        Index("ix_detections_label_confidence", "label", "confidence"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    history_id = Column(Integer, ForeignKey("detection_history.id", ondelete="CASCADE"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)  # 履歴と結合せずにユーザーで絞り込むため
+    label = Column(String(100), nullable=False)
+    confidence = Column(Float, nullable=False)  # パーセンテージ
+    x1 = Column(Float, nullable=False)
+    y1 = Column(Float, nullable=False)
+    x2 = Column(Float, nullable=False)
+    y2 = Column(Float, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False)  # 履歴の作成日時
+
+    history = relationship("DetectionHistory", back_populates="detections")
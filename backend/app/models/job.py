@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
+from sqlalchemy.sql import func
+from app.db.database import Base
+
+
+class DetectionJob(Base):
+    __tablename__ = "detection_jobs"
+    __mapper_args__ = {"eager_defaults": True}
+
+    id = Column(String(36), primary_key=True)  # UUID
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    status = Column(String(20), nullable=False, default="pending", index=True)  # pending / running / completed / failed
+    image_path = Column(String(500), nullable=False)
+    filename = Column(String(255), nullable=False)
+    model = Column(String(100), nullable=True)
+    history_id = Column(Integer, ForeignKey("detection_history.id", ondelete="SET NULL"), nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
@@ -5,6 +5,9 @@ from app.db.database import Base
 
 class User(Base):
     __tablename__ = "users"
+    # ID や作成日時などサーバー側で生成する値は INSERT ... RETURNING で同時に取得する（コミット後に読み直さない）
+    # （eager_defaults は他のモデルでも同じ理由で指定している）
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String(50), unique=True, index=True, nullable=False)
@@ -11,6 +11,9 @@ class DetectionBox(BaseModel):
     label: str
     confidence: float
 
+    class Config:
+        from_attributes = True
+
 
 class DetectionRequest(BaseModel):
     pass  # 画像はファイルアップロードで送信
@@ -23,11 +26,53 @@ class DetectionResponse(BaseModel):
     processing_time: float
 
 
+class BatchDetectionItem(BaseModel):
+    filename: str
+    success: bool
+    result: Optional[DetectionResponse] = None
+    error: Optional[str] = None
+
+
+class BatchDetectionResponse(BaseModel):
+    total: int
+    succeeded: int
+    failed: int
+    results: List[BatchDetectionItem]
+
+
+class DetectionHistorySummary(BaseModel):
+    """履歴一覧用の要約（検出結果の詳細は含まない）"""
+    id: int
+    image_url: str
+    thumbnail_url: str
+    detection_count: int
+    top_labels: List[str]
+    created_at: datetime
+
+
 class DetectionHistoryResponse(BaseModel):
     id: int
     image_path: str
-    detection_results: str
+    image_url: Optional[str] = None
+    preview_url: Optional[str] = None
+    detections: List[DetectionBox]
+    processing_time: Optional[float] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class DetectionJobResponse(BaseModel):
+    id: str
+    status: str
+    model: Optional[str] = None
+    history_id: Optional[int] = None
+    error: Optional[str] = None
     created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    result: Optional[DetectionResponse] = None
 
     class Config:
         from_attributes = True
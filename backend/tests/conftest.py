@@ -0,0 +1,6 @@
+import os
+
+# テストではモデルを起動時にロードしない
+os.environ.setdefault("MODEL_PRELOAD", "false")
+# 同じクライアントから何度もログインするため、試行回数の制限は個別のテストで有効にする
+os.environ.setdefault("LOGIN_RATE_LIMIT_ENABLED", "false")
@@ -1,7 +1,15 @@
+import time
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
-from app.db.database import get_db, Base, engine
+from app.db.database import Base, async_engine, engine
+from app.models.user import User
+from app.core.auth_cache import get_user_cache
+from app.core.config import settings
+from app.core.rate_limit import RateLimiter, get_login_rate_limiter
+from app.core import security
+from app.core.security import create_access_token, decode_access_token
+from sqlalchemy import event
 from sqlalchemy.orm import sessionmaker
 
 # テスト用データベース
@@ -23,16 +31,10 @@ def db_session():
 @pytest.fixture(scope="function")
 def client(db_session):
     """テストクライアント"""
-    def override_get_db():
-        try:
-            yield db_session
-        finally:
-            pass
-    
-    app.dependency_overrides[get_db] = override_get_db
+    # テストごとにDBを作り直すため、前のテストのユーザーを残さない
+    get_user_cache().clear()
     with TestClient(app) as test_client:
         yield test_client
-    app.dependency_overrides.clear()
 
 
 def test_register_user(client):
@@ -125,3 +127,126 @@ def test_login_failure(client):
         }
     )
     assert response.status_code == 401
+
+
+def login(client) -> str:
+    """ユーザーを登録してログインし、トークンを返す"""
+    client.post(
+        "/api/auth/register",
+        json={
+            "username": "testuser",
+            "email": "test@example.com",
+            "password": "testpass123"
+        }
+    )
+    response = client.post(
+        "/api/auth/login",
+        data={
+            "username": "testuser",
+            "password": "testpass123"
+        }
+    )
+    return response.json()["access_token"]
+
+
+def test_current_user_is_cached(client):
+    """ユーザーIDを含むトークンではDBに問い合わせずにユーザーを取得するテスト"""
+    token = login(client)
+    payload = decode_access_token(token)
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/api/auth/me", headers=headers).json()["id"] == payload["uid"]
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    # ルートは非同期エンジンでDBに接続する
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count)
+    try:
+        response = client.get("/api/auth/me", headers=headers)
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", count)
+    assert response.status_code == 200
+    assert response.json()["username"] == "testuser"
+    assert statements == []
+
+
+def test_current_user_cache_invalidation(client, db_session):
+    """ユーザーの更新・削除がキャッシュに反映されるテスト"""
+    token = login(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    client.get("/api/auth/me", headers=headers)
+
+    user = db_session.query(User).filter(User.username == "testuser").first()
+    user.email = "changed@example.com"
+    db_session.commit()
+    assert client.get("/api/auth/me", headers=headers).json()["email"] == "changed@example.com"
+
+    db_session.delete(user)
+    db_session.commit()
+    assert client.get("/api/auth/me", headers=headers).status_code == 401
+
+
+def test_legacy_token_without_uid(client):
+    """ユーザーIDを含まない古いトークンも使えるテスト"""
+    login(client)
+    token = create_access_token(data={"sub": "testuser"})
+    response = client.get("/api/auth/me", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert response.json()["username"] == "testuser"
+
+
+def test_rate_limiter_window():
+    """ウィンドウ内の試行回数が上限に達すると拒否し、期間が過ぎると許可するテスト"""
+    limiter = RateLimiter(window_seconds=0.2)
+    assert limiter.hit({"a": 2}) is None
+    assert limiter.hit({"a": 2, "b": 5}) is None
+    retry_after = limiter.hit({"a": 2, "b": 5})
+    assert retry_after is not None and 0 < retry_after <= 0.2
+    # 拒否された試行は記録しない
+    assert limiter.hit({"b": 2}) is None
+    time.sleep(0.25)
+    assert limiter.hit({"a": 2}) is None
+
+
+def test_login_rate_limit(client, monkeypatch):
+    """同じユーザー名で試行回数の上限を超えると429を返すテスト"""
+    monkeypatch.setattr(settings, "LOGIN_RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(settings, "LOGIN_RATE_LIMIT_PER_USERNAME", 3)
+    get_login_rate_limiter().clear()
+
+    for _ in range(3):
+        response = client.post("/api/auth/login", data={"username": "victim", "password": "wrongpass"})
+        assert response.status_code == 401
+    response = client.post("/api/auth/login", data={"username": "Victim", "password": "wrongpass"})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+    # 他のユーザー名は制限されない
+    token = login(client)
+    assert token
+    get_login_rate_limiter().clear()
+
+
+def test_password_hash_busy(client, monkeypatch):
+    """パスワード処理の待ちが上限に達している場合は503を返すテスト"""
+    login(client)
+    monkeypatch.setattr(settings, "PASSWORD_HASH_MAX_PENDING", 2)
+    monkeypatch.setattr(security, "_password_pending", 2)
+
+    response = client.post("/api/auth/login", data={"username": "testuser", "password": "testpass123"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(settings.PASSWORD_HASH_RETRY_AFTER_SECONDS)
+
+    response = client.post(
+        "/api/auth/register",
+        json={"username": "another", "email": "another@example.com", "password": "testpass123"}
+    )
+    assert response.status_code == 503
+
+    # 空きができれば受け付ける
+    monkeypatch.setattr(security, "_password_pending", 1)
+    response = client.post("/api/auth/login", data={"username": "testuser", "password": "testpass123"})
+    assert response.status_code == 200
+    assert security._password_pending == 1
@@ -0,0 +1,164 @@
+import io
+import threading
+import zipfile
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+from app.main import app
+from app.api import detection
+from app.db.database import Base, engine
+from app.models.detection import DetectionHistory
+from app.models.user import User
+from app.core.security import get_password_hash
+from app.schemas.detection import DetectionBox
+from sqlalchemy.orm import sessionmaker
+
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture(scope="function")
+def db_session():
+    """テスト用データベースセッション"""
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture(scope="function")
+def client(db_session):
+    """テストクライアント"""
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def auth_token(client, db_session):
+    """テスト用ユーザーを作成して認証トークンを取得"""
+    user = User(
+        username="testuser",
+        email="test@example.com",
+        password_hash=get_password_hash("testpass123")
+    )
+    db_session.add(user)
+    db_session.commit()
+    response = client.post(
+        "/api/auth/login",
+        data={"username": "testuser", "password": "testpass123"}
+    )
+    return response.json()["access_token"]
+
+
+@pytest.fixture
+def fake_detection(monkeypatch, tmp_path):
+    """推論の代わりに固定の検出結果を返す（画像は一時フォルダに保存）"""
+    async def run_detection(file_content, image, model=None):
+        box = DetectionBox(x1=1, y1=2, x2=3, y2=4, label="person", confidence=88.0)
+        return [box], 0.12, None
+
+    monkeypatch.setattr(detection, "run_detection_when_available", run_detection)
+    monkeypatch.setattr(detection.settings, "LOCAL_STORAGE_PATH", str(tmp_path))
+
+
+def make_png(color: str = "red") -> bytes:
+    """テスト用のPNG画像を作成"""
+    image_data = io.BytesIO()
+    Image.new("RGB", (64, 64), color=color).save(image_data, format="PNG")
+    return image_data.getvalue()
+
+
+def test_batch_images_and_archive(client, auth_token, fake_detection, db_session):
+    """複数画像とzipアーカイブをまとめて解析し、ファイルごとの結果を返すテスト"""
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("a.png", make_png("blue"))
+        zf.writestr("notes.txt", b"not an image")
+    
+    response = client.post(
+        "/api/detect/batch",
+        files=[
+            ("files", ("one.png", make_png(), "image/png")),
+            ("files", ("bad.png", b"broken", "image/png")),
+            ("files", ("images.zip", archive.getvalue(), "application/zip")),
+        ],
+        headers={"Authorization": f"Bearer {auth_token}"}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total"] == 4
+    assert data["succeeded"] == 2
+    assert data["failed"] == 2
+    
+    results = {item["filename"]: item for item in data["results"]}
+    assert results["one.png"]["success"]
+    assert results["images.zip/a.png"]["result"]["detections"][0]["label"] == "person"
+    assert not results["bad.png"]["success"]
+    assert not results["images.zip/notes.txt"]["success"]
+    assert db_session.query(DetectionHistory).count() == 2
+
+
+def test_batch_image_limit(client, auth_token, fake_detection, monkeypatch):
+    """上限を超えた画像は処理せずにエラーを返すテスト"""
+    monkeypatch.setattr(detection.settings, "BATCH_MAX_IMAGES", 2)
+    response = client.post(
+        "/api/detect/batch",
+        files=[("files", (f"{i}.png", make_png(), "image/png")) for i in range(3)],
+        headers={"Authorization": f"Bearer {auth_token}"}
+    )
+    data = response.json()
+    assert data["succeeded"] == 2
+    assert data["failed"] == 1
+
+
+def test_batch_results_keep_upload_order(client, auth_token, fake_detection):
+    """ファイルごとのエラーを含めて、結果がアップロード順に並ぶテスト"""
+    response = client.post(
+        "/api/detect/batch",
+        files=[
+            ("files", ("one.png", make_png(), "image/png")),
+            ("files", ("bad.txt", b"not an image", "text/plain")),
+            ("files", ("two.png", make_png("blue"), "image/png")),
+            ("files", ("broken.png", b"broken", "image/png")),
+        ],
+        headers={"Authorization": f"Bearer {auth_token}"}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert [item["filename"] for item in data["results"]] == ["one.png", "bad.txt", "two.png", "broken.png"]
+    assert [item["success"] for item in data["results"]] == [True, False, True, False]
+
+
+def test_batch_archive_read_off_event_loop(client, auth_token, fake_detection, monkeypatch):
+    """アーカイブの展開はイベントループ外のスレッドで行われるテスト"""
+    monkeypatch.setattr(detection.settings, "BATCH_CHUNK_SIZE", 1)
+    read_threads, loop_threads = set(), set()
+    iter_batch_images = detection.iter_batch_images
+    run_detection = detection.run_detection_when_available
+
+    def recording_iter(files):
+        for item in iter_batch_images(files):
+            read_threads.add(threading.get_ident())
+            yield item
+
+    async def recording_run(file_content, image, model=None):
+        loop_threads.add(threading.get_ident())
+        return await run_detection(file_content, image, model)
+
+    monkeypatch.setattr(detection, "iter_batch_images", recording_iter)
+    monkeypatch.setattr(detection, "run_detection_when_available", recording_run)
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        for i in range(3):
+            zf.writestr(f"{i}.png", make_png())
+    response = client.post(
+        "/api/detect/batch",
+        files=[("files", ("images.zip", archive.getvalue(), "application/zip"))],
+        headers={"Authorization": f"Bearer {auth_token}"}
+    )
+    assert response.json()["succeeded"] == 3
+    assert read_threads and loop_threads
+    assert not read_threads & loop_threads
@@ -0,0 +1,106 @@
+import asyncio
+import time
+from app.core.cache import DetectionCache, content_hash
+from app.schemas.detection import DetectionBox
+
+BOX = DetectionBox(x1=1, y1=2, x2=3, y2=4, label="person", confidence=90.5)
+
+
+def test_cache_hit_and_miss():
+    """同じ画像・同じパラメータでヒットし、パラメータが違えばミスするテスト"""
+    cache = DetectionCache(max_entries=10, ttl_seconds=60, backend="memory")
+    image_hash = content_hash(b"image-bytes")
+    key = DetectionCache.make_key(image_hash, {"model": "yolov8n.pt"})
+
+    assert cache.get(key) is None
+    cache.set(key, [BOX], 0.5)
+    detections, processing_time = cache.get(key)
+    assert detections == [BOX]
+    assert processing_time == 0.5
+    assert cache.get(DetectionCache.make_key(image_hash, {"model": "yolov8s.pt"})) is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+
+
+def test_cache_lru_eviction():
+    """上限を超えると最も古く使われたエントリが削除されるテスト"""
+    cache = DetectionCache(max_entries=2, ttl_seconds=60, backend="memory")
+    cache.set("a", [BOX], 0.1)
+    cache.set("b", [BOX], 0.1)
+    cache.get("a")
+    cache.set("c", [BOX], 0.1)
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+
+
+def test_cache_ttl_expiry():
+    """有効期限切れのエントリはミスになるテスト"""
+    cache = DetectionCache(max_entries=10, ttl_seconds=0.05, backend="memory")
+    cache.set("a", [BOX], 0.1)
+    time.sleep(0.1)
+    assert cache.get("a") is None
+
+
+def test_sqlite_backend_persists(tmp_path):
+    """SQLiteバックエンドはインスタンスをまたいでキャッシュを保持するテスト"""
+    path = str(tmp_path / "cache.db")
+    image_file = tmp_path / "image.jpg"
+    image_file.write_bytes(b"data")
+
+    cache = DetectionCache(max_entries=10, ttl_seconds=60, backend="sqlite", path=path)
+    cache.set("a", [BOX], 0.1)
+    cache.set_image_path("hash", str(image_file))
+
+    reopened = DetectionCache(max_entries=10, ttl_seconds=60, backend="sqlite", path=path)
+    assert reopened.get("a")[0] == [BOX]
+    assert reopened.get_image_path("hash") == str(image_file)
+
+    # 削除済みのファイルは再利用しない
+    image_file.unlink()
+    assert reopened.get_image_path("hash") is None
+
+
+def test_sqlite_backend_evicts_over_capacity(tmp_path):
+    """SQLiteの行数は上限を1割超えた時点でまとめて上限まで削除されるテスト"""
+    path = str(tmp_path / "cache.db")
+    cache = DetectionCache(max_entries=10, ttl_seconds=60, backend="sqlite", path=path)
+    for i in range(11):
+        cache.set(f"k{i}", [BOX], 0.1)
+    count = lambda: cache._conn.execute("SELECT COUNT(*) FROM detection_cache").fetchone()[0]
+    assert count() == 11
+
+    cache.set("k11", [BOX], 0.1)
+    assert count() == 10
+    # 有効期限の古いものから削除される
+    assert cache._conn.execute("SELECT 1 FROM detection_cache WHERE key = 'k0'").fetchone() is None
+    assert cache.get("k11") is not None
+
+
+def test_forget_image_path(tmp_path):
+    """削除した画像パスに対応する全てのハッシュが破棄されるテスト"""
+    image_file = tmp_path / "image.jpg"
+    image_file.write_bytes(b"data")
+    cache = DetectionCache(max_entries=10, ttl_seconds=60, backend="sqlite", path=str(tmp_path / "cache.db"))
+    cache.set_image_path("hash1", str(image_file))
+    cache.set_image_path("hash2", str(image_file))
+    cache.set_image_path("hash3", str(tmp_path / "other.jpg"))
+
+    cache.forget_image_path(str(image_file))
+    assert cache.get_image_path("hash1") is None
+    assert cache.get_image_path("hash2") is None
+    assert "hash3" in cache._images
+    assert str(image_file) not in cache._image_hashes
+
+
+def test_async_access(tmp_path):
+    """get_async / set_async はSQLiteバックエンドでも同じ結果を返すテスト"""
+    cache = DetectionCache(max_entries=10, ttl_seconds=60, backend="sqlite", path=str(tmp_path / "cache.db"))
+
+    async def scenario():
+        await cache.set_async("a", [BOX], 0.1)
+        return await cache.get_async("a")
+
+    assert asyncio.run(scenario()) == ([BOX], 0.1)
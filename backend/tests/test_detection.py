@@ -2,7 +2,7 @@ import pytest
 import io
 from fastapi.testclient import TestClient
 from app.main import app
-from app.db.database import get_db, Base, engine
+from app.db.database import Base, engine
 from app.models.user import User
 from app.core.security import get_password_hash
 from sqlalchemy.orm import sessionmaker
@@ -25,16 +25,8 @@ def db_session():
 @pytest.fixture(scope="function")
 def client(db_session):
     """テストクライアント"""
-    def override_get_db():
-        try:
-            yield db_session
-        finally:
-            pass
-    
-    app.dependency_overrides[get_db] = override_get_db
     with TestClient(app) as test_client:
         yield test_client
-    app.dependency_overrides.clear()
 
 
 @pytest.fixture
@@ -0,0 +1,181 @@
+import io
+import sys
+import threading
+import time
+from pathlib import Path
+import numpy as np
+import pytest
+from PIL import Image
+from types import SimpleNamespace
+from pydantic import ValidationError
+import torch
+from app.ml import detector
+from app.ml.backends import TorchBackend
+from app.ml.detector import detect_objects_tiled, load_image, tile_grid
+from app.core.config import Settings
+from app.ml.results import DetectionArrays, result_to_arrays
+from app.schemas.detection import DetectionBox
+
+
+def encode_image(image: Image.Image, format: str = "PNG") -> bytes:
+    """画像をエンコードしてバイト列を返す"""
+    buffer = io.BytesIO()
+    image.save(buffer, format=format)
+    return buffer.getvalue()
+
+
+def test_load_image_from_bytes():
+    """バイト列からメモリ上でデコードできるテスト"""
+    data = encode_image(Image.new("RGBA", (40, 30), color=(255, 0, 0, 128)))
+    image = load_image(data)
+    assert isinstance(image, Image.Image)
+    assert image.mode == "RGB"
+    assert image.size == (40, 30)
+
+
+def test_load_image_passthrough():
+    """パス・NumPy配列はそのままモデルに渡されるテスト"""
+    array = np.zeros((10, 10, 3), dtype=np.uint8)
+    assert load_image(array) is array
+    assert load_image(Path("a.jpg")) == "a.jpg"
+
+
+def test_result_to_arrays_and_boxes():
+    """推論結果テンソルを配列・DetectionBox に変換するテスト"""
+    data = torch.tensor([
+        [10.0, 20.0, 30.0, 40.0, 0.91234, 0.0],
+        [5.5, 6.5, 7.5, 8.5, 0.5, 2.0],
+    ])
+    result = SimpleNamespace(boxes=SimpleNamespace(data=data))
+    arrays = result_to_arrays(result, {0: "person", 2: "car"})
+
+    assert isinstance(arrays, DetectionArrays)
+    assert len(arrays) == 2
+    assert arrays.labels == ["person", "car"]
+    assert arrays.to_boxes() == [
+        DetectionBox(x1=10, y1=20, x2=30, y2=40, label="person", confidence=91.23),
+        DetectionBox(x1=5.5, y1=6.5, x2=7.5, y2=8.5, label="car", confidence=50.0),
+    ]
+
+
+def test_empty_result():
+    """検出なしの場合に空の結果になるテスト"""
+    result = SimpleNamespace(boxes=SimpleNamespace(data=torch.zeros((0, 6))))
+    arrays = result_to_arrays(result, {0: "person"})
+    assert len(arrays) == 0
+    assert arrays.to_boxes() == []
+
+
+class TileBackend:
+    """各入力画像の左上に固定サイズのボックスを1つ返すバックエンド"""
+
+    imgsz = 640
+    names = {0: "person"}
+
+    def __init__(self):
+        self.batches = []
+
+    def predict(self, images):
+        self.batches.append([image.size for image in images])
+        return [
+            DetectionArrays(
+                boxes=np.array([[0.0, 0.0, 50.0, 50.0]], dtype=np.float32),
+                class_ids=np.array([0]),
+                confidences=np.array([0.9], dtype=np.float32),
+                names=self.names,
+            )
+            for _ in images
+        ]
+
+
+def test_tile_grid_covers_image_within_max_tiles():
+    """タイルが画像全体を覆い、最大タイル数を超えないテスト"""
+    tiles = tile_grid(2000, 1000, 640, 0.2, 16)
+    assert tiles[0][:2] == (0, 0)
+    assert max(x2 for _, _, x2, _ in tiles) == 2000
+    assert max(y2 for _, _, _, y2 in tiles) == 1000
+    assert len(tiles) <= 16
+    assert len(tile_grid(8000, 8000, 640, 0.2, 16)) <= 16
+    assert tile_grid(500, 400, 640, 0.2, 16) == [(0, 0, 500, 400)]
+
+
+def test_tile_overlap_must_be_below_one():
+    """タイルの重なりが0以上1未満でない場合はエラーになるテスト"""
+    with pytest.raises(ValueError):
+        tile_grid(2000, 1000, 640, 1.0, 16)
+    with pytest.raises(ValidationError):
+        Settings(TILE_OVERLAP=1.0)
+    assert Settings(TILE_OVERLAP=0).TILE_OVERLAP == 0
+
+
+def test_detect_objects_tiled_runs_one_batch(monkeypatch):
+    """全タイルを1回のバッチで推論し、元画像の座標で結果を統合するテスト"""
+    backend = TileBackend()
+    monkeypatch.setattr(detector, "get_model", lambda model=None: backend)
+    monkeypatch.setattr(detector.settings, "TILE_INCLUDE_FULL", False)
+
+    arrays, _ = detect_objects_tiled(Image.new("RGB", (1280, 640)), columnar=True)
+    assert len(backend.batches) == 1
+    tiles = tile_grid(1280, 640, 640, 0.2, 16)
+    assert len(backend.batches[0]) == len(tiles)
+    # 各タイルの左上のボックスがタイルの位置にずらされている
+    assert sorted(arrays.boxes[:, 0].tolist()) == sorted(float(x) for x, _, _, _ in tiles)
+
+
+def test_detect_objects_tiled_full_image_counts_toward_max_tiles(monkeypatch):
+    """画像全体の推論を含めてもバッチが最大タイル数を超えないテスト"""
+    backend = TileBackend()
+    monkeypatch.setattr(detector, "get_model", lambda model=None: backend)
+    monkeypatch.setattr(detector.settings, "TILE_INCLUDE_FULL", True)
+    monkeypatch.setattr(detector.settings, "TILE_MAX_TILES", 16)
+
+    detect_objects_tiled(Image.new("RGB", (8000, 8000)), columnar=True)
+    # タイル15枚分の分割 + 画像全体
+    assert len(backend.batches[0]) == len(tile_grid(8000, 8000, 640, 0.2, 15)) + 1
+    assert len(backend.batches[0]) <= 16
+
+
+def test_detect_objects_tiled_applies_exif_orientation(monkeypatch):
+    """タイル検出でも EXIF の向きを適用した画像で分割するテスト"""
+    backend = TileBackend()
+    monkeypatch.setattr(detector, "get_model", lambda model=None: backend)
+    monkeypatch.setattr(detector.settings, "TILE_INCLUDE_FULL", False)
+
+    image = Image.new("RGB", (1280, 640))
+    exif = image.getexif()
+    exif[0x0112] = 6
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", exif=exif.tobytes())
+
+    arrays, _ = detect_objects_tiled(buffer.getvalue(), columnar=True)
+    tiles = tile_grid(640, 1280, 640, 0.2, 16)
+    assert backend.batches[0] == [(x2 - x1, y2 - y1) for x1, y1, x2, y2 in tiles]
+    assert sorted(arrays.boxes[:, 1].tolist()) == sorted(float(y) for _, y, _, _ in tiles)
+
+
+def test_torch_backend_predicts_one_call_at_a_time(monkeypatch):
+    """ultralytics のモデルは複数のスレッドから同時に呼び出されないテスト"""
+    calls = {"active": 0, "max_active": 0}
+
+    class FakeYOLO:
+        names = {0: "person"}
+
+        def __init__(self, weights):
+            pass
+
+        def __call__(self, images, **kwargs):
+            calls["active"] += 1
+            calls["max_active"] = max(calls["max_active"], calls["active"])
+            time.sleep(0.05)
+            calls["active"] -= 1
+            return []
+
+    # ultralytics 本体は読み込まない（PIL にプラグインを登録するなどの副作用があるため）
+    monkeypatch.setitem(sys.modules, "ultralytics", SimpleNamespace(YOLO=FakeYOLO))
+    backend = TorchBackend(weights="fake.pt", imgsz=640, conf=0.25, iou=0.7, max_det=300)
+    threads = [threading.Thread(target=backend.predict, args=([],)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert calls["max_active"] == 1
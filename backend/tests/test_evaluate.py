@@ -0,0 +1,35 @@
+import numpy as np
+from app.ml.evaluate import match_detections
+from app.ml.results import DetectionArrays
+
+NAMES = {0: "person", 1: "car"}
+
+
+def make_arrays(boxes, class_ids, confidences):
+    """テスト用の検出結果を作成"""
+    return DetectionArrays(
+        boxes=np.array(boxes, dtype=np.float32).reshape(-1, 4),
+        class_ids=np.array(class_ids, dtype=np.int64),
+        confidences=np.array(confidences, dtype=np.float32),
+        names=NAMES,
+    )
+
+
+def test_match_detections_by_iou_and_label():
+    """IoUとラベルが一致する検出だけが対応付けられるテスト"""
+    reference = make_arrays(
+        [[0, 0, 10, 10], [20, 20, 40, 40], [50, 50, 60, 60]], [0, 1, 0], [0.9, 0.8, 0.7]
+    )
+    candidate = make_arrays(
+        [[1, 1, 10, 10], [20, 20, 40, 40], [100, 100, 110, 110]], [0, 0, 0], [0.9, 0.8, 0.7]
+    )
+    # 1件目は一致、2件目はラベル違い、3件目は位置違い
+    assert match_detections(reference, candidate, 0.5) == 1
+
+
+def test_match_detections_one_to_one():
+    """1つの基準ボックスに複数の候補が対応付けられないテスト"""
+    reference = make_arrays([[0, 0, 10, 10]], [0], [0.9])
+    candidate = make_arrays([[0, 0, 10, 10], [0, 0, 10, 11]], [0, 0], [0.8, 0.9])
+    assert match_detections(reference, candidate, 0.5) == 1
+    assert match_detections(reference, make_arrays([], [], []), 0.5) == 0
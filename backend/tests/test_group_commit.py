@@ -0,0 +1,59 @@
+import asyncio
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from app.db.database import Base, create_async_db_engine, create_db_engine
+from app.db.group_commit import GroupCommitter
+from app.models.detection import DetectionHistory
+from app.models.user import User  # noqa: F401  外部キーの参照先
+from app.api.detection import create_history
+from app.schemas.detection import DetectionBox
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    """一時ファイルのSQLiteに接続する非同期セッション"""
+    url = f"sqlite:///{tmp_path / 'group_commit.db'}"
+    sync_engine = create_db_engine(url)
+    Base.metadata.create_all(bind=sync_engine)
+    sync_engine.dispose()
+    async_engine = create_async_db_engine(url)
+    yield async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    asyncio.run(async_engine.dispose())
+
+
+def make_history(i: int) -> DetectionHistory:
+    detections = [DetectionBox(label="person", confidence=90.0, x1=0, y1=0, x2=10, y2=10)]
+    return create_history(1, f"/tmp/{i}.png", detections, 0.1)
+
+
+def test_group_commit_batches_concurrent_records(session_factory):
+    """同時に追加したレコードが1回のコミットで保存され、IDが返るテスト"""
+    committer = GroupCommitter(session_factory=session_factory, window_ms=50, max_batch=64)
+
+    async def run():
+        histories = await asyncio.gather(*[committer.add(make_history(i)) for i in range(10)])
+        await committer.stop()
+        return histories
+
+    histories = asyncio.run(run())
+    assert len({history.id for history in histories}) == 10
+    assert all(history.id is not None for history in histories)
+    stats = committer.stats()
+    assert stats["commits"] == 1
+    assert stats["records"] == 10
+
+
+def test_group_commit_failure_is_reported_to_all(session_factory):
+    """コミットに失敗した場合は同じトランザクションの全員に例外を返すテスト"""
+    committer = GroupCommitter(session_factory=session_factory, window_ms=50, max_batch=64)
+    broken = make_history(0)
+    broken.image_path = None  # NOT NULL 違反
+
+    async def run():
+        results = await asyncio.gather(committer.add(broken), committer.add(make_history(1)), return_exceptions=True)
+        await committer.stop()
+        return results
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, Exception) for result in results)
+    assert committer.stats()["failed"] == 2
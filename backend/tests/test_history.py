@@ -0,0 +1,193 @@
+import io
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+from app.main import app
+from app.api.detection import as_utc, create_history
+from app.core import storage
+from app.core.cache import content_hash
+from app.db.database import Base, engine
+from app.models.user import User
+from app.core.security import get_password_hash
+from app.schemas.detection import DetectionBox
+from app.db.migrations import run_migrations
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture(scope="function")
+def db_session():
+    """テスト用データベースセッション"""
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture(scope="function")
+def client(db_session):
+    """テストクライアント"""
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def auth_headers(client, db_session):
+    """テスト用ユーザーを作成して認証ヘッダーを取得"""
+    user = User(
+        username="testuser",
+        email="test@example.com",
+        password_hash=get_password_hash("testpass123")
+    )
+    db_session.add(user)
+    db_session.commit()
+    response = client.post(
+        "/api/auth/login",
+        data={"username": "testuser", "password": "testpass123"}
+    )
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture
+def histories(db_session, auth_headers):
+    """1時間おきに作成した5件の履歴（奇数番目は信頼度90%の person を含む）"""
+    user = db_session.query(User).filter(User.username == "testuser").first()
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for i in range(5):
+        detections = [DetectionBox(x1=0, y1=0, x2=1, y2=1, label="car", confidence=50.0)]
+        if i % 2:
+            detections.append(DetectionBox(x1=0, y1=0, x2=1, y2=1, label="person", confidence=90.0))
+        history = create_history(user.id, f"{i}.jpg", detections, 0.1)
+        history.created_at = base + timedelta(hours=i)
+        for detection in history.detections:
+            detection.created_at = history.created_at
+        db_session.add(history)
+    db_session.commit()
+
+
+def test_keyset_pagination(client, auth_headers, histories):
+    """カーソルで全件を重複なく新しい順に取得できるテスト"""
+    paths, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/api/history", params=params, headers=auth_headers)
+        assert response.status_code == 200
+        paths += [h["image_url"] for h in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert paths == ["/uploads/4.jpg", "/uploads/3.jpg", "/uploads/2.jpg", "/uploads/1.jpg", "/uploads/0.jpg"]
+
+
+def test_keyset_pagination_legacy_timestamps(client, auth_headers, db_session):
+    """CURRENT_TIMESTAMP の形式で保存された履歴も、カーソルで重複なく取得できるテスト"""
+    user = db_session.query(User).filter(User.username == "testuser").first()
+    # 同じ秒の行を含む旧形式の履歴と、アプリが保存した形式の履歴が混ざっている
+    for i, created_at in enumerate(["2024-01-01 10:00:00", "2024-01-01 10:00:00", "2024-01-01 11:00:00"]):
+        db_session.execute(
+            text(
+                "INSERT INTO detection_history (user_id, image_path, detection_count, created_at) "
+                "VALUES (:user_id, :path, 0, :created_at)"
+            ),
+            {"user_id": user.id, "path": f"legacy{i}.jpg", "created_at": created_at}
+        )
+    history = create_history(user.id, "new.jpg", [], 0.1)
+    history.created_at = datetime(2024, 1, 1, 10, 30, tzinfo=timezone.utc)
+    db_session.add(history)
+    db_session.commit()
+    run_migrations(engine)
+
+    paths, cursor = [], None
+    for _ in range(10):
+        params = {"limit": 1, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/api/history", params=params, headers=auth_headers)
+        paths += [h["image_url"] for h in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert paths == ["/uploads/legacy2.jpg", "/uploads/new.jpg", "/uploads/legacy1.jpg", "/uploads/legacy0.jpg"]
+
+
+def test_history_filters(client, auth_headers, histories):
+    """ラベル・信頼度・期間で絞り込めるテスト"""
+    response = client.get(
+        "/api/history", params={"label": "person", "min_confidence": 80}, headers=auth_headers
+    )
+    assert [h["image_url"] for h in response.json()] == ["/uploads/3.jpg", "/uploads/1.jpg"]
+
+    response = client.get(
+        "/api/history", params={"label": "car", "min_confidence": 80}, headers=auth_headers
+    )
+    assert response.json() == []
+
+    response = client.get(
+        "/api/history",
+        params={"since": "2024-01-01T01:00:00+00:00", "until": "2024-01-01T03:00:00Z"},
+        headers=auth_headers
+    )
+    assert [h["image_url"] for h in response.json()] == ["/uploads/2.jpg", "/uploads/1.jpg"]
+
+    # UTC以外のタイムゾーンで指定してもUTCに揃えて比較する
+    response = client.get(
+        "/api/history",
+        params={"since": "2024-01-01T10:00:00+09:00", "until": "2024-01-01T12:00:00+09:00"},
+        headers=auth_headers
+    )
+    assert [h["image_url"] for h in response.json()] == ["/uploads/2.jpg", "/uploads/1.jpg"]
+
+
+def test_as_utc_keeps_timezone():
+    """比較に使う日時はタイムゾーン付きのUTCのまま渡すテスト（PostgreSQLでサーバーのタイムゾーンに左右されない）"""
+    jst = timezone(timedelta(hours=9))
+    assert as_utc(datetime(2024, 1, 1, 9, tzinfo=jst)) == datetime(2024, 1, 1, tzinfo=timezone.utc)
+    assert as_utc(datetime(2024, 1, 1, 9, tzinfo=jst)).tzinfo == timezone.utc
+    assert as_utc(datetime(2024, 1, 1)).tzinfo == timezone.utc
+    assert as_utc(None) is None
+
+
+def test_invalid_cursor(client, auth_headers):
+    """不正なカーソルは400を返すテスト"""
+    response = client.get("/api/history", params={"cursor": "broken"}, headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_history_summary(client, auth_headers, histories):
+    """一覧は検出結果の詳細を含まない要約を返し、詳細は個別に取得できるテスト"""
+    summary = client.get("/api/history", params={"limit": 1}, headers=auth_headers).json()[0]
+    assert summary["detection_count"] == 1
+    assert summary["top_labels"] == ["car"]
+    assert "detections" not in summary
+
+    detail = client.get(f"/api/history/{summary['id']}", headers=auth_headers).json()
+    assert [d["label"] for d in detail["detections"]] == ["car"]
+
+
+def test_shared_image_is_deleted_with_last_reference(client, auth_headers, db_session, tmp_path, monkeypatch):
+    """同じ画像を参照する履歴が残っている間は画像を削除しないテスト"""
+    monkeypatch.setattr(storage.settings, "LOCAL_STORAGE_PATH", str(tmp_path))
+    monkeypatch.setattr(storage.settings, "AWS_S3_BUCKET", None)
+    image = io.BytesIO()
+    Image.new("RGB", (32, 32), color="red").save(image, format="PNG")
+    image_hash = content_hash(image.getvalue())
+
+    # 同じ画像を2回保存しても1つのファイルになる
+    image_path = storage.save_image(image.getvalue(), "a.png", image_hash)
+    assert storage.save_image(image.getvalue(), "b.png", image_hash) == image_path
+    assert Path(image_path).name == f"{image_hash}.png"
+
+    user = db_session.query(User).filter(User.username == "testuser").first()
+    histories = [create_history(user.id, image_path, [], 0.1, image_hash) for _ in range(2)]
+    db_session.add_all(histories)
+    db_session.commit()
+
+    client.delete(f"/api/history/{histories[0].id}", headers=auth_headers)
+    assert Path(image_path).exists()
+    client.delete(f"/api/history/{histories[1].id}", headers=auth_headers)
+    assert not Path(image_path).exists()
@@ -0,0 +1,110 @@
+import io
+import time
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+from app.main import app
+from app.api import jobs
+from app.db.database import Base, engine
+from app.models.user import User
+from app.core.security import get_password_hash
+from app.schemas.detection import DetectionBox
+from sqlalchemy.orm import sessionmaker
+
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture(scope="function")
+def db_session():
+    """テスト用データベースセッション"""
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture(scope="function")
+def client(db_session):
+    """テストクライアント"""
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def auth_token(client, db_session):
+    """テスト用ユーザーを作成して認証トークンを取得"""
+    user = User(
+        username="testuser",
+        email="test@example.com",
+        password_hash=get_password_hash("testpass123")
+    )
+    db_session.add(user)
+    db_session.commit()
+    response = client.post(
+        "/api/auth/login",
+        data={"username": "testuser", "password": "testpass123"}
+    )
+    return response.json()["access_token"]
+
+
+@pytest.fixture
+def fake_detection(monkeypatch):
+    """推論の代わりに固定の検出結果を返す"""
+    async def run_detection(file_content, image, model=None):
+        box = DetectionBox(x1=1, y1=2, x2=3, y2=4, label="person", confidence=88.0)
+        return [box], 0.12, "hash"
+
+    monkeypatch.setattr(jobs, "run_detection_when_available", run_detection)
+
+
+def make_png() -> bytes:
+    """テスト用のPNG画像を作成"""
+    image_data = io.BytesIO()
+    Image.new("RGB", (64, 64), color="red").save(image_data, format="PNG")
+    return image_data.getvalue()
+
+
+def test_submit_job_and_poll_result(client, auth_token, fake_detection, tmp_path, monkeypatch):
+    """ジョブを登録し、完了後に結果と履歴を取得できるテスト"""
+    monkeypatch.setattr(jobs.settings, "LOCAL_STORAGE_PATH", str(tmp_path))
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    response = client.post(
+        "/api/jobs",
+        files={"file": ("test.png", make_png(), "image/png")},
+        headers=headers
+    )
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+
+    for _ in range(50):
+        data = client.get(f"/api/jobs/{job_id}", headers=headers).json()
+        if data["status"] in ("completed", "failed"):
+            break
+        time.sleep(0.05)
+
+    assert data["status"] == "completed"
+    assert data["result"]["detections"][0]["label"] == "person"
+    history = client.get(f"/api/history/{data['history_id']}", headers=headers)
+    assert history.status_code == 200
+
+
+def test_submit_job_invalid_file_type(client, auth_token):
+    """無効なファイル形式のジョブ登録テスト"""
+    response = client.post(
+        "/api/jobs",
+        files={"file": ("test.txt", b"not an image", "text/plain")},
+        headers={"Authorization": f"Bearer {auth_token}"}
+    )
+    assert response.status_code == 400
+
+
+def test_get_unknown_job(client, auth_token):
+    """存在しないジョブの取得テスト"""
+    response = client.get(
+        "/api/jobs/unknown",
+        headers={"Authorization": f"Bearer {auth_token}"}
+    )
+    assert response.status_code == 404
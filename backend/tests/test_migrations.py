@@ -0,0 +1,106 @@
+import json
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import Session
+from app.db.database import Base
+from app.db import migrations
+from app.db.migrations import run_migrations
+from app.models.detection import Detection, DetectionHistory
+from app.models.user import User  # noqa: F401  テーブル定義の登録
+
+LEGACY_SCHEMA = [
+    "CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR(50), email VARCHAR(100), "
+    "password_hash VARCHAR(255), created_at DATETIME)",
+    "CREATE TABLE detection_history (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES users(id), "
+    "image_path VARCHAR(500) NOT NULL, detection_results TEXT NOT NULL, "
+    "created_at DATETIME DEFAULT CURRENT_TIMESTAMP)",
+    "CREATE INDEX ix_detection_history_id ON detection_history (id)",
+]
+
+
+def test_migrate_legacy_json_results(tmp_path):
+    """旧形式のJSONの検出結果を detections テーブルへ移行するテスト"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        for statement in LEGACY_SCHEMA:
+            conn.execute(text(statement))
+        conn.execute(text("INSERT INTO users (id, username) VALUES (1, 'testuser')"))
+        results = {
+            "detections": [
+                {"x1": 1, "y1": 2, "x2": 3, "y2": 4, "label": "person", "confidence": 91.5},
+                {"x1": 5, "y1": 6, "x2": 7, "y2": 8, "label": "dog", "confidence": 40.0},
+            ],
+            "processing_time": 0.25,
+        }
+        conn.execute(
+            text("INSERT INTO detection_history (id, user_id, image_path, detection_results) VALUES (1, 1, 'a.jpg', :r)"),
+            {"r": json.dumps(results)}
+        )
+
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    run_migrations(engine)  # 2回目は何もしない
+
+    columns = {c["name"]: c for c in inspect(engine).get_columns("detection_history")}
+    assert columns["detection_results"]["nullable"]
+    indexes = {index["name"] for index in inspect(engine).get_indexes("detection_history")}
+    assert "ix_detection_history_user_created" in indexes
+    with engine.connect() as conn:
+        # CURRENT_TIMESTAMP の形式からアプリが保存する形式に揃っている
+        created_at = conn.execute(text("SELECT created_at FROM detection_history WHERE id = 1")).scalar()
+        assert len(created_at) == len("2024-01-01 00:00:00.000000")
+    with Session(engine) as db:
+        history = db.get(DetectionHistory, 1)
+        assert history.processing_time == 0.25
+        assert history.detection_results is None
+        assert history.detection_count == 2
+        assert history.top_labels == "person,dog"
+        assert [d.label for d in history.detections] == ["person", "dog"]
+
+        # データベース側で絞り込める
+        matched = db.query(Detection.history_id).filter(
+            Detection.label == "person", Detection.confidence >= 80
+        ).all()
+        assert matched == [(1,)]
+
+        # 作り直した後も新しい履歴を保存できる
+        db.add(DetectionHistory(user_id=1, image_path="b.jpg"))
+        db.commit()
+
+
+def test_interrupted_backfill_resumes(tmp_path, monkeypatch):
+    """移行が途中で失敗してもコミット済みのバッチは残り、再実行で続きから移行するテスト"""
+    monkeypatch.setattr(migrations, "BACKFILL_BATCH_SIZE", 1)
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        for statement in LEGACY_SCHEMA:
+            conn.execute(text(statement))
+        conn.execute(text("INSERT INTO users (id, username) VALUES (1, 'testuser')"))
+        results = json.dumps({
+            "detections": [{"x1": 1, "y1": 2, "x2": 3, "y2": 4, "label": "person", "confidence": 91.5}],
+            "processing_time": 0.25,
+        })
+        for history_id, detection_results in [(1, results), (2, "broken"), (3, results)]:
+            conn.execute(
+                text("INSERT INTO detection_history (id, user_id, image_path, detection_results) "
+                     "VALUES (:id, 1, 'a.jpg', :r)"),
+                {"id": history_id, "r": detection_results}
+            )
+
+    Base.metadata.create_all(bind=engine)
+    with pytest.raises(json.JSONDecodeError):
+        run_migrations(engine)
+    with engine.connect() as conn:
+        pending = conn.execute(
+            text("SELECT id FROM detection_history WHERE detection_results IS NOT NULL ORDER BY id")
+        ).scalars().all()
+        assert pending == [2, 3]
+
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE detection_history SET detection_results = :r WHERE id = 2"), {"r": results})
+    run_migrations(engine)
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM detections")).scalar() == 3
+        assert conn.execute(
+            text("SELECT COUNT(*) FROM detection_history WHERE detection_count = 1")
+        ).scalar() == 3
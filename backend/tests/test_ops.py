@@ -0,0 +1,47 @@
+import numpy as np
+from PIL import Image
+from app.ml.ops import batched_nms, decode_yolo_output, letterbox, nms, scale_boxes
+
+
+def test_letterbox_and_scale_boxes_roundtrip():
+    """レターボックス後の座標が元画像の座標に戻るテスト"""
+    image = Image.new("RGB", (400, 200))
+    array, gain, pad = letterbox(image, 640)
+    assert array.shape == (640, 640, 3)
+    assert gain == 1.6
+    assert pad == (0, 160)
+
+    boxes = np.array([[160.0, 320.0, 320.0, 480.0]])
+    restored = scale_boxes(boxes, gain, pad, image.size)
+    np.testing.assert_allclose(restored, [[100.0, 100.0, 200.0, 200.0]])
+
+
+def test_nms_suppresses_overlaps():
+    """重なったボックスのうち信頼度の高いものだけが残るテスト"""
+    boxes = np.array([[0, 0, 10, 10], [1, 1, 10, 10], [20, 20, 30, 30]], dtype=np.float32)
+    scores = np.array([0.8, 0.9, 0.7])
+    assert nms(boxes, scores, 0.5).tolist() == [1, 2]
+    # クラスが異なれば重なっていても残る
+    assert sorted(batched_nms(boxes, scores, np.array([0, 1, 0]), 0.5).tolist()) == [0, 1, 2]
+
+
+def test_nms_max_candidates():
+    """候補の上限を指定した場合は信頼度の高い順にその件数だけを対象にするテスト"""
+    boxes = np.array([[0, 0, 10, 10], [20, 20, 30, 30], [40, 40, 50, 50]], dtype=np.float32)
+    scores = np.array([0.5, 0.9, 0.7])
+    assert nms(boxes, scores, 0.5, max_candidates=2).tolist() == [1, 2]
+    assert batched_nms(boxes, scores, np.array([0, 1, 0]), 0.5, max_candidates=1).tolist() == [1]
+
+
+def test_decode_yolo_output():
+    """YOLOv8の生出力から xyxy・信頼度・クラスIDを取り出すテスト"""
+    # (バッチ1, 4 + 2クラス, アンカー3)
+    output = np.zeros((1, 6, 3), dtype=np.float32)
+    output[0, :4, 0] = [50, 50, 20, 10]  # cx, cy, w, h
+    output[0, 5, 0] = 0.9
+    output[0, :4, 1] = [10, 10, 4, 4]
+    output[0, 4, 1] = 0.1  # 閾値未満
+    boxes, scores, class_ids = decode_yolo_output(output, 0.25, 0.7, 300)[0]
+    np.testing.assert_allclose(boxes, [[40, 45, 60, 55]])
+    np.testing.assert_allclose(scores, [0.9])
+    assert class_ids.tolist() == [1]
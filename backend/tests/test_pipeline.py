@@ -0,0 +1,38 @@
+import asyncio
+import io
+from PIL import Image
+from app.ml import pipeline
+
+
+class RecordingScheduler:
+    """投入された画像を記録するダミーのスケジューラ"""
+
+    def __init__(self, executor_type):
+        self.executor_type = executor_type
+        self.model = "yolov8n"
+        self.images = []
+
+    async def submit(self, image):
+        self.images.append(image)
+        return [], 0.01
+
+    async def run_exclusive(self, fn, image, model=None):
+        self.images.append(image)
+        return [], 0.01
+
+
+def test_process_workers_receive_encoded_bytes(monkeypatch):
+    """プロセスプールにはエンコード済みのバイト列、スレッドには開いた画像を渡すテスト"""
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64)).save(buffer, format="JPEG")
+    data = buffer.getvalue()
+    image = Image.open(io.BytesIO(data))
+
+    monkeypatch.setattr(pipeline, "get_detection_cache", lambda: None)
+    monkeypatch.setattr(pipeline, "inference_params", lambda model=None, tiled=False: {})
+    for executor_type, expected in (("process", data), ("thread", image)):
+        scheduler = RecordingScheduler(executor_type)
+        monkeypatch.setattr(pipeline, "get_scheduler", lambda model=None: scheduler)
+        asyncio.run(pipeline.run_detection(data, image))
+        asyncio.run(pipeline.run_detection(data, image, tiled=True))
+        assert scheduler.images == [expected, expected]
@@ -0,0 +1,67 @@
+import io
+import numpy as np
+from PIL import Image
+from app.ml.preprocess import prepare_image
+from app.ml.results import DetectionArrays
+
+
+def encode_image(image: Image.Image, format: str) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=format)
+    return buffer.getvalue()
+
+
+def test_jpeg_is_decoded_at_reduced_scale():
+    """大きなJPEGを draft で縮小デコードし、長辺が入力サイズを下回らないテスト"""
+    data = encode_image(Image.new("RGB", (4000, 3000), color="green"), "JPEG")
+    prepared = prepare_image(data, 640)
+    assert prepared.original_size == (4000, 3000)
+    assert prepared.image.mode == "RGB"
+    assert 640 <= max(prepared.image.size) < 1280
+    assert prepared.scale[0] == 4000 / prepared.image.width
+
+
+def encode_oriented_jpeg(size, orientation: int) -> bytes:
+    """EXIF の Orientation を付けたJPEGを作成"""
+    image = Image.new("RGB", size, color="blue")
+    exif = image.getexif()
+    exif[0x0112] = orientation
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+def test_exif_orientation_is_applied():
+    """EXIF の向きを適用した画像と座標系で推論に渡すテスト"""
+    small = prepare_image(encode_oriented_jpeg((400, 200), 6), 640)
+    assert small.original_size == (200, 400)
+    assert small.image.size == (200, 400)
+
+    # 縮小デコードした場合も回転後のサイズで座標を戻す
+    large = prepare_image(encode_oriented_jpeg((4000, 2000), 6), 640)
+    assert large.original_size == (2000, 4000)
+    assert large.image.height > large.image.width
+    assert large.scale == (2000 / large.image.width, 4000 / large.image.height)
+
+
+def test_png_is_reduced_and_small_images_are_untouched():
+    """PNGは reduce で縮小し、小さな画像はそのまま渡すテスト"""
+    prepared = prepare_image(encode_image(Image.new("RGB", (2000, 500)), "PNG"), 640)
+    assert prepared.image.size == (667, 167)
+
+    small = prepare_image(Image.new("RGB", (320, 240)), 640)
+    assert small.image.size == (320, 240)
+    assert small.scale == (1.0, 1.0)
+
+
+def test_restore_boxes_to_original_coordinates():
+    """縮小後の座標を元画像の座標に戻すテスト"""
+    prepared = prepare_image(Image.new("RGB", (1280, 1000)), 640)
+    arrays = DetectionArrays(
+        boxes=np.array([[10.0, 20.0, 100.0, 400.0]], dtype=np.float32),
+        class_ids=np.array([0]),
+        confidences=np.array([0.9], dtype=np.float32),
+        names={0: "person"},
+    )
+    restored = prepared.restore(arrays)
+    np.testing.assert_allclose(restored.boxes, [[20.0, 40.0, 200.0, 800.0]])
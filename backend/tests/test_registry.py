@@ -0,0 +1,67 @@
+import threading
+import time
+import pytest
+from app.ml import registry as registry_module
+from app.ml.registry import ModelRegistry, UnknownModelError
+
+
+class FakeBackend:
+    """ロードに時間がかかるダミーの推論バックエンド"""
+    name = "fake"
+    imgsz = 32
+
+    def __init__(self, weights):
+        time.sleep(0.05)
+        self.weights = weights
+        self.predicted = 0
+
+    def predict(self, images):
+        self.predicted += len(images)
+        return []
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    """ロード回数を記録する"""
+    calls = []
+
+    def create_backend(weights=None):
+        calls.append(weights)
+        return FakeBackend(weights)
+
+    monkeypatch.setattr(registry_module, "create_backend", create_backend)
+    return calls
+
+
+def test_resolve_model_names(loads):
+    """モデル名・パスの解決と未登録モデルのテスト"""
+    registry = ModelRegistry(["yolov8n.pt", "weights/yolov8s.pt"], default="yolov8n.pt")
+    assert registry.names == ["yolov8n", "yolov8s"]
+    assert registry.resolve(None) == "yolov8n"
+    assert registry.resolve("yolov8s.pt") == "yolov8s"
+    with pytest.raises(UnknownModelError):
+        registry.resolve("yolov8x")
+
+
+def test_concurrent_first_access_loads_once(loads):
+    """同時の初回アクセスでもモデルが1回だけロードされるテスト"""
+    registry = ModelRegistry(["yolov8n.pt"], default="yolov8n.pt")
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get())) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert loads == ["yolov8n.pt"]
+    assert all(model is results[0] for model in results)
+
+
+def test_load_all_warms_up_and_reports_ready(loads):
+    """全モデルのロードとウォームアップ後に準備完了になるテスト"""
+    registry = ModelRegistry(["yolov8n.pt", "yolov8s.pt"], default="yolov8n.pt")
+    assert not registry.ready
+    registry.load_all()
+    assert registry.ready
+    assert registry.get("yolov8s").predicted == 1
+    status = registry.status()
+    assert status["models"]["yolov8n"]["warm"] is True
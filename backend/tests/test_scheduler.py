@@ -0,0 +1,241 @@
+import asyncio
+import functools
+import os
+import threading
+import time
+import pytest
+from app.ml import scheduler as scheduler_module
+from app.ml.scheduler import InferenceScheduler, InferenceQueueFullError, InferenceSchedulerStoppedError
+from app.schemas.detection import DetectionBox
+
+
+def make_batch_fn(calls):
+    """呼び出されたバッチを記録するダミーの推論関数"""
+    def batch_fn(images):
+        calls.append(list(images))
+        return [
+            ([DetectionBox(x1=0, y1=0, x2=1, y2=1, label=str(image), confidence=99.0)], 0.01)
+            for image in images
+        ]
+    return batch_fn
+
+
+def test_concurrent_requests_are_batched():
+    """同時リクエストが1回のバッチにまとめられるテスト"""
+    calls = []
+    scheduler = InferenceScheduler(make_batch_fn(calls), max_batch_size=8, max_wait_ms=50)
+
+    async def run():
+        results = await asyncio.gather(*[scheduler.submit(f"img{i}") for i in range(5)])
+        await scheduler.stop()
+        return results
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert len(calls[0]) == 5
+    # 各呼び出し元に自分の結果が返る
+    for i, (detections, _) in enumerate(results):
+        assert detections[0].label == f"img{i}"
+
+
+def test_batch_size_limit():
+    """最大バッチサイズを超える場合は分割されるテスト"""
+    calls = []
+    scheduler = InferenceScheduler(make_batch_fn(calls), max_batch_size=3, max_wait_ms=50)
+
+    async def run():
+        await asyncio.gather(*[scheduler.submit(i) for i in range(7)])
+        await scheduler.stop()
+
+    asyncio.run(run())
+    assert [len(batch) for batch in calls] == [3, 3, 1]
+
+
+def test_batch_error_is_propagated():
+    """推論エラーがバッチ内の全呼び出し元に伝わるテスト"""
+    def failing_batch_fn(images):
+        raise RuntimeError("inference failed")
+
+    scheduler = InferenceScheduler(failing_batch_fn, max_batch_size=4, max_wait_ms=10)
+
+    async def run():
+        results = await asyncio.gather(
+            scheduler.submit("a"), scheduler.submit("b"), return_exceptions=True
+        )
+        await scheduler.stop()
+        return results
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_batch_error_fails_only_bad_image():
+    """バッチ推論が失敗した場合は1枚ずつ推論し直し、失敗した画像だけがエラーになるテスト"""
+    calls = []
+    ok_batch_fn = make_batch_fn(calls)
+
+    def batch_fn(images):
+        if "bad" in images:
+            raise RuntimeError("bad image")
+        return ok_batch_fn(images)
+
+    scheduler = InferenceScheduler(batch_fn, max_batch_size=4, max_wait_ms=50)
+
+    async def run():
+        results = await asyncio.gather(
+            scheduler.submit("a"), scheduler.submit("bad"), scheduler.submit("b"),
+            return_exceptions=True
+        )
+        await scheduler.stop()
+        return results
+
+    a, bad, b = asyncio.run(run())
+    assert a[0][0].label == "a"
+    assert isinstance(bad, RuntimeError)
+    assert b[0][0].label == "b"
+    assert calls == [["a"], ["b"]]
+
+
+def test_queue_full_is_rejected():
+    """待ち行列が満杯の場合に拒否されるテスト"""
+    release = threading.Event()
+
+    def blocking_batch_fn(images):
+        release.wait(5)
+        return [([], 0.0) for _ in images]
+
+    scheduler = InferenceScheduler(
+        blocking_batch_fn, max_batch_size=1, max_wait_ms=0, workers=1, max_queue_size=2
+    )
+
+    async def run():
+        # 1件目がワーカーを占有し、2件がキューで待機する
+        tasks = [asyncio.ensure_future(scheduler.submit(0))]
+        await asyncio.sleep(0.1)
+        tasks += [asyncio.ensure_future(scheduler.submit(i)) for i in range(1, 3)]
+        await asyncio.sleep(0.1)
+        with pytest.raises(InferenceQueueFullError):
+            await scheduler.submit("overflow")
+        stats = scheduler.stats()
+        release.set()
+        await asyncio.gather(*tasks)
+        await scheduler.stop()
+        return stats
+
+    stats = asyncio.run(run())
+    assert stats["queue_depth"] == 2
+    assert stats["rejected"] == 1
+
+
+def test_batches_run_in_parallel_workers():
+    """複数ワーカーでバッチが並行実行されるテスト"""
+    def slow_batch_fn(images):
+        time.sleep(0.2)
+        return [([], 0.0) for _ in images]
+
+    scheduler = InferenceScheduler(slow_batch_fn, max_batch_size=1, max_wait_ms=0, workers=4)
+
+    async def run():
+        start = time.monotonic()
+        await asyncio.gather(*[scheduler.submit(i) for i in range(4)])
+        elapsed = time.monotonic() - start
+        await scheduler.stop()
+        return elapsed
+
+    assert asyncio.run(run()) < 0.6
+
+
+def test_exclusive_runs_share_queue_limit():
+    """ワーカーの空きを待つタイル推論も待ち行列の上限に数えられるテスト"""
+    release = threading.Event()
+
+    def blocking_fn(image):
+        release.wait(5)
+        return [], 0.0
+
+    scheduler = InferenceScheduler(
+        make_batch_fn([]), max_batch_size=1, max_wait_ms=0, workers=1, max_queue_size=2
+    )
+
+    async def run():
+        # 1件目がワーカーを占有し、2件がワーカーの空きを待つ
+        tasks = [asyncio.ensure_future(scheduler.run_exclusive(blocking_fn, i)) for i in range(3)]
+        await asyncio.sleep(0.1)
+        with pytest.raises(InferenceQueueFullError):
+            await scheduler.run_exclusive(blocking_fn, "overflow")
+        with pytest.raises(InferenceQueueFullError):
+            await scheduler.submit("overflow")
+        stats = scheduler.stats()
+        release.set()
+        await asyncio.gather(*tasks)
+        await scheduler.stop()
+        return stats
+
+    stats = asyncio.run(run())
+    assert stats["queue_depth"] == 2
+    assert stats["rejected"] == 2
+
+
+def test_stop_fails_queued_requests():
+    """停止時に推論が始まっていない画像の呼び出し元へ例外を返すテスト"""
+    release = threading.Event()
+
+    def blocking_batch_fn(images):
+        release.wait(5)
+        return [([], 0.0) for _ in images]
+
+    scheduler = InferenceScheduler(
+        blocking_batch_fn, max_batch_size=1, max_wait_ms=0, workers=1, max_queue_size=4
+    )
+
+    async def run():
+        # 1件目がワーカーを占有し、2件がキューで待機する
+        tasks = [asyncio.ensure_future(scheduler.submit(i)) for i in range(3)]
+        await asyncio.sleep(0.1)
+        stopping = asyncio.ensure_future(scheduler.stop())
+        await asyncio.sleep(0.1)
+        release.set()
+        await stopping
+        return await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), 1)
+
+    results = asyncio.run(run())
+    assert results[0] == ([], 0.0)
+    assert all(isinstance(r, InferenceSchedulerStoppedError) for r in results[1:])
+
+
+def test_exclusive_run_after_idle_submit():
+    """バッチ推論の後、待機中のスケジューラでもタイル推論がすぐに実行されるテスト"""
+    scheduler = InferenceScheduler(make_batch_fn([]), max_batch_size=4, max_wait_ms=10, workers=1)
+
+    async def run():
+        await scheduler.submit("a")
+        await asyncio.sleep(0.05)
+        result = await asyncio.wait_for(scheduler.run_exclusive(lambda image: ([], 0.0), "b"), 2)
+        await scheduler.stop()
+        return result
+
+    assert asyncio.run(run()) == ([], 0.0)
+
+
+def record_worker_model(path, model, warmup):
+    """ワーカープロセスの initializer の代わりに、呼び出されたことをファイルに記録する"""
+    with open(os.path.join(path, f"{os.getpid()}.txt"), "w") as f:
+        f.write(model)
+
+
+def test_process_workers_load_model_before_ready(tmp_path, monkeypatch):
+    """プロセスプールの全ワーカーが preload の完了までにモデルをロードするテスト"""
+    monkeypatch.setattr(
+        scheduler_module, "_load_worker_model", functools.partial(record_worker_model, str(tmp_path))
+    )
+    scheduler = InferenceScheduler(model="yolov8n", workers=2, executor_type="process")
+    assert not scheduler.workers_ready
+
+    async def run():
+        await scheduler.preload()
+        ready = scheduler.workers_ready
+        await scheduler.stop()
+        return ready
+
+    assert asyncio.run(run())
+    assert [p.read_text() for p in tmp_path.iterdir()] == ["yolov8n", "yolov8n"]
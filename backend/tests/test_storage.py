@@ -0,0 +1,170 @@
+import io
+import threading
+from pathlib import Path
+import pytest
+from PIL import Image
+from app.core import storage
+from app.core.images import variant_path
+from app.core.storage import delete_image, s3_key_from_url, save_image
+from app.core.uploader import BackgroundUploader
+
+
+@pytest.fixture
+def local_storage(tmp_path, monkeypatch):
+    """画像の保存先を一時フォルダにする（S3は使わない）"""
+    monkeypatch.setattr(storage.settings, "LOCAL_STORAGE_PATH", str(tmp_path))
+    monkeypatch.setattr(storage.settings, "AWS_S3_BUCKET", None)
+    monkeypatch.setattr(storage, "get_s3_client", lambda: None)
+    return tmp_path
+
+
+def make_jpeg(size=(3000, 2000)) -> bytes:
+    image_data = io.BytesIO()
+    Image.new("RGB", size, color="blue").save(image_data, format="JPEG")
+    return image_data.getvalue()
+
+
+def test_variant_path():
+    """元画像のパス・URLから縮小版のパス・URLを作るテスト"""
+    assert variant_path("uploads/abc.png", "thumb") == str(Path("uploads/abc_thumb.webp"))
+    assert variant_path(
+        "https://bucket.s3.ap-northeast-1.amazonaws.com/images/abc.jpg", "preview"
+    ) == "https://bucket.s3.ap-northeast-1.amazonaws.com/images/abc_preview.webp"
+
+
+def test_save_image_creates_variants(local_storage):
+    """保存時にサムネイルとプレビューが作成され、削除時に一緒に消えるテスト"""
+    image_path = save_image(make_jpeg(), "photo.jpg")
+
+    thumb = Image.open(variant_path(image_path, "thumb"))
+    preview = Image.open(variant_path(image_path, "preview"))
+    assert thumb.format == "WEBP"
+    assert max(thumb.size) == 256
+    assert max(preview.size) == 1024
+
+    assert delete_image(image_path)
+    assert list(local_storage.iterdir()) == []
+
+
+def test_held_image_is_not_deleted(local_storage):
+    """保存中の処理が保持している画像と、参照されている画像は削除しないテスト"""
+    image_path = save_image(make_jpeg((64, 64)), "photo.jpg", hold=True)
+    assert not storage.delete_image_if_unreferenced(image_path, lambda path: 0)
+    assert Path(image_path).exists()
+
+    storage.release_image(image_path)
+    assert not storage.delete_image_if_unreferenced(image_path, lambda path: 1)
+    assert storage.delete_image_if_unreferenced(image_path, lambda path: 0)
+    assert not Path(image_path).exists()
+
+
+class FakeS3:
+    """upload_fileobj・get_object・delete_object だけを持つS3の代わり（最初の数回は失敗させられる）"""
+
+    def __init__(self, failures: int = 0):
+        self.objects = {}
+        self.failures = failures
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None, Config=None):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("一時的なエラー")
+        self.objects[Key] = Fileobj.read()
+
+    def get_object(self, Bucket, Key):
+        return {"Body": io.BytesIO(self.objects[Key])}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop(Key, None)
+
+
+@pytest.fixture
+def fake_s3(tmp_path, monkeypatch):
+    """バックグラウンドアップロードの宛先をFakeS3にする"""
+    s3 = FakeS3(failures=2)
+    uploader = BackgroundUploader(
+        client_factory=lambda: s3, bucket="bucket", staging_path=str(tmp_path / "staging"),
+        workers=2, retries=3, backoff_seconds=0.01
+    )
+    monkeypatch.setattr(storage.settings, "AWS_S3_BUCKET", "bucket")
+    monkeypatch.setattr(storage.settings, "IMAGE_VARIANTS_ENABLED", False)
+    monkeypatch.setattr(storage, "get_s3_client", lambda: s3)
+    monkeypatch.setattr(storage, "get_uploader", lambda: uploader)
+    yield s3, uploader
+    uploader.stop()
+
+
+def test_background_upload_and_delete(fake_s3):
+    """ステージング領域に保存した時点で応答し、失敗しても再試行でS3にアップロードされるテスト"""
+    s3, uploader = fake_s3
+    data = make_jpeg((64, 64))
+    url = save_image(data, "photo.jpg")
+    assert url.startswith("https://bucket.s3.")
+
+    # アップロード前でもステージング領域から読める
+    assert storage.load_image_bytes(url) == data
+
+    uploader.join()
+    key = s3_key_from_url(url)
+    assert s3.objects[key] == data
+    assert uploader.stats()["retried"] == 2
+    assert list(uploader.staging_path.iterdir()) == []
+
+    # 同じ画像は head_object で確かめずに再利用する（見つからなければ同じキーへ上書き）
+    assert save_image(data, "copy.jpg") == url
+    uploader.join()
+    assert s3.objects[key] == data
+
+    assert delete_image(url)
+    uploader.join()
+    assert key not in s3.objects
+    assert list(uploader.staging_path.iterdir()) == []
+
+
+def test_staged_files_are_recovered(tmp_path):
+    """前回の停止時に残ったアップロードと削除予約を起動時に再開するテスト"""
+    s3 = FakeS3()
+    s3.objects["images/old.jpg"] = b"old"
+    staging = tmp_path / "staging"
+    staging.mkdir()
+    (staging / "new.jpg").write_bytes(b"new")
+    (staging / "old.jpg.delete").touch()
+
+    uploader = BackgroundUploader(client_factory=lambda: s3, bucket="bucket", staging_path=str(staging))
+    uploader.start()
+    uploader.join()
+    uploader.stop()
+    assert s3.objects == {"images/new.jpg": b"new"}
+    assert list(staging.iterdir()) == []
+
+
+def test_s3_client_is_created_once_with_pool(monkeypatch):
+    """同時に取得してもS3クライアントは1つだけ作成され、接続プールとリトライが設定されるテスト"""
+    created = []
+    barrier = threading.Barrier(8)
+
+    def fake_client(service, **kwargs):
+        created.append(kwargs["config"])
+        return object()
+
+    monkeypatch.setattr(storage, "_s3_client", None)
+    monkeypatch.setattr(storage.boto3, "client", fake_client)
+    monkeypatch.setattr(storage.settings, "AWS_ACCESS_KEY_ID", "key")
+    monkeypatch.setattr(storage.settings, "AWS_SECRET_ACCESS_KEY", "secret")
+
+    clients = []
+
+    def get():
+        barrier.wait()
+        clients.append(storage.get_s3_client())
+
+    threads = [threading.Thread(target=get) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(created) == 1
+    assert len({id(client) for client in clients}) == 1
+    assert created[0].max_pool_connections >= storage.settings.S3_MAX_POOL_CONNECTIONS
+    assert created[0].retries["mode"] == storage.settings.S3_RETRY_MODE
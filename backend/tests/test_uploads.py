@@ -0,0 +1,69 @@
+import asyncio
+import io
+import struct
+import zlib
+import pytest
+from fastapi import HTTPException, UploadFile
+from PIL import Image
+from app.api import uploads
+from app.api.uploads import open_image, probe_image, read_image_upload, sniff_image_format
+
+
+def png_header(width: int, height: int) -> bytes:
+    """IHDR と IDAT チャンクの先頭だけを持つPNG（ピクセルデータなし）"""
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    chunk = b"IHDR" + ihdr
+    return b"\x89PNG\r\n\x1a\n" + struct.pack(">I", len(ihdr)) + chunk + struct.pack(">I", zlib.crc32(chunk)) + struct.pack(">I", 1 << 20) + b"IDAT"
+
+
+def make_upload(data: bytes, content_type: str = "image/png") -> UploadFile:
+    return UploadFile(file=io.BytesIO(data), filename="test.png", headers={"content-type": content_type})
+
+
+def make_png() -> bytes:
+    image_data = io.BytesIO()
+    Image.new("RGB", (64, 48), color="red").save(image_data, format="PNG")
+    return image_data.getvalue()
+
+
+def test_sniff_image_format():
+    """ファイル先頭のシグネチャで形式を判定するテスト"""
+    assert sniff_image_format(make_png()) == "PNG"
+    assert sniff_image_format(b"\xff\xd8\xff\xe0") == "JPEG"
+    assert sniff_image_format(b"GIF89a") is None
+
+
+def test_read_image_upload_stream():
+    """正常な画像をチャンクごとに読み込めるテスト"""
+    data = make_png()
+    file_content, image = asyncio.run(read_image_upload(make_upload(data)))
+    assert file_content == data
+    assert image.size == (64, 48)
+
+
+def test_reject_oversized_upload(monkeypatch):
+    """上限を超えたアップロードを413で拒否するテスト"""
+    monkeypatch.setattr(uploads.settings, "MAX_FILE_SIZE_MB", 1)
+    data = make_png() + b"\0" * (2 * 1024 * 1024)
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(read_image_upload(make_upload(data)))
+    assert exc.value.status_code == 413
+
+
+def test_reject_spoofed_content_type():
+    """content_type が画像でも中身が画像でなければ拒否するテスト"""
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(read_image_upload(make_upload(b"not an image" * 100)))
+    assert exc.value.status_code == 400
+
+
+def test_reject_large_dimensions_from_header():
+    """ピクセルデータを読む前にヘッダーだけで大きすぎる画像を拒否するテスト"""
+    with pytest.raises(HTTPException) as exc:
+        open_image(png_header(12000, 100))
+    assert "画像サイズ" in exc.value.detail
+
+    # ピクセル数の上限を超える画像（解凍爆弾）
+    with pytest.raises(HTTPException) as exc:
+        probe_image(png_header(10000, 10001))
+    assert "ピクセル数" in exc.value.detail
@@ -19,10 +19,36 @@ export interface DetectionResponse {
 export interface DetectionHistory {
   id: number;
   image_path: string;
-  detection_results: string;
+  image_url: string | null;
+  preview_url: string | null;
+  detections: DetectionBox[];
+  processing_time: number | null;
+  created_at: string;
+}
+
+export interface DetectionHistorySummary {
+  id: number;
+  image_url: string;
+  thumbnail_url: string;
+  detection_count: number;
+  top_labels: string[];
   created_at: string;
 }
 
+export interface HistoryQuery {
+  cursor?: string;
+  limit?: number;
+  label?: string;
+  min_confidence?: number;
+  since?: string;
+  until?: string;
+}
+
+export interface HistoryPage {
+  items: DetectionHistorySummary[];
+  nextCursor: string | null;
+}
+
 export const detectionApi = {
   detect: async (file: File): Promise<DetectionResponse> => {
     const formData = new FormData();
@@ -37,11 +63,14 @@ export const detectionApi = {
     return response.data;
   },
 
-  getHistory: async (skip: number = 0, limit: number = 20): Promise<DetectionHistory[]> => {
+  getHistory: async (query: HistoryQuery = {}): Promise<HistoryPage> => {
     const response = await apiClient.get('/api/history', {
-      params: { skip, limit },
+      params: { limit: 20, ...query },
     });
-    return response.data;
+    return {
+      items: response.data,
+      nextCursor: response.headers['x-next-cursor'] ?? null,
+    };
   },
 
   getHistoryDetail: async (id: number): Promise<DetectionHistory> => {
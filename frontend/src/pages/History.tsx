@@ -13,11 +13,17 @@ import {
 } from '@mui/material';
 import { Delete } from '@mui/icons-material';
 import { detectionApi } from '../api/detection';
-import type { DetectionHistory } from '../api/detection';
+import type { DetectionHistorySummary } from '../api/detection';
+
+const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || 'http://localhost:8000';
+
+const toAbsoluteUrl = (url: string) => (url.startsWith('http') ? url : `${API_BASE_URL}${url}`);
 
 export const History = () => {
-  const [histories, setHistories] = useState<DetectionHistory[]>([]);
+  const [histories, setHistories] = useState<DetectionHistorySummary[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState('');
 
   useEffect(() => {
@@ -27,8 +33,9 @@ export const History = () => {
   const loadHistory = async () => {
     try {
       setLoading(true);
-      const data = await detectionApi.getHistory();
-      setHistories(data);
+      const page = await detectionApi.getHistory();
+      setHistories(page.items);
+      setNextCursor(page.nextCursor);
     } catch (err: any) {
       setError('履歴の取得に失敗しました');
     } finally {
@@ -36,6 +43,21 @@ export const History = () => {
     }
   };
 
+  const loadMore = async () => {
+    if (!nextCursor) return;
+
+    try {
+      setLoadingMore(true);
+      const page = await detectionApi.getHistory({ cursor: nextCursor });
+      setHistories([...histories, ...page.items]);
+      setNextCursor(page.nextCursor);
+    } catch (err: any) {
+      setError('履歴の取得に失敗しました');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleDelete = async (id: number) => {
     if (!window.confirm('この履歴を削除しますか？')) return;
 
@@ -78,15 +100,18 @@ export const History = () => {
       ) : (
         <Grid container spacing={3}>
           {histories.map((history) => {
-            const results = JSON.parse(history.detection_results);
             return (
               <Grid item xs={12} sm={6} md={4} key={history.id}>
                 <Card>
                   <CardMedia
                     component="img"
-                    image={history.image_path.startsWith('http') 
-                      ? history.image_path 
-                      : `${import.meta.env.VITE_API_BASE_URL || 'http://localhost:8000'}${history.image_path}`}
+                    image={toAbsoluteUrl(history.thumbnail_url)}
+                    onError={(e: React.SyntheticEvent<HTMLImageElement>) => {
+                      // サムネイルがない古い履歴は元画像を表示
+                      const original = toAbsoluteUrl(history.image_url);
+                      if (e.currentTarget.src !== original) e.currentTarget.src = original;
+                    }}
+                    loading="lazy"
                     alt="解析画像"
                     sx={{ height: 200, objectFit: 'cover' }}
                   />
@@ -95,8 +120,13 @@ export const History = () => {
                       {new Date(history.created_at).toLocaleString('ja-JP')}
                     </Typography>
                     <Typography variant="body2" sx={{ mt: 1 }}>
-                      検出数: {results.detections?.length || 0}
+                      検出数: {history.detection_count}
                     </Typography>
+                    {history.top_labels.length > 0 && (
+                      <Typography variant="body2" color="text.secondary">
+                        {history.top_labels.join(', ')}
+                      </Typography>
+                    )}
                     <Button
                       size="small"
                       color="error"
@@ -113,6 +143,14 @@ export const History = () => {
           })}
         </Grid>
       )}
+
+      {nextCursor && (
+        <Box display="flex" justifyContent="center" sx={{ mt: 3 }}>
+          <Button variant="outlined" onClick={loadMore} disabled={loadingMore}>
+            {loadingMore ? <CircularProgress size={24} /> : 'さらに読み込む'}
+          </Button>
+        </Box>
+      )}
     </Container>
   );
 };